@@ -0,0 +1,3 @@
+'''Python side of the Hybrid Ledgers system (bill review dashboard and tools).'''
+
+from hybridledger.ledger import ServerHL, ServerHLChain, load_chains, read_blocks, refresh_chains
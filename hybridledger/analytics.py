@@ -0,0 +1,106 @@
+'''Vectorized helpers shared by the dashboard views, over decoded chains.'''
+
+from datetime import datetime
+
+import pandas as pd
+
+from hybridledger import profiling
+
+ISSUE_PREFIX = 'issue_'
+
+
+@profiling.timed()
+def match_issues(payments:pd.DataFrame, issues:pd.DataFrame, by:str = None) -> pd.DataFrame:
+    '''
+    As-of join: pair each payment block with the last bill issue minted
+    strictly before it (the issue that payment answers).
+
+    Both frames are decoded chains (`hybridledger.decode`). Returns
+    `payments` in its original order with the matched issue's columns
+    added under an `issue_` prefix; they are NaN/NaT for payments
+    older than every issue. O((p + i) log(p + i)) instead of O(p * i).
+
+    With `by` (e.g. `'bill'`), payments only match issues sharing that column.
+    '''
+    left = payments.assign(_order=range(len(payments))).sort_values('timestamp', kind='stable')
+    right = (issues.sort_values('timestamp', kind='stable')
+        .drop(columns=['_order'], errors='ignore')
+        .add_prefix(ISSUE_PREFIX))
+    matched = pd.merge_asof(
+        left,
+        right,
+        left_on='timestamp',
+        right_on=ISSUE_PREFIX + 'timestamp',
+        left_by=by,
+        right_by=None if by is None else ISSUE_PREFIX + by,
+        direction='backward',
+        allow_exact_matches=False
+    )
+    return matched.sort_values('_order', kind='stable').drop(columns='_order').set_index(payments.index)
+
+
+GRANULARITIES = {
+    'Month': 'M',
+    'Week': 'W',
+    'Billing cycle': 'cycle'
+}
+'''Payment matrix period choices, label -> `payment_matrix` granularity.'''
+
+
+@profiling.timed()
+def payment_matrix(
+        payments:pd.DataFrame,
+        payee_by_position:dict[str, str],
+        payees:list[str],
+        bills:list[str],
+        periods:int = 6,
+        granularity:str = 'M',
+        issues:pd.DataFrame = None,
+        now:datetime = None
+    ) -> pd.DataFrame:
+    '''
+    Payee x bill x period grid of "was a paid (`ok`) block minted".
+
+    `payments` and `issues` are snapshot frames (decoded, with a `bill`
+    column). `granularity` is a pandas period alias (`'M'`, `'W'`) or
+    `'cycle'`, where each payment counts towards the bill issue it
+    answers (needs `issues`). The window is the last `periods` periods
+    up to `now`, newest first, across year boundaries.
+
+    Returns 0/1 ints indexed by `(payee, bill)` for every payee and bill,
+    with one column per period.
+    '''
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    paid = payments[payments['paid']]
+
+    if granularity == 'cycle':
+        if issues is None:
+            raise ValueError('Billing cycle granularity needs the issues frame.')
+        # cycle 0 is each bill's latest issue, 1 the one before, ...
+        ranked = issues.assign(cycle=issues.sort_values('timestamp', kind='stable')
+            .groupby('bill').cumcount(ascending=False))
+        keys = match_issues(paid, ranked[['bill', 'timestamp', 'cycle']], by='bill')[ISSUE_PREFIX + 'cycle']
+        window = list(range(periods))
+        labels = ['Current'] + [f'-{cycle}' for cycle in window[1:]]
+    else:
+        keys = paid['issued'].dt.to_period(granularity)
+        window = list(pd.period_range(end=now.to_period(granularity), periods=periods)[::-1])
+        if granularity == 'M':
+            labels = [period.strftime('%b' if periods <= 12 else '%b %Y') for period in window]
+        else:
+            labels = [period.start_time.strftime('%Y-%m-%d') for period in window]
+
+    hits = pd.DataFrame({
+        'payee': paid['position'].map(payee_by_position).fillna('Unknown'),
+        'bill': paid['bill'],
+        'period': keys
+    })
+    hits = hits[hits['period'].isin(window)].drop_duplicates()
+
+    matrix = pd.DataFrame(0, index=pd.MultiIndex.from_product([payees, bills], names=['payee', 'bill']), columns=window)
+    if len(hits):
+        found = pd.crosstab([hits['payee'], hits['bill']], hits['period']).clip(upper=1)
+        found = found.reindex(index=matrix.index, columns=window, fill_value=0)
+        matrix = found.astype(int)
+    matrix.columns = labels
+    return matrix
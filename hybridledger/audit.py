@@ -0,0 +1,280 @@
+'''
+Hash-chain integrity audit of every ledger in the database.
+
+    python -m hybridledger.audit [--database PATH] [--state PATH] [--workers N] [--full]
+
+`HybridLedger.checkPristine` (module/ledger.js) rehashes one ledger per
+request; this checks every position's `previousHash` links at once,
+with block hashes recomputed like `Block.getHash`. Positions are
+verified in chunks across a process pool.
+
+Each position's last verified block (index, row id and hash) is kept as
+a checkpoint in a side SQLite database (`HL_AUDIT_STATE`, in
+`HL_STATE_DIR`), with the row id the run read up to. Later runs only
+read the rows added since, and link them onto the checkpoint. A position whose checkpoint block no
+longer hashes the same, or that gained a block before it, is verified
+again in full. Rows rewritten in place elsewhere in a chain (the
+server's `/fix` route) need `--full`.
+'''
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from functools import partial
+from typing import NamedTuple
+
+import pandas as pd
+
+from hybridledger import config, profiling
+from hybridledger.db import connect_readonly
+from hybridledger.ledger import LEDGER_COLUMNS
+from hybridledger.registry import BILL_BY_POSITION
+from hybridledger.valuation import block_hashes
+from hybridledger.workers import start_pool
+
+AUDIT_CHUNK = 256
+'''Positions verified per task.'''
+
+STATE_DDL = (
+    '''CREATE TABLE IF NOT EXISTS checkpoints (
+        position TEXT PRIMARY KEY,
+        blocks INTEGER NOT NULL,
+        last_index INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        broken_index INTEGER,
+        verified_at TEXT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        database TEXT NOT NULL,
+        last_id INTEGER NOT NULL,
+        positions INTEGER NOT NULL,
+        blocks INTEGER NOT NULL,
+        broken INTEGER NOT NULL,
+        started_at TEXT NOT NULL,
+        finished_at TEXT NOT NULL)''',
+)
+'''The audit state: a checkpoint per position, and every run's row id watermark.'''
+
+_COLUMNS = ', '.join(f'"{column}"' for column in ('id', *LEDGER_COLUMNS))
+_FULL_SQL = f'SELECT {_COLUMNS} FROM "HybridLedgers" WHERE "position" = ? AND "id" <= ?'
+_SINCE_SQL = f'SELECT {_COLUMNS} FROM "HybridLedgers" WHERE "position" = ? AND ("id" = ? OR ("id" > ? AND "id" <= ?))'
+
+
+class Checkpoint(NamedTuple):
+    '''A position's chain, verified up to its last block.'''
+    blocks:int
+    last_index:int
+    last_id:int
+    hash:str
+    broken_index:int | None  # first block whose previousHash does not match, or None
+
+
+def _chains(rows:list[tuple]) -> pd.DataFrame:
+    # per position (index): blocks, first_id, first_hash, last_index, last_id, hash, broken_index
+    frame = pd.DataFrame.from_records(rows, columns=['id', *LEDGER_COLUMNS])
+    frame = frame.sort_values(['position', 'index', 'id'], kind='stable').reset_index(drop=True)
+    frame['hash'] = pd.Series(block_hashes(frame)[0], dtype=object)
+
+    # checkPristine: each block's hash is the next block's previousHash
+    linked = frame['position'] == frame['position'].shift()
+    frame['broken'] = frame['index'].where(linked & (frame['previousHash'] != frame['hash'].shift()))
+    chains = frame.groupby('position', sort=False).agg(
+        blocks=('id', 'size'), first_id=('id', 'first'), first_hash=('hash', 'first'),
+        last_index=('index', 'last'), last_id=('id', 'last'), hash=('hash', 'last'), broken_index=('broken', 'first'))
+    return chains
+
+
+def _checkpoints(chains:pd.DataFrame) -> dict[str, Checkpoint]:
+    return { position : Checkpoint(int(chain.blocks), int(chain.last_index), int(chain.last_id), chain.hash,
+        None if pd.isna(chain.broken_index) else int(chain.broken_index)) for position, chain in chains.iterrows() }
+
+
+def verify(database:str, after:int, until:int, tasks:list[tuple[str, Checkpoint | None]]) -> tuple[dict[str, Checkpoint], int]:
+    '''
+    Verify the chains of `tasks` (`[(position, checkpoint or None), ...]`)
+    with rows up to id `until`; checkpointed positions only read the rows
+    after id `after`. Returns the new checkpoints and the blocks hashed.
+    '''
+    conn = connect_readonly(database)
+    try:
+        conn.execute('BEGIN')
+        try:
+            rows = []
+            for position, checkpoint in tasks:
+                if checkpoint is None:
+                    rows += conn.execute(_FULL_SQL, (position, until)).fetchall()
+                else:
+                    rows += conn.execute(_SINCE_SQL, (position, checkpoint.last_id, after, until)).fetchall()
+            # every task's position has rows after `after`, so it is in chains
+            chains = _chains(rows)
+            hashed = len(rows)
+
+            result = {}
+            again = []
+            for position, checkpoint in tasks:
+                chain = chains.loc[position]
+                if checkpoint is None:
+                    result[position] = _checkpoints(chains.loc[[position]])[position]
+                elif chain.first_id != checkpoint.last_id or chain.first_hash != checkpoint.hash:
+                    # the checkpoint block changed, or new blocks sort before it
+                    again.append(position)
+                else:
+                    broken = checkpoint.broken_index
+                    if broken is None and not pd.isna(chain.broken_index):
+                        broken = int(chain.broken_index)
+                    result[position] = Checkpoint(checkpoint.blocks + int(chain.blocks) - 1,
+                        int(chain.last_index), int(chain.last_id), chain.hash, broken)
+
+            rows = []
+            for position in again:
+                rows += conn.execute(_FULL_SQL, (position, until)).fetchall()
+            if rows:
+                result.update(_checkpoints(_chains(rows)))
+                hashed += len(rows)
+        finally:
+            conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return result, hashed
+
+
+def connect_state(path:str = config.AUDIT_STATE) -> sqlite3.Connection:
+    '''Open (creating it and its directory if needed) the audit state database.'''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=config.SQLITE_BUSY_MS / 1000)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for ddl in STATE_DDL:
+        conn.execute(ddl)
+    return conn
+
+
+def _chunks(items:list, size:int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@profiling.timed()
+def audit(database:str = config.DATABASE, state:str = config.AUDIT_STATE,
+        workers:int = config.AUDIT_WORKERS, full:bool = False) -> dict:
+    '''
+    Verify every position with blocks added since the last run (all of
+    them with `full`, or when the last run audited another database) and
+    store their checkpoints. Returns the run's summary.
+    '''
+    started_at = datetime.now().isoformat()
+    database = os.path.abspath(database)
+    state_conn = connect_state(state)
+    try:
+        last_run = state_conn.execute('SELECT database, last_id FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+        if full or last_run is None or last_run[0] != database:
+            state_conn.execute('DELETE FROM checkpoints')
+            after = 0
+        else:
+            after = last_run[1]
+
+        conn = connect_readonly(database)
+        try:
+            until = conn.execute('SELECT COALESCE(MAX(id), 0) FROM "HybridLedgers"').fetchone()[0]
+            positions = [row[0] for row in conn.execute(
+                'SELECT DISTINCT "position" FROM "HybridLedgers" WHERE "id" > ? AND "id" <= ? ORDER BY "position"',
+                (after, until))]
+        finally:
+            conn.close()
+
+        checkpoints = { row[0] : Checkpoint(*row[1:]) for row in state_conn.execute(
+            'SELECT position, blocks, last_index, last_id, hash, broken_index FROM checkpoints') }
+        tasks = list(_chunks([(position, checkpoints.get(position)) for position in positions], AUDIT_CHUNK))
+        work = partial(verify, database, after, until)
+
+        results = {}
+        hashed = 0
+        if workers > 1 and len(tasks) > 1:
+            with start_pool(min(workers, len(tasks))) as pool:
+                for verified, count in pool.imap_unordered(work, tasks):
+                    results.update(verified)
+                    hashed += count
+        else:
+            for task in tasks:
+                verified, count = work(task)
+                results.update(verified)
+                hashed += count
+
+        finished_at = datetime.now().isoformat()
+        with state_conn:
+            state_conn.executemany('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(position, *checkpoint, finished_at) for position, checkpoint in results.items()])
+            broken = state_conn.execute('SELECT COUNT(*) FROM checkpoints WHERE broken_index IS NOT NULL').fetchone()[0]
+            state_conn.execute('INSERT INTO runs (database, last_id, positions, blocks, broken, started_at, finished_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (database, until, len(results), hashed, broken, started_at, finished_at))
+    finally:
+        state_conn.close()
+
+    return { 'database' : database, 'after' : after, 'last_id' : until, 'positions' : len(results),
+        'blocks' : hashed, 'broken' : broken, 'finished_at' : finished_at }
+
+
+def broken_chains(state:str = config.AUDIT_STATE) -> pd.DataFrame:
+    '''Positions whose chain is broken as of the last audit; empty if there was none.'''
+    columns = ['position', 'broken_index', 'blocks', 'verified_at']
+    if not os.path.exists(state):
+        return pd.DataFrame(columns=columns)
+    conn = connect_readonly(state)
+    try:
+        rows = conn.execute(f'SELECT {", ".join(columns)} FROM checkpoints '
+            'WHERE broken_index IS NOT NULL ORDER BY position').fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def last_run(state:str = config.AUDIT_STATE) -> dict | None:
+    '''The last audit's summary (`last_id`, `positions`, `blocks`, `broken`, `finished_at`), or None.'''
+    if not os.path.exists(state):
+        return None
+    conn = connect_readonly(state)
+    try:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT last_id, positions, blocks, broken, finished_at FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    return None if row is None else dict(row)
+
+
+def broken_bills(broken:pd.DataFrame) -> dict[str, dict[str, int]]:
+    '''`{bill label: {position: first broken index}}` for the bills with a broken chain.'''
+    bills = {}
+    for position, index in zip(broken['position'], broken['broken_index']):
+        bill = BILL_BY_POSITION.get(position)
+        if bill is not None:
+            bills.setdefault(bill.label, {})[position] = int(index)
+    return bills
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.audit',
+        description='Verify the hash chain of every ledger, resuming from the last audit.')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--state', default=config.AUDIT_STATE, help='audit state database (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=config.AUDIT_WORKERS, help='processes (default: %(default)s)')
+    parser.add_argument('--full', action='store_true', help='ignore the checkpoints and verify every block')
+    args = parser.parse_args(argv)
+
+    summary = audit(args.database, args.state, args.workers, args.full)
+    print(f'{summary["positions"]} positions verified ({summary["blocks"]} blocks hashed) '
+        f'up to id {summary["last_id"]}; {summary["broken"]} broken')
+    for chain in broken_chains(args.state).itertuples():
+        print(f'  {chain.position}: broken at block {chain.broken_index} of {chain.blocks}')
+    return 1 if summary['broken'] else 0
+
+
+if __name__ == '__main__':
+    # run from the importable module, so workers can unpickle `verify`
+    from hybridledger.audit import main
+    sys.exit(main())
@@ -0,0 +1,217 @@
+'''
+Benchmarks of the dashboard's data paths over synthetic ledgers.
+
+    python -m hybridledger.benchmark [--sizes 1k,100k,10M] [--output benchmark.json]
+
+For every size a database of about that many blocks is generated
+(`hybridledger.synthetic`), then each stage the dashboard runs is timed:
+
+    load        read every bill's chains (one snapshot, one transaction)
+    decode      decode the value and payment chains
+    aggregate   the Overview and Billing by Frequency tables (`reports`)
+                and the payment-history matrix
+    render      the charts of the first `--render-bills` bills, plus the
+                bill-history and payment-history charts
+
+Results are written as JSON so runs can be compared across commits.
+
+Every stage holds the whole ledger in memory, about `MEMORY_PER_BLOCK`
+bytes a block: the 10M size needs about 11 GiB. Sizes estimated not to
+fit in physical memory are skipped (and recorded as such).
+'''
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from hybridledger import charts, reports
+from hybridledger.analytics import payment_matrix
+from hybridledger.ledger import ServerHLChain
+from hybridledger.snapshot import LedgerSnapshot
+from hybridledger.synthetic import bills_for, generate
+
+
+SIZES = { 'k' : 10 ** 3, 'M' : 10 ** 6 }
+
+STAGES = ('load', 'decode', 'aggregate', 'render')
+
+MEMORY_PER_BLOCK = 1200
+'''Bytes held per block while a size runs (chains, decoded frames, aggregates), measured at 100k-400k blocks.'''
+
+
+def parse_size(text:str) -> int:
+    '''`'1k'` -> 1000, `'10M'` -> 10000000.'''
+    text = text.strip()
+    if text[-1:] in SIZES:
+        return int(float(text[:-1]) * SIZES[text[-1]])
+    return int(text)
+
+
+def _fresh(bills:list[ServerHLChain]) -> list[ServerHLChain]:
+    # unloaded copies of the registry, so every repeat starts cold
+    return [ServerHLChain(pos_value=bill.pos_value, pos_payment_stacks=list(bill.dues_chains),
+        label=bill.label, frequency=bill.frequency) for bill in bills]
+
+
+def _stage_load(conn:sqlite3.Connection, bills:list[ServerHLChain]):
+    return LedgerSnapshot(_fresh(bills), conn)
+
+
+def _stage_decode(snapshot):
+    for bill in snapshot:
+        bill.values
+        bill.dues
+    return snapshot
+
+
+def _stage_aggregate(snapshot, payees:dict[str, list[str]]) -> dict:
+    # the generated payees, not the registry's (which `reports.payment_matrices` uses)
+    payee_by_position = {}
+    for payee, positions in payees.items():
+        for position in positions:
+            payee_by_position.setdefault(position, payee)
+    return {
+        'issues': snapshot.issues,
+        'overview': reports.overview(snapshot),
+        'by_frequency': [reports.frequency_table(snapshot, frequency) for frequency in reports.FREQUENCIES],
+        'matrix': payment_matrix(snapshot.payments, payee_by_position, list(payees), [bill.label for bill in snapshot],
+            issues=snapshot.issues),
+    }
+
+
+def _stage_render(snapshot, aggregates:dict, render_bills:int) -> int:
+    images = 0
+    for bill in snapshot.bills[:render_bills]:
+        bill_issues = bill.values[~bill.values['genesis']]
+        history = bill_issues['issued'].dt.strftime('%Y-%m-%d').tolist()
+        deltas = [0] + bill_issues['amount'].diff().iloc[1:].tolist()
+        charts.price_delta(bill.label, history, deltas, bill_issues['data'].tolist())
+        charts.delta_heatmap(bill.label, history, deltas)
+        images += 2
+
+    issues = aggregates['issues']
+    issues = issues[issues['bill'].isin([bill.label for bill in snapshot.bills[:render_bills]])]
+    charts.bill_history(pd.DataFrame({
+        'Date': issues['issued'].dt.strftime('%Y-%m-%d'),
+        'Value': issues['amount'],
+        'Bill': issues['bill'],
+    }).sort_values(by='Date'))
+    matrix = aggregates['matrix']
+    for payee in matrix.index.get_level_values(0).unique():
+        rows = matrix.loc[payee].rename_axis(None)
+        charts.payment_history(rows.iloc[:render_bills])
+        images += 1
+    return images + 1
+
+
+def physical_memory() -> int | None:
+    '''Bytes of physical memory, or None where the platform does not say.'''
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def run_size(blocks:int, workdir:str, years:float, repeat:int, render_bills:int, seed:int = 0) -> dict:
+    '''Generate about `blocks` blocks and time every stage; best of `repeat` runs.'''
+    path = os.path.join(workdir, f'ledger-{blocks}.sqlite')
+    started = time.perf_counter()
+    bills, payees = generate(path, bills_for(blocks, years=years), years=years, seed=seed)
+    result = {
+        'blocks_target': blocks,
+        'bills': len(bills),
+        'generate_s': round(time.perf_counter() - started, 4),
+        'stages': { stage : [] for stage in STAGES },
+        'errors': {},
+    }
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        result['blocks'] = conn.execute('SELECT COUNT(*) FROM `HybridLedgers`').fetchone()[0]
+        result['positions'] = conn.execute('SELECT COUNT(DISTINCT position) FROM `HybridLedgers`').fetchone()[0]
+        for _ in range(repeat):
+            try:
+                timings = {}
+                started = time.perf_counter()
+                snapshot = _stage_load(conn, bills)
+                timings['load'] = time.perf_counter()
+
+                _stage_decode(snapshot)
+                timings['decode'] = time.perf_counter()
+
+                aggregates = _stage_aggregate(snapshot, payees)
+                timings['aggregate'] = time.perf_counter()
+
+                result['images'] = _stage_render(snapshot, aggregates, render_bills)
+                timings['render'] = time.perf_counter()
+            except MemoryError as error:
+                # record how far this size got instead of losing the whole run
+                result['errors'][type(error).__name__] = str(error)
+                break
+            for stage in STAGES:
+                if stage in timings:
+                    result['stages'][stage].append(round(timings[stage] - started, 4))
+                    started = timings[stage]
+            snapshot = aggregates = None
+    finally:
+        conn.close()
+
+    result['best_s'] = { stage : min(times) for stage, times in result['stages'].items() if times }
+    return result
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.benchmark',
+        description='Time the dashboard data paths over synthetic ledgers.',
+        epilog=f'Each size holds its whole ledger in memory, about {MEMORY_PER_BLOCK} bytes a block '
+            f'(10M blocks: ~{10 ** 7 * MEMORY_PER_BLOCK / 2 ** 30:.0f} GiB); sizes that would not fit in '
+            'physical memory are skipped.')
+    parser.add_argument('--sizes', default='1k,100k,10M', help='block counts (default: %(default)s)')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--workdir', help='where to write the databases (default: a temporary directory)')
+    parser.add_argument('--years', type=float, default=2.0, help='history per bill (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--render-bills', type=int, default=12)
+    args = parser.parse_args(argv)
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as scratch:
+        workdir = args.workdir or scratch
+        os.makedirs(workdir, exist_ok=True)
+        memory = physical_memory()
+        for size in args.sizes.split(','):
+            blocks = parse_size(size)
+            if memory and blocks * MEMORY_PER_BLOCK > memory:
+                skipped = f'needs about {blocks * MEMORY_PER_BLOCK / 2 ** 30:.1f} GiB, {memory / 2 ** 30:.1f} GiB physical'
+                report['results'].append({ 'blocks_target' : blocks, 'skipped' : skipped })
+                print(f'{blocks:>10} blocks  skipped: {skipped}', file=sys.stderr)
+            else:
+                result = run_size(blocks, workdir, args.years, args.repeat, args.render_bills)
+                report['results'].append(result)
+                print(f'{result["blocks"]:>10} blocks  ' + '  '.join(
+                    f'{stage} {seconds:.3f}s' for stage, seconds in result['best_s'].items()), file=sys.stderr)
+
+            # written after every size, so a long run leaves partial results behind
+            with open(args.output, 'w') as output:
+                json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from hybridledger import config, profiling
+from hybridledger.db import ConnectionPool, connect_readonly
+from hybridledger.decode import append_decoded, decode_blocks
+from hybridledger.ledger import LEDGER_COLUMNS, ServerHL, ServerHLChain, read_blocks
+
+_TAIL_COLUMNS = ', '.join(f'"{column}"' for column in LEDGER_COLUMNS)
+
+CONSISTENT_READS = 3
+'''Attempts `LedgerCache.get_blocks` makes at reading every position as of one database version.'''
+
+
+class LedgerCache:
+    '''
+    Ledger blocks shared by every dashboard session in the process.
+
+    Positions are kept in least-recently-used order and evicted once
+    `max_positions` positions or `max_blocks` blocks are held.
+
+    Invalidation is cheap: `PRAGMA data_version` only changes when
+    another connection (the Node server) commits, so an unchanged
+    database costs one pragma per load. When it does change, the
+    cached positions are marked stale and each stale position is
+    topped up from its watermark the next time it is asked for.
+
+    Blocks are read on connections borrowed from `pool`, outside the
+    cache lock, so sessions loading different bills read concurrently.
+
+    `tail` appends the rows added since its last call straight to the
+    cached positions (see `hybridledger.live`), so they are fresh
+    without waiting for a session to top them up.
+    '''
+
+    def __init__(
+            self,
+            pool:ConnectionPool | str,
+            max_positions:int = config.CACHE_MAX_POSITIONS,
+            max_blocks:int = config.CACHE_MAX_BLOCKS
+        ):
+        self.pool = ConnectionPool(pool) if isinstance(pool, str) else pool
+        self.max_positions = max_positions
+        self.max_blocks = max_blocks
+
+        # data_version is per connection, so it always comes from this one
+        self._conn = connect_readonly(self.pool.path)
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()
+        #'''{position: [ServerHL, ...]} in LRU order'''
+        self._frames = {}
+        #'''{position: decoded DataFrame}, decoded once per position'''
+        self._stale = set()
+        self._block_count = 0
+        self._data_version = None
+        self._tail_version = None
+        self._tail_id = None
+        #'''highest row id `tail` has read'''
+        self._reads = {}
+        #'''{token: (positions being read, positions to top up before storing them)}'''
+        pass
+
+    def __len__(self):
+        return len(self._blocks)
+
+    @profiling.timed()
+    def get_blocks(self, positions:list[str]) -> dict[str, list[ServerHL]]:
+        '''
+        Return `{position: [ServerHL, ...]}` for `positions`, reading only
+        what is missing or stale. All reads share one read transaction,
+        plus a top-up for positions that grew while it was in flight.
+
+        Cached and newly read positions are as of one database version:
+        if another connection commits while they are gathered, they are
+        gathered again (up to `CONSISTENT_READS` times, after which the
+        last attempt is returned as is).
+
+        The returned lists are shared with the cache; treat them as read-only.
+        '''
+        positions = list(dict.fromkeys(positions))
+        for _ in range(CONSISTENT_READS):
+            result, data_version = self._gather(positions)
+            with self._lock:
+                # nothing committed since the cached positions were checked, so the
+                # reads (which started after that) saw the same version
+                if self._conn.execute('PRAGMA data_version').fetchone()[0] == data_version:
+                    break
+        return result
+
+    def _gather(self, positions:list[str]) -> tuple[dict[str, list[ServerHL]], int]:
+        # `positions` from the cache or the database, and the data_version they were checked at
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                self._mark_stale()
+                self._data_version = data_version
+
+            result = { position : self._blocks[position] for position in positions
+                if position in self._blocks and position not in self._stale }
+            missing = [position for position in positions if position not in self._blocks]
+            stale = { position : self._blocks[position] for position in positions if position in self._stale }
+            if missing or stale:
+                # positions that may have grown after our read started (see `_mark_stale`, `tail`)
+                token = object()
+                missed = set()
+                self._reads[token] = (set(missing) | set(stale), missed)
+
+        if missing or stale:
+            since = { position : (base[-1].index, base[-1].timestamp) for position, base in stale.items() if base }
+            read = {}
+            topped = {}
+            try:
+                with self.pool.connection() as conn:
+                    again = None
+                    while True:
+                        conn.execute('BEGIN')
+                        try:
+                            if again is None:
+                                read = read_blocks(conn, missing) if missing else {}
+                                topped = read_blocks(conn, list(stale), since) if stale else {}
+                            else:
+                                current = { position : read[position] if position in read else stale[position] + topped[position]
+                                    for position in again }
+                                marks = { position : (blocks[-1].index, blocks[-1].timestamp)
+                                    for position, blocks in current.items() if blocks }
+                                for position, blocks in read_blocks(conn, again, marks).items():
+                                    if position in read:
+                                        read[position] = read[position] + blocks
+                                    else:
+                                        topped[position] = topped[position] + blocks
+                        finally:
+                            conn.execute('COMMIT')
+
+                        with self._lock:
+                            if missed:
+                                # published as read, these would miss the rows for good
+                                again = list(missed)
+                                missed.clear()
+                                continue
+                            self._publish(result, read, topped, stale)
+                            break
+            finally:
+                with self._lock:
+                    del self._reads[token]
+
+        with self._lock:
+            for position in positions:
+                if position in self._blocks:
+                    self._blocks.move_to_end(position)
+            self._evict(keep=len(positions))
+        return { position : result[position] for position in positions }, data_version
+
+    def _publish(self, result:dict, read:dict[str, list[ServerHL]], topped:dict[str, list[ServerHL]],
+            stale:dict[str, list[ServerHL]]):
+        # with the lock held: store what a read found, keeping what another session stored meanwhile
+        for position, blocks in read.items():
+            result[position] = self._blocks.get(position, blocks)
+            if position not in self._blocks:
+                self._store(position, blocks)
+        for position, blocks in topped.items():
+            base = stale[position]
+            # new list, so callers holding the old one keep a consistent view
+            result[position] = base + blocks if blocks else base
+            if self._blocks.get(position) is base:
+                if blocks:
+                    frame = self._frames.get(position)
+                    self._store(position, result[position],
+                        None if frame is None else append_decoded(frame, blocks))
+                self._stale.discard(position)
+            elif position in self._blocks:
+                result[position] = self._blocks[position]
+        return
+
+    def _mark_stale(self, positions:set[str] = None):
+        # with the lock held: cached positions (or `positions`) are topped up on their next
+        # read, and reads in flight, whose transaction may predate the change, before they store
+        self._stale.update(self._blocks if positions is None else positions & self._blocks.keys())
+        for wanted, missed in self._reads.values():
+            missed.update(wanted if positions is None else wanted & positions)
+        return
+
+    @profiling.timed()
+    def tail(self) -> set[str]:
+        '''
+        Append the rows added since the last call to the cached positions:
+        one `PRAGMA data_version`, and one query for the new rows when it
+        changed. Returns every position rows were appended to, cached or
+        not (positions not appended here are read or topped up later).
+
+        Rows are read by id, so only appended blocks are seen (as by the
+        watermark top-ups); the first call only records where to start.
+        '''
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._tail_version:
+                return set()
+            if self._tail_id is None:
+                self._tail_id = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM "HybridLedgers"').fetchone()[0]
+                self._tail_version = data_version
+                return set()
+
+            rows = self._conn.execute(f'SELECT id, {_TAIL_COLUMNS} FROM "HybridLedgers" WHERE id > ? ORDER BY id',
+                (self._tail_id,)).fetchall()
+            profiling.count_query(len(rows))
+            appended = {}
+            for row in rows:
+                appended.setdefault(row[1 + LEDGER_COLUMNS.index('position')], []).append(ServerHL(*row[1:]))
+
+            # stale positions are topped up from their watermark on their next read, and
+            # positions being read before the read stores them
+            skipped = { position for position in appended if position not in self._blocks or position in self._stale }
+            self._mark_stale(skipped)
+            for position, blocks in appended.items():
+                base = self._blocks.get(position)
+                if position in skipped:
+                    continue
+                if base:
+                    # skip rows a top-up already read (same rule as the watermark reads)
+                    mark = (base[-1].index, base[-1].timestamp)
+                    blocks = [block for block in blocks if (block.index, block.timestamp) > mark]
+                if blocks:
+                    frame = self._frames.get(position)
+                    # new list, so callers holding the old one keep a consistent view
+                    self._store(position, base + blocks, None if frame is None else append_decoded(frame, blocks))
+
+            if rows:
+                self._tail_id = rows[-1][0]
+            # every append up to `data_version` is in the cache (or marked stale, or left
+            # to the read in flight to top up), so
+            # `get_blocks` need not mark the positions stale again
+            self._data_version = data_version
+            self._tail_version = data_version
+        return set(appended)
+
+    def data_version(self) -> int:
+        '''The database's `PRAGMA data_version` on the cache's connection: it changes only when another connection commits.'''
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def get_frames(self, positions:list[str]) -> dict[str, pd.DataFrame]:
+        '''Decoded chains for `positions` (see `hybridledger.decode`), read-only.'''
+        return self._decode(self.get_blocks(positions))
+
+    def load_chains(self, chains:list[ServerHLChain]) -> list[ServerHLChain]:
+        '''Fill the blocks and decoded frames of every chain from the cache.'''
+        blocks = self.get_blocks([position for chain in chains for position in chain.positions])
+        frames = self._decode(blocks)
+        for chain in chains:
+            chain.assign_blocks(blocks, frames=frames)
+        return chains
+
+    @profiling.timed('LedgerCache.decode')
+    def _decode(self, blocks:dict[str, list[ServerHL]]) -> dict[str, pd.DataFrame]:
+        # decode each position once; reuse while its block list is unchanged
+        frames = {}
+        pending = []
+        with self._lock:
+            for position, chain in blocks.items():
+                frame = self._frames.get(position)
+                if frame is None or len(frame) != len(chain):
+                    pending.append(position)
+                else:
+                    frames[position] = frame
+
+        if pending:
+            # one decode for every position (decoding is mostly per-call overhead), then split
+            decoded = decode_blocks([block for position in pending for block in blocks[position]])
+            start = 0
+            with self._lock:
+                for position in pending:
+                    chain = blocks[position]
+                    frame = decoded.iloc[start:start + len(chain)].reset_index(drop=True)
+                    start += len(chain)
+                    if self._blocks.get(position) is chain:
+                        self._frames[position] = frame
+                    frames[position] = frame
+        return { position : frames[position] for position in blocks }
+
+    def clear(self):
+        '''Drop every cached position.'''
+        with self._lock:
+            self._blocks.clear()
+            self._frames.clear()
+            self._stale.clear()
+            self._block_count = 0
+        return
+
+    def close(self):
+        '''Drop every cached position and close the connections.'''
+        self.clear()
+        self._conn.close()
+        self.pool.close()
+        return
+
+    def _store(self, position:str, blocks:list[ServerHL], frame:pd.DataFrame = None):
+        self._block_count += len(blocks) - len(self._blocks.get(position, ()))
+        self._blocks[position] = blocks
+        if frame is None:
+            self._frames.pop(position, None)
+        else:
+            self._frames[position] = frame
+        return
+
+    def _evict(self, keep:int):
+        # never evict the `keep` most recent positions (the ones just returned)
+        while len(self._blocks) > keep and (
+                len(self._blocks) > self.max_positions or self._block_count > self.max_blocks):
+            position, blocks = self._blocks.popitem(last=False)
+            self._frames.pop(position, None)
+            self._stale.discard(position)
+            self._block_count -= len(blocks)
+        return
@@ -0,0 +1,345 @@
+'''
+Dashboard charts, rendered to PNG bytes.
+
+Every chart function takes plain data and returns the finished image,
+so `ChartCache` can serve an unchanged chart without drawing it again.
+Charts draw on their own `Figure` (no global pyplot state), so they
+are safe to draw from concurrent sessions and in worker processes.
+matplotlib and seaborn are only imported once a chart is drawn.
+'''
+
+import atexit
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from hybridledger import config, profiling
+from hybridledger.workers import start_pool
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+SAVEFIG_OPTIONS = { 'format' : 'png', 'dpi' : 200, 'bbox_inches' : 'tight' }
+'''Same output as `st.pyplot` produces.'''
+
+
+def _figure(**kwargs) -> 'Figure':
+    # matplotlib is imported by the first chart drawn, not at dashboard start
+    from matplotlib.figure import Figure
+    return Figure(**kwargs)
+
+
+def _png(figure:'Figure') -> bytes:
+    buffer = io.BytesIO()
+    figure.savefig(buffer, **SAVEFIG_OPTIONS)
+    return buffer.getvalue()
+
+
+def price_delta(bill_name:str, history:list[str], deltas:list[float], values:list[str]) -> bytes:
+    '''Line of the change between issues, labelled with each issue's cost.'''
+    figure = _figure(figsize=(10, 5))
+    ax = figure.subplots()
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Delta ($)')
+    ax.set_title(f'{bill_name} Price Delta')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.plot(history, deltas)
+    # display horizontal line from zero
+    ax.axhline(y=0, color='gray', linestyle='--')
+    # text overlay the value of the bill in that date
+    for i in range(len(history)):
+        ax.text(history[i], deltas[i], values[i], ha='center', va='bottom')
+    return _png(figure)
+
+
+def cost_over_time(bill_name:str, history:list[str], amounts:list[float], deltas:list[float]) -> bytes:
+    '''Cost of each issue, with a guide line and delta label per issue.'''
+    import seaborn as sns
+
+    figure = _figure(figsize=(10,5))
+    ax = figure.subplots()
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Cost ($)')
+    ax.set_title(f'{bill_name} Cost Over Time')
+
+    cost_data = pd.DataFrame({
+        'Date': history,
+        'Values': amounts,
+        'Delta': deltas
+    })
+
+    sns.lineplot(x='Date', y='Values', data=cost_data, color='gray', ax=ax)
+    # Show the delta below each point along with a white label background
+    for i in range(len(cost_data)):
+        ax.text(cost_data['Date'][i], cost_data['Values'][i], f"${cost_data['Values'][i]} | d=\\${cost_data['Delta'][i]:.2f} ", ha='center', va='bottom')
+
+    # Show line for each y
+    for i in range(len(cost_data)):
+        ax.axhline(y=cost_data['Values'][i], color='gray', linestyle='--')
+    # Show the date on the x-axis
+    ax.tick_params(axis='x', labelrotation=45)
+    return _png(figure)
+
+
+def delta_heatmap(bill_name:str, history:list[str], deltas:list[float], date_ticks:bool = False) -> bytes:
+    '''One annotated cell per issue, coloured by the change from the last issue.'''
+    import seaborn as sns
+
+    heatmap_data = pd.DataFrame({
+        'Date': history,
+        'Delta': deltas
+    })
+
+    # Setting Date as the index for a clean heatmap display
+    heatmap_data['Date'] = pd.to_datetime(heatmap_data['Date'])
+    heatmap_data = heatmap_data.set_index('Date')
+
+    # Transpose to have dates as columns
+    heatmap_data = heatmap_data.T
+
+    figure = _figure(figsize=(10, 2))  # Adjust height for better readability
+    ax = figure.subplots()
+    sns.heatmap(heatmap_data, annot=True, fmt=".1f", cmap="seismic", center=0, cbar_kws={'label': 'Delta ($)'}, ax=ax)
+    ax.set_title(f'{bill_name} Delta Changes Over Time')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Delta ($)')
+
+    if date_ticks:
+        # format the date labels to YYYY-MM-DD
+        ax.set_xticks(range(len(history)), [str(i) for i in history])
+        ax.tick_params(axis='x', labelrotation=45)
+        # move tick to center of cell
+        ax.tick_params(axis='x', which='major', pad=10)
+    return _png(figure)
+
+
+def bill_history(history:pd.DataFrame) -> bytes:
+    '''Cost of every bill over time (`Date`, `Value`, `Bill` columns), one line per bill.'''
+    import seaborn as sns
+
+    figure = _figure(figsize=(10, 8))
+    ax = figure.subplots()
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Cost ($)')
+    ax.set_title('Bill History')
+    sns.lineplot(x='Date', y='Value', hue='Bill', data=history, ax=ax)
+    # put the legend beside the graph instead of on it
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+    # Show the date on the x-axis
+    ax.tick_params(axis='x', labelrotation=45)
+    return _png(figure)
+
+
+def frequency_bars(frequency:str, bills:pd.DataFrame) -> bytes:
+    '''Last value of each bill over its approximate monthly cost.'''
+    figure = _figure(figsize=(10, 5))
+    ax = figure.subplots()
+    ax.set_xlabel('Bill')
+    ax.set_ylabel('Last Value ($)')
+    ax.set_title(f'{frequency} Bills')
+    for i, bill in enumerate(bills['Bill']):
+        # display a red bar in the background showing the monthly value
+        ax.bar(i, bills['Appx. Monthly Cost'][i], color='#2f2f2f')
+        ax.bar(i, bills['Last Value'][i], color='lightblue')
+        ax.text(i, bills['Last Value'][i]/2, f"${bills['Last Value'][i]:.2f}", ha='center', va='center')
+        if frequency not in ['Monthly', 'Bi-monthly']:
+            ax.text(i, bills['Appx. Monthly Cost'][i], f"${bills['Appx. Monthly Cost'][i]:.2f}/month", ha='center', va='bottom')
+
+    ax.set_xticks(range(len(bills['Bill'])), bills['Bill'])
+    ax.tick_params(axis='x', labelrotation=45)
+    return _png(figure)
+
+
+def responsibility_bars(frequency:str, bills:pd.DataFrame) -> bytes:
+    '''Last value of each bill split between the people responsible.'''
+    figure = _figure(figsize=(10, 5))
+    ax = figure.subplots()
+    ax.set_xlabel('Bill')
+    ax.set_ylabel('Appx. Value Per Responsible ($)')
+    ax.set_title(f'{frequency} Bills by Responsibility')
+    for i, bill in enumerate(bills['Bill']):
+        share = bills['Last Value'][i] / bills['# Responsible'][i]
+        ax.bar(i, share, color='lightblue')
+        ax.text(i, share / 2, f"${share:.2f} * {bills['# Responsible'][i]}", ha='center', va='center')
+
+    ax.set_xticks(range(len(bills['Bill'])), bills['Bill'])
+    ax.tick_params(axis='x', labelrotation=45)
+    return _png(figure)
+
+
+def payment_history(matrix:pd.DataFrame, xlabel:str = 'Month') -> bytes:
+    '''Bill x period grid of payments (1 = paid), as drawn per payee.'''
+    figure = _figure(figsize=(10, 5))
+    ax = figure.subplots()
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('Bill')
+    ax.set_title('Payment History')
+
+    ax.imshow(matrix.values, cmap='Greys', aspect='auto')
+    ax.set_yticks(range(len(matrix.index)), matrix.index)
+    ax.set_xticks(range(len(matrix.columns)), matrix.columns)
+    ax.tick_params(axis='x', labelrotation=45)
+    return _png(figure)
+
+
+def tile_map(matrix:pd.DataFrame, title:str, label:str, top:int = 9) -> bytes:
+    '''
+    Grid of tiles (`tiles.tile_matrix`, north up) coloured by a metric;
+    a grid of owners is drawn with one colour per owner, the `top` most
+    frequent named in a legend.
+    '''
+    import numpy as np
+    from matplotlib import colormaps
+    from matplotlib.colors import ListedColormap
+    from matplotlib.patches import Patch
+
+    figure = _figure(figsize=(10, 8))
+    ax = figure.subplots()
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.set_title(title)
+    extent = (matrix.columns[0] - 0.5, matrix.columns[-1] + 0.5, matrix.index[-1] - 0.5, matrix.index[0] + 0.5)
+
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in matrix.dtypes):
+        stacked = matrix.stack()
+        owners = stacked.value_counts().index[:top]
+        codes = pd.Categorical(matrix.to_numpy().ravel(), categories=owners).codes.reshape(matrix.shape)
+        # owners beyond the top share one grey; empty tiles are left blank
+        grid = np.where(codes >= 0, codes, len(owners)).astype('float64')
+        grid[matrix.isna().to_numpy()] = np.nan
+        cmap = ListedColormap([*colormaps['tab10'].colors[:len(owners)], 'lightgrey'])
+        ax.imshow(grid, cmap=cmap, vmin=0, vmax=len(owners), extent=extent, interpolation='nearest', aspect='auto')
+        handles = [Patch(color=cmap(i), label=owner[:12]) for i, owner in enumerate(owners)]
+        ax.legend(handles=handles, title=label, bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+    else:
+        image = ax.imshow(matrix.to_numpy(dtype='float64'), cmap='viridis', extent=extent,
+            interpolation='nearest', aspect='auto')
+        figure.colorbar(image, ax=ax, label=label)
+    return _png(figure)
+
+
+def job(chart, *args, **kwargs) -> tuple:
+    '''Describe one `chart(*args, **kwargs)` call for `ChartCache.render_many`.'''
+    return (chart, args, kwargs)
+
+
+def _draw(job:tuple) -> bytes:
+    chart, args, kwargs = job
+    return chart(*args, **kwargs)
+
+
+def _draw_timed(job:tuple) -> tuple[bytes, float]:
+    # _draw for a profiled parent: the worker reports how long the figure took
+    started = time.perf_counter()
+    return _draw(job), time.perf_counter() - started
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # workers fork from a server that has the plotting libraries imported already
+            _pool = start_pool(config.RENDER_WORKERS, preload=[__name__, 'matplotlib.figure', 'seaborn'])
+            atexit.register(_pool.terminate)
+    return _pool
+
+
+def fingerprint(*parts) -> str:
+    '''SHA-256 over chart inputs; DataFrames/Series are hashed by content.'''
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+            labels = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr(list(labels)).encode())
+        elif isinstance(part, dict):
+            digest.update(fingerprint(*sorted(part.items())).encode())
+        elif isinstance(part, (list, tuple)):
+            digest.update(fingerprint(*part).encode())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ChartCache:
+    '''
+    Finished chart images keyed by a fingerprint of the chart function
+    and its arguments (data and styling). Least recently used charts
+    are dropped past `max_entries`; a chart is only redrawn when its
+    inputs change.
+    '''
+
+    def __init__(self, max_entries:int = config.CHART_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        pass
+
+    def __len__(self):
+        return len(self._images)
+
+    def render(self, chart, *args, **kwargs) -> bytes:
+        '''PNG of `chart(*args, **kwargs)`, drawn only on a cache miss.'''
+        key = fingerprint(chart.__module__, chart.__qualname__, args, kwargs)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return self._images[key]
+        with profiling.stage(f'chart:{chart.__name__}'):
+            return self._store(key, chart(*args, **kwargs))
+
+    def render_many(self, jobs:list[tuple]) -> list[bytes]:
+        '''
+        PNGs of every `job(...)`, in order. Cache misses are drawn in
+        parallel on a process pool (`HL_RENDER_WORKERS`), or inline when
+        there is a single miss or only one worker.
+        '''
+        keys = [fingerprint(chart.__module__, chart.__qualname__, args, kwargs) for chart, args, kwargs in jobs]
+        images = [None] * len(jobs)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._images:
+                    self._images.move_to_end(key)
+                    self.hits += 1
+                    images[i] = self._images[key]
+
+        missing = [i for i, image in enumerate(images) if image is None]
+        if len(missing) > 1 and config.RENDER_WORKERS > 1:
+            if profiling.ENABLED:
+                timed = _get_pool().map(_draw_timed, [jobs[i] for i in missing], chunksize=1)
+                for i, (_, wall) in zip(missing, timed):
+                    profiling.record(f'chart:{jobs[i][0].__name__}', wall, worker=True)
+                drawn = [image for image, _ in timed]
+            else:
+                drawn = _get_pool().map(_draw, [jobs[i] for i in missing], chunksize=1)
+        else:
+            drawn = (self._draw_inline(jobs[i]) for i in missing)
+        for i, image in zip(missing, drawn):
+            images[i] = self._store(keys[i], image)
+        return images
+
+    @staticmethod
+    def _draw_inline(job:tuple) -> bytes:
+        with profiling.stage(f'chart:{job[0].__name__}'):
+            return _draw(job)
+
+    def _store(self, key:str, image:bytes) -> bytes:
+        with self._lock:
+            self.misses += 1
+            self._images[key] = image
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
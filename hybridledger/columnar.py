@@ -0,0 +1,255 @@
+'''
+Columnar export of the HybridLedgers table, and reads from it.
+
+    python -m hybridledger.columnar DIRECTORY [--format arrow|parquet] [--database PATH] [--full]
+
+The table is written as a dataset partitioned by position
+(`DIRECTORY/position=<position>/part-*.arrow`), appending only the rows
+added since the last export. Arrow IPC files are read back through
+memory-mapped, zero-copy buffers, so analytics over every position's
+history never touch SQLite (or wait on the Node server's writes).
+
+Ledgers are append-only, but the server's `/fix` route rewrites
+`minted`, `nonce` and `previousHash` in place; re-run with `--full`
+after using it.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from hybridledger import config, profiling
+from hybridledger.db import connect_readonly
+from hybridledger.decode import decode_frame
+from hybridledger.ledger import ServerHL, ServerHLChain
+
+
+SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('index', pa.int64()),
+    ('position', pa.string()),
+    ('ownership', pa.string()),
+    ('blockType', pa.int64()),
+    ('data', pa.string()),
+    ('previousHash', pa.string()),
+    ('minted', pa.int64()),
+    ('nonce', pa.int64()),
+    ('timestamp', pa.int64()),
+    ('uuid', pa.string()),
+])
+'''`HybridLedgers` columns as exported; `id` keeps the SQLite row order.'''
+
+PARTITIONING = ds.partitioning(pa.schema([('position', pa.string())]), flavor='hive')
+
+FORMATS = { 'arrow' : ds.IpcFileFormat(), 'parquet' : ds.ParquetFileFormat() }
+
+MANIFEST = '_export.json'
+
+EXPORT_BATCH = 500000
+'''Rows read from SQLite per exported batch.'''
+
+MAX_PARTS = 16
+'''Files a position may collect from incremental exports before it is compacted into one.'''
+
+
+def read_manifest(directory:str) -> dict:
+    '''The last export's `{'format', 'last_id', 'rows', 'exported', 'exported_at'}`, or `{}`.'''
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(directory:str, manifest:dict):
+    # replaced atomically, so readers never see a half-written manifest
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as output:
+        json.dump(manifest, output, indent=2)
+    os.replace(path + '.tmp', path)
+    return
+
+
+def _partitions(directory:str) -> list[str]:
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith('position=') and os.path.isdir(os.path.join(directory, name))]
+
+
+def _read_batch(conn, after:int, until:int) -> pa.Table:
+    columns = ', '.join(f'"{column}"' for column in SCHEMA.names)
+    rows = conn.execute(f'SELECT {columns} FROM "HybridLedgers" WHERE id > ? AND id <= ?', (after, until)).fetchall()
+    columns = list(zip(*rows)) if rows else [[] for _ in SCHEMA]
+    return pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, SCHEMA)],
+        schema=SCHEMA)
+
+
+def export(database:str, directory:str, format:str = 'arrow', full:bool = False) -> dict:
+    '''
+    Export the rows added to `database` since the last export into
+    `directory` (everything with `full`, or when the format changed).
+    Returns the new manifest.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    if full or manifest.get('format') != format:
+        for partition in _partitions(directory):
+            shutil.rmtree(partition)
+        manifest = { 'format' : format, 'last_id' : 0, 'rows' : 0 }
+    manifest['exported'] = 0
+
+    conn = connect_readonly(database)
+    try:
+        # one read transaction, so the export is a consistent cut at `last_id`
+        conn.execute('BEGIN')
+        try:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM "HybridLedgers"').fetchone()[0]
+            first_id = manifest['last_id']
+            for after in range(first_id, last_id, EXPORT_BATCH):
+                table = _read_batch(conn, after, min(after + EXPORT_BATCH, last_id))
+                ds.write_dataset(
+                    table.sort_by([('position', 'ascending'), ('index', 'ascending'), ('id', 'ascending')]),
+                    directory,
+                    format=FORMATS[format],
+                    partitioning=PARTITIONING,
+                    basename_template=f'part-{after + 1:012d}-{{i}}.{format}',
+                    existing_data_behavior='overwrite_or_ignore')
+                manifest['rows'] += table.num_rows
+                manifest['exported'] += table.num_rows
+        finally:
+            conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+    compact(directory, format)
+    manifest.update(last_id=last_id, exported_at=datetime.now().isoformat())
+    _write_manifest(directory, manifest)
+    return manifest
+
+
+def compact(directory:str, format:str = 'arrow', max_parts:int = MAX_PARTS) -> int:
+    '''Rewrite every position holding more than `max_parts` files as one file; returns how many.'''
+    compacted = 0
+    for partition in _partitions(directory):
+        parts = sorted(name for name in os.listdir(partition) if name.startswith('part-'))
+        if len(parts) <= max_parts:
+            continue
+        table = ds.dataset([os.path.join(partition, name) for name in parts], format=FORMATS[format]).to_table()
+        # written aside (readers skip dot-prefixed paths), named after the first part
+        scratch = os.path.join(directory, '.compact-' + os.path.basename(partition))
+        ds.write_dataset(table, scratch, format=FORMATS[format],
+            basename_template=f'{parts[0].rsplit("-", 1)[0]}-{{i}}.{format}')
+        shutil.rmtree(partition)
+        os.replace(scratch, partition)
+        compacted += 1
+    return compacted
+
+
+class ArrowSource:
+    '''
+    Ledger chains read from a columnar export instead of SQLite.
+
+    Behaves like `LedgerCache` for `LedgerSnapshot` (`load_chains`,
+    `get_frames`, `get_blocks`), but reads are as fresh as the last
+    export. Every position is decoded in one vectorized pass. The
+    dataset is reopened when a new export finishes.
+    '''
+
+    def __init__(self, directory:str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._exported_at = None
+        pass
+
+    def dataset(self, reopen:bool = False) -> ds.Dataset:
+        '''The dataset as of the last finished export.'''
+        manifest = read_manifest(self.directory)
+        with self._lock:
+            if reopen or self._dataset is None or manifest.get('exported_at') != self._exported_at:
+                if not manifest:
+                    raise FileNotFoundError(f'no export in {self.directory}')
+                self._dataset = ds.dataset(
+                    self.directory,
+                    schema=SCHEMA,
+                    format=FORMATS[manifest['format']],
+                    partitioning=PARTITIONING,
+                    # zero-copy reads of Arrow IPC files
+                    filesystem=fs.LocalFileSystem(use_mmap=True),
+                    exclude_invalid_files=True,
+                    ignore_prefixes=['_', '.'])
+                self._exported_at = manifest.get('exported_at')
+            return self._dataset
+
+    @profiling.timed('ArrowSource.read')
+    def read_table(self, positions:list[str]) -> pd.DataFrame:
+        '''Rows of `positions` in chain order (position, index, then row id).'''
+        wanted = ds.field('position').isin(list(dict.fromkeys(positions)))
+        try:
+            table = self.dataset().to_table(filter=wanted)
+        except OSError:
+            # an export compacted files away between our listing and the read
+            table = self.dataset(reopen=True).to_table(filter=wanted)
+        profiling.count_query(table.num_rows)
+        frame = table.to_pandas().sort_values(['position', 'index', 'id'], kind='stable')
+        return frame.astype({ column : object for column in ('position', 'ownership', 'data', 'previousHash', 'uuid') })
+
+    def get_frames(self, positions:list[str]) -> dict[str, pd.DataFrame]:
+        '''Decoded chains for `positions` (see `hybridledger.decode`).'''
+        return _frames(self.read_table(positions), positions)
+
+    def get_blocks(self, positions:list[str]) -> dict[str, list[ServerHL]]:
+        '''`{position: [ServerHL, ...]}` for `positions`, like `read_blocks`.'''
+        return _blocks(self.read_table(positions), positions)
+
+    def load_chains(self, chains:list[ServerHLChain]) -> list[ServerHLChain]:
+        '''Fill the blocks and decoded frames of every chain from one read.'''
+        positions = list(dict.fromkeys(position for chain in chains for position in chain.positions))
+        table = self.read_table(positions)
+        blocks = _blocks(table, positions)
+        frames = _frames(table, positions)
+        for chain in chains:
+            chain.assign_blocks(blocks, frames=frames)
+        return chains
+
+
+def _frames(table:pd.DataFrame, positions:list[str]) -> dict[str, pd.DataFrame]:
+    # decode every position in one pass, then split
+    decoded = decode_frame(table)
+    frames = { position : frame.reset_index(drop=True) for position, frame in decoded.groupby('position', sort=False) }
+    empty = decoded.iloc[:0]
+    return { position : frames.get(position, empty) for position in positions }
+
+
+def _blocks(table:pd.DataFrame, positions:list[str]) -> dict[str, list[ServerHL]]:
+    blocks = { position : [] for position in positions }
+    for position, rows in table.groupby('position', sort=False):
+        blocks[position] = ServerHL.from_frame(rows)
+    return blocks
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.columnar',
+        description='Export HybridLedgers to a columnar dataset partitioned by position.')
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=list(FORMATS), default='arrow')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--full', action='store_true', help='export every row again')
+    args = parser.parse_args(argv)
+
+    manifest = export(args.database, args.directory, args.format, args.full)
+    print(f'{args.directory}: {manifest["exported"]} rows exported, '
+        f'{manifest["rows"]} in total, up to id {manifest["last_id"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
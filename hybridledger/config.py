@@ -0,0 +1,98 @@
+'''Settings for the Python tools, read from environment variables.'''
+
+import hashlib
+import os
+
+
+def _int(name:str, default:int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _flag(name:str) -> bool:
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _state_dir(database:str) -> str:
+    # one directory per ledger database, named after it and told apart by its full path
+    path = os.path.abspath(database)
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache, 'hybridledger', f'{name}-{hashlib.sha1(path.encode()).hexdigest()[:8]}')
+
+
+CACHE_MAX_POSITIONS = _int('HL_CACHE_MAX_POSITIONS', 4096)
+'''Ledger positions kept by the shared ledger cache before LRU eviction.'''
+
+CACHE_MAX_BLOCKS = _int('HL_CACHE_MAX_BLOCKS', 500000)
+'''Blocks kept by the shared ledger cache before LRU eviction (memory bound).'''
+
+CHART_CACHE_ENTRIES = _int('HL_CHART_CACHE_ENTRIES', 256)
+'''Rendered chart images kept by the chart cache before LRU eviction.'''
+
+RENDER_WORKERS = _int('HL_RENDER_WORKERS', os.cpu_count() or 1)
+'''Processes drawing charts in parallel; 1 draws in the calling thread.'''
+
+DATABASE = os.environ.get('HL_DATABASE') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'module', 'database.sqlite')
+'''The ledger database written by the Node server (module/db.js).'''
+
+STATE_DIR = os.environ.get('HL_STATE_DIR') or _state_dir(DATABASE)
+'''
+Directory of the tools' own side databases (created on first use), so
+they never write next to the Node server's database.
+'''
+
+DB_POOL_SIZE = _int('HL_DB_POOL_SIZE', 4)
+'''Read-only SQLite connections kept open for concurrent readers.'''
+
+SQLITE_CACHE_KIB = _int('HL_SQLITE_CACHE_KIB', 8192)
+'''Page cache per read-only connection, in KiB.'''
+
+SQLITE_MMAP_BYTES = _int('HL_SQLITE_MMAP_BYTES', 64 * 1024 * 1024)
+'''Bytes of the database file memory-mapped per read-only connection.'''
+
+SQLITE_BUSY_MS = _int('HL_SQLITE_BUSY_MS', 5000)
+'''How long a reader waits on a locked database before giving up.'''
+
+PROFILE = _flag('HL_PROFILE')
+'''Record per-stage timings, queries and memory (see hybridledger.profiling).'''
+
+PROFILE_LOG = os.environ.get('HL_PROFILE_LOG', 'hybridledger-profile.jsonl')
+'''JSON-lines file profiling records are appended to; empty to keep them in memory only.'''
+
+ARROW_DATASET = os.environ.get('HL_ARROW_DATASET', '')
+'''Columnar export to read ledgers from instead of SQLite (see hybridledger.columnar); empty to use SQLite.'''
+
+AUDIT_STATE = os.environ.get('HL_AUDIT_STATE') or os.path.join(STATE_DIR, 'audit.sqlite')
+'''Checkpoints of the chain audit (see hybridledger.audit), in `STATE_DIR`.'''
+
+AUDIT_WORKERS = _int('HL_AUDIT_WORKERS', os.cpu_count() or 1)
+'''Processes verifying chains during an audit; 1 verifies in the calling process.'''
+
+TILE_INDEX = os.environ.get('HL_TILE_INDEX') or os.path.join(STATE_DIR, 'tiles.sqlite')
+'''Spatial index and tile pyramid of ledger positions (see hybridledger.tiles), in `STATE_DIR`.'''
+
+TILE_LEVELS = _int('HL_TILE_LEVELS', 16)
+'''Zoom levels of the tile pyramid; level z tiles cover 2**z x 2**z cells.'''
+
+INTERACTIVE_CHARTS = _flag('HL_INTERACTIVE_CHARTS')
+'''Start the dashboard with interactive (browser-drawn) price charts instead of images.'''
+
+CHART_POINTS = _int('HL_CHART_POINTS', 500)
+'''Most issues an interactive chart sends to the browser; longer histories are downsampled (LTTB).'''
+
+LIVE_TAIL = _flag('HL_LIVE')
+'''Start the dashboard in live mode: new blocks are shown without a refresh (see hybridledger.live).'''
+
+LIVE_POLL_MS = _int('HL_LIVE_POLL_MS', 500)
+'''How often live mode polls the database for new blocks, and sessions check for them.'''
+
+SUMMARY_STORE = os.environ.get('HL_SUMMARY_STORE') or os.path.join(STATE_DIR, 'summary.sqlite')
+'''Per-bill summaries kept up to date from new blocks (see hybridledger.summary), in `STATE_DIR`.'''
+
+REGISTRY = os.environ.get('HL_REGISTRY') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registry.toml')
+'''The bills and payees the dashboard tracks (see hybridledger/registry.toml for the layout).'''
+
+BILL_PAGE_SIZE = _int('HL_BILL_PAGE_SIZE', 50)
+'''Bills per page of the bill selector and the per-bill sections; more bills than this are searched and paged.'''
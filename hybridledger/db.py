@@ -0,0 +1,101 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from hybridledger import config
+
+
+STATEMENT_CACHE = 128
+'''Prepared statements kept per connection (sqlite3 `cached_statements`).'''
+
+
+def enable_wal(path:str = config.DATABASE) -> bool:
+    '''
+    Switch the database to write-ahead logging, so readers never block
+    the Node server's writes (and vice versa). The mode is persistent,
+    so this only needs to succeed once per database file. It changes
+    the Node server's database, so it is a maintenance step
+    (`python -m hybridledger.maintenance --wal`); the dashboard only reads.
+
+    Returns False if the database is locked or read-only.
+    '''
+    try:
+        conn = sqlite3.connect(path, timeout=config.SQLITE_BUSY_MS / 1000)
+        try:
+            mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.OperationalError:
+        return False
+    return mode.lower() == 'wal'
+
+
+def connect_readonly(path:str = config.DATABASE) -> sqlite3.Connection:
+    '''
+    Open a read-only connection to `path` tuned for the dashboard:
+    autocommit (reads run in explicit `BEGIN`/`COMMIT` transactions),
+    usable from any thread, with a larger page cache and memory-mapped I/O.
+    '''
+    conn = sqlite3.connect(
+        f'{Path(path).resolve().as_uri()}?mode=ro',
+        uri=True,
+        timeout=config.SQLITE_BUSY_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE)
+    conn.execute('PRAGMA query_only = 1')
+    conn.execute(f'PRAGMA cache_size = -{config.SQLITE_CACHE_KIB:d}')
+    conn.execute(f'PRAGMA mmap_size = {config.SQLITE_MMAP_BYTES:d}')
+    return conn
+
+
+class ConnectionPool:
+    '''
+    A fixed number of read-only connections shared between threads.
+
+    Connections are opened on first use and handed out most recently
+    used first, so a quiet dashboard keeps reusing one warm connection
+    (and its page cache and prepared statements).
+    '''
+
+    def __init__(self, path:str = config.DATABASE, size:int = config.DB_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = []
+        #'''every connection opened so far, idle or not'''
+        pass
+
+    @contextmanager
+    def connection(self):
+        '''Borrow a connection for the duration of the `with` block.'''
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._opened) < self.size:
+                conn = connect_readonly(self.path)
+                self._opened.append(conn)
+                return conn
+        return self._idle.get()
+
+    def close(self):
+        with self._lock:
+            for conn in self._opened:
+                conn.close()
+            self._opened.clear()
+        return
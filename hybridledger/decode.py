@@ -0,0 +1,57 @@
+'''
+Decode block payloads once into typed columns.
+
+Bill chains store everything in the `data` string: a bill amount
+(`"123.45"`), a payment note (`"ok"`, `"OK e-transfer"`) or the
+`"Genesis Ledger Registration"` marker. `decode_blocks` parses those
+strings a single time so every view can read plain columns instead.
+`decode_frame` does the same for rows that are already columns.
+'''
+
+import pandas as pd
+from dateutil import tz
+
+DECODED_COLUMNS = ('index', 'position', 'timestamp', 'issued', 'data', 'amount', 'paid', 'genesis')
+
+
+def decode_blocks(blocks:list) -> pd.DataFrame:
+    '''
+    Return one row per block (in chain order) with:
+
+    - `index`, `position`, `timestamp` (ms), `data` as stored
+    - `issued`: `datetime64` local time of `timestamp`
+    - `amount`: `float(data)`, NaN when the payload is not a number
+    - `paid`: `"ok"` appears in the payload (any case)
+    - `genesis`: the payload is a Genesis registration
+    '''
+    return decode_frame(pd.DataFrame({
+        'index':     pd.Series([hl.index for hl in blocks], dtype='int64'),
+        'position':  pd.Series([hl.position for hl in blocks], dtype=object),
+        'timestamp': pd.Series([hl.timestamp for hl in blocks], dtype='int64'),
+        'data':      pd.Series([hl.data for hl in blocks], dtype=object),
+    }))
+
+
+def decode_frame(frame:pd.DataFrame) -> pd.DataFrame:
+    '''
+    `decode_blocks` for rows that are already columns (`index`, `position`,
+    `timestamp`, `data`), e.g. read from a columnar export. Any number of
+    positions can be decoded at once; rows keep their order.
+    '''
+    frame = frame[['index', 'position', 'timestamp', 'data']].reset_index(drop=True)
+    text = frame['data'].fillna('').astype(str)
+
+    frame['issued'] = (pd.to_datetime(frame['timestamp'], unit='ms', utc=True)
+        .dt.tz_convert(tz.tzlocal())
+        .dt.tz_localize(None))
+    frame['amount'] = pd.to_numeric(text, errors='coerce').astype('float64')
+    frame['paid'] = text.str.lower().str.contains('ok', regex=False)
+    frame['genesis'] = text.str.contains('Genesis', regex=False)
+    return frame[list(DECODED_COLUMNS)]
+
+
+def append_decoded(frame:pd.DataFrame, blocks:list) -> pd.DataFrame:
+    '''Decode only `blocks` and append them to an already decoded `frame`.'''
+    if not blocks:
+        return frame
+    return pd.concat([frame, decode_blocks(blocks)], ignore_index=True)
@@ -0,0 +1,131 @@
+'''
+Interactive bill charts, drawn by the browser from Vega-Lite specs.
+
+The PNG charts in `hybridledger.charts` draw a label (and a guide line,
+or an annotated cell) per issue, so a multi-year weekly bill takes
+long to draw and is unreadable once drawn. Here a bill's price history
+is sent as a Vega-Lite spec (built with Altair) holding at most
+`config.CHART_POINTS` issues: longer series are downsampled with
+Largest-Triangle-Three-Buckets, which keeps the peaks and dips that
+make the shape of the line. Brushing a range of the overview selects
+it; only then is the detail of that range sent, downsampled the same
+way from the issues inside it.
+
+Altair is only imported once a chart is built.
+'''
+
+import numpy as np
+import pandas as pd
+
+from hybridledger import config
+
+BRUSH = 'detail'
+'''Name of the overview's interval selection (what `st.altair_chart` reports it as).'''
+
+
+def lttb(x:np.ndarray, y:np.ndarray, threshold:int) -> np.ndarray:
+    '''
+    Indices of the `threshold` points of `(x, y)` (x ascending) that
+    Largest-Triangle-Three-Buckets keeps: the first and last, and from
+    each bucket between them the point making the largest triangle with
+    the point kept before it and the average of the next bucket.
+    '''
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # bucket edges over the points between the first and the last
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype('int64') + 1
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype='int64')
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2] if bucket + 2 < len(edges) else n)
+        cx, cy = x[following].mean(), y[following].mean()
+        # twice the triangle area; the constant factor does not change the largest
+        areas = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[bucket + 1] = a
+    return kept
+
+
+def history_points(history:pd.DataFrame) -> pd.DataFrame:
+    '''`reports.price_history` as plotted: `Date` (datetime), numeric `Cost` and `Delta`; unpriced issues dropped.'''
+    points = pd.DataFrame({
+        'Date': pd.to_datetime(history['Issued']),
+        'Cost': pd.to_numeric(history['Cost'], errors='coerce'),
+        'Delta': pd.to_numeric(history['Delta'], errors='coerce'),
+    })
+    return points[points['Cost'].notna()].sort_values('Date', kind='stable').reset_index(drop=True)
+
+
+def downsample(points:pd.DataFrame, threshold:int = config.CHART_POINTS, domain:tuple = None) -> pd.DataFrame:
+    '''
+    At most `threshold` of `points` (within `domain`, `(start, end)`
+    dates inclusive), chosen by LTTB over `Date` and `Cost`. Each point
+    keeps its own issue's `Delta`.
+    '''
+    if domain is not None:
+        start, end = pd.Timestamp(domain[0]), pd.Timestamp(domain[1])
+        points = points[(points['Date'] >= start) & (points['Date'] <= end)]
+    kept = lttb(points['Date'].to_numpy(dtype='datetime64[ns]').astype('int64'), points['Cost'].to_numpy(), threshold)
+    return points.iloc[kept].reset_index(drop=True)
+
+
+def selected_range(selection:dict) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    '''The dates brushed on the overview, from `st.altair_chart(...).selection`, or None.'''
+    brushed = (selection or {}).get(BRUSH) or {}
+    dates = brushed.get('Date')
+    if not dates:
+        return None
+    # Vega-Lite reports temporal ranges as epoch milliseconds
+    start, end = (pd.to_datetime(date, unit='ms') if isinstance(date, (int, float)) else pd.Timestamp(date)
+        for date in dates[:2])
+    return start, end
+
+
+def _encoded(points:pd.DataFrame) -> pd.DataFrame:
+    # dates as short strings keep the inlined data compact
+    return points.assign(Date=points['Date'].dt.strftime('%Y-%m-%d'))
+
+
+def _cost_line(points:pd.DataFrame, title:str):
+    import altair as alt
+
+    base = alt.Chart(_encoded(points), title=title).encode(
+        x=alt.X('Date:T', title='Date'),
+        y=alt.Y('Cost:Q', title='Cost ($)', scale=alt.Scale(zero=False)))
+    line = base.mark_line(color='gray')
+    dots = base.mark_circle(size=30, opacity=1).encode(
+        # blue for cheaper than the last issue, red for dearer (as `delta_heatmap`)
+        color=alt.Color('Delta:Q', title='Delta ($)', scale=alt.Scale(scheme='redblue', reverse=True, domainMid=0)),
+        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Cost:Q', format='$.2f'),
+            alt.Tooltip('Delta:Q', format='+.2f')])
+    return line, dots
+
+
+def price_overview(bill_name:str, points:pd.DataFrame, issues:int = None):
+    '''Cost of every (downsampled) issue, coloured by delta; brush a range for its detail.'''
+    import altair as alt
+
+    shown = f'{len(points)} of {issues} issues' if issues and issues > len(points) else f'{len(points)} issues'
+    line, dots = _cost_line(points, f'{bill_name} Cost Over Time ({shown})')
+    brush = alt.selection_interval(name=BRUSH, encodings=['x'])
+    return alt.layer(line, dots.add_params(brush)).properties(height=250)
+
+
+def price_detail(bill_name:str, points:pd.DataFrame):
+    '''Cost and delta of the issues in a brushed range, one above the other.'''
+    import altair as alt
+
+    line, dots = _cost_line(points, f'{bill_name} Detail')
+    deltas = alt.Chart(_encoded(points)).mark_bar().encode(
+        x=alt.X('Date:T', title='Date'),
+        y=alt.Y('Delta:Q', title='Delta ($)'),
+        color=alt.Color('Delta:Q', legend=None, scale=alt.Scale(scheme='redblue', reverse=True, domainMid=0)),
+        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Delta:Q', format='+.2f')])
+    return alt.vconcat(alt.layer(line, dots).properties(height=250), deltas.properties(height=120))
@@ -0,0 +1,261 @@
+import sqlite3
+from functools import lru_cache
+from itertools import groupby
+from operator import attrgetter
+
+import pandas as pd
+
+from hybridledger import profiling
+from hybridledger.decode import append_decoded, decode_blocks
+
+LEDGER_COLUMNS = (
+    'index', 'position', 'ownership', 'blockType', 'data',
+    'previousHash', 'minted', 'nonce', 'timestamp', 'uuid'
+)
+'''Columns of `HybridLedgers` (module/db.js) in `ServerHL` argument order.'''
+
+MAX_POSITIONS_PER_QUERY = 512
+'''Positions per batched query; with 3 parameters per watermark this stays
+below SQLITE_MAX_VARIABLE_NUMBER (999 on older SQLite builds).'''
+
+PAD_POSITION = ''
+'''Never a real position. Batches are padded with it up to a power of two,
+so only a handful of distinct SQL texts exist and sqlite3 reuses their
+prepared statements from its per-connection statement cache.'''
+
+_SELECT_COLUMNS = ', '.join(f'h."{column}"' for column in LEDGER_COLUMNS)
+
+
+class ServerHL:
+    '''One block of a `HybridLedgers` row. Slotted; a chain holds thousands.'''
+
+    __slots__ = LEDGER_COLUMNS
+
+    def __init__(
+            self,
+            index       :int, # 0+
+            position    :str, # a4,b3
+            ownership   :str, # uuid (owner)
+            blockType   :int, # 1 GEN 2 MINT 3 TX 4 ACQ 5 LCK 6 OBF
+            data        :str, # {text}
+            previousHash:str, # SHA256
+            minted      :int, # num. minted
+            nonce       :int, # num. iter
+            timestamp   :int, # unix timestamp
+            uuid        :str  # uuid (object)
+        ):
+        
+        self.index          = index
+        self.position       = position
+        self.ownership      = ownership
+        self.blockType      = blockType
+        self.data           = data
+        self.previousHash   = previousHash
+        self.minted         = minted
+        self.nonce          = nonce
+        self.timestamp      = timestamp
+        self.uuid           = uuid
+
+        pass
+
+    @classmethod
+    def from_rows(cls, rows) -> list['ServerHL']:
+        '''Build blocks from row tuples in `LEDGER_COLUMNS` order (cursor rows).'''
+        return [cls(*row) for row in rows]
+
+    @classmethod
+    def from_frame(cls, frame) -> list['ServerHL']:
+        '''Build blocks from a DataFrame holding `LEDGER_COLUMNS`, as Python scalars.'''
+        return cls.from_rows(frame[list(LEDGER_COLUMNS)].itertuples(index=False, name=None))
+
+class ServerHLChain:
+
+    def __init__(
+            self, 
+            pos_value:str,                  # position hex, monetary value
+            pos_payment_stacks:list[str],   # position hex, payment status
+            label:str = 'Unknown',
+            frequency:str = 'Monthly'
+        ):
+        self.label = label
+        #'''label of bill'''
+        self.pos_value = pos_value
+        #'''monetary value chain position hex'''
+
+        self.frequency = frequency
+
+        self.pos_payment_stacks = pos_payment_stacks
+        #'''payment status chain position hex'''
+        self.persons_paying = len(pos_payment_stacks)
+
+        self.payments_chain = []
+        #'''payment status chain'''
+        self.dues_chains = { position : [] for position in pos_payment_stacks }
+        #'''value chain'''
+        self.watermarks = {}
+        #'''{position: (index, timestamp)} of the last block loaded'''
+        self._frames = {}
+        #'''{position: decoded DataFrame}, filled on first use'''
+        pass
+
+    @property
+    def positions(self) -> list[str]:
+        '''Every ledger position this bill reads, value chain first.'''
+        return [self.pos_value] + list(self.pos_payment_stacks)
+
+    def frame(self, position:str) -> pd.DataFrame:
+        '''Decoded chain at `position` (see `hybridledger.decode`), decoded once.'''
+        if position not in self._frames:
+            blocks = self.payments_chain if position == self.pos_value else self.dues_chains[position]
+            self._frames[position] = decode_blocks(blocks)
+        return self._frames[position]
+
+    @property
+    def values(self) -> pd.DataFrame:
+        '''Decoded value chain (bill amounts).'''
+        return self.frame(self.pos_value)
+
+    @property
+    def dues(self) -> dict[str, pd.DataFrame]:
+        '''Decoded payment-status chains by position.'''
+        return { position : self.frame(position) for position in self.pos_payment_stacks }
+
+    def assign_blocks(
+            self,
+            blocks:dict[str, list[ServerHL]],
+            append:bool = False,
+            frames:dict[str, pd.DataFrame] = None
+        ):
+        '''
+        Take this bill's chains out of a `read_blocks` result.
+
+        With `append`, the blocks are new rows past the watermarks
+        and are added to the end of the chains already loaded.
+        `frames` may hold already decoded chains for the positions.
+        '''
+        for position in self.positions:
+            new_blocks = blocks.get(position, [])
+            chain = self.payments_chain if position == self.pos_value else self.dues_chains[position]
+            if append:
+                chain.extend(new_blocks)
+                if position in self._frames:
+                    self._frames[position] = append_decoded(self._frames[position], new_blocks)
+            else:
+                chain = list(new_blocks)
+                if position == self.pos_value:
+                    self.payments_chain = chain
+                else:
+                    self.dues_chains[position] = chain
+                self.watermarks.pop(position, None)
+                self._frames.pop(position, None)
+                if frames and position in frames:
+                    self._frames[position] = frames[position]
+            if chain:
+                self.watermarks[position] = (chain[-1].index, chain[-1].timestamp)
+        return
+
+    @profiling.timed()
+    def read_database(self, conn:sqlite3.Connection):
+        '''Read this bill's chains from the database (one query).'''
+        load_chains([self], conn)
+        return
+
+    def refresh(self, conn:sqlite3.Connection):
+        '''Append blocks minted since the last read (one query).'''
+        refresh_chains([self], conn)
+        return
+
+
+def _batches(items:list, size:int):
+    # fixed-size (power of two) batches, padded with PAD_POSITION
+    for start in range(0, len(items), size):
+        batch = items[start:start + size]
+        yield batch + [PAD_POSITION] * ((1 << (len(batch) - 1).bit_length()) - len(batch))
+
+
+def _group_blocks(blocks:dict[str, list[ServerHL]], ordered:list[ServerHL]):
+    # rows arrive ordered by position, so each position is one contiguous run
+    for position, run in groupby(ordered, key=attrgetter('position')):
+        blocks[position].extend(run)
+    return
+
+
+@lru_cache(maxsize=None)
+def select_sql(count:int) -> str:
+    '''The query `read_blocks` reads `count` whole chains with; parameters: the positions.'''
+    return (f'SELECT {_SELECT_COLUMNS} FROM "HybridLedgers" h '
+        f'WHERE h.position IN ({", ".join("?" * count)}) '
+        'ORDER BY h.position, h."index", h.rowid')
+
+
+@lru_cache(maxsize=None)
+def select_since_sql(count:int) -> str:
+    '''
+    The query `read_blocks` reads the blocks past `count` watermarks
+    with; parameters: `position, index, timestamp` of each.
+    '''
+    return (f'WITH marks(position, "index", timestamp) AS (VALUES {", ".join(["(?, ?, ?)"] * count)}) '
+        f'SELECT {_SELECT_COLUMNS} FROM "HybridLedgers" h '
+        'JOIN marks m ON h.position = m.position '
+        'WHERE h."index" > m."index" OR (h."index" = m."index" AND h.timestamp > m.timestamp) '
+        'ORDER BY h.position, h."index", h.rowid')
+
+
+def read_blocks(
+        conn:sqlite3.Connection,
+        positions:list[str],
+        since:dict[str, tuple[int, int]] = None
+    ) -> dict[str, list[ServerHL]]:
+    '''
+    Read the ledgers at `positions`, batching many positions per query.
+
+    `since` maps positions to an `(index, timestamp)` watermark; only
+    blocks with a higher index (or the same index and a later timestamp)
+    are read for those positions. Ledgers are append-only, so this is
+    everything minted after the watermark was taken.
+
+    Returns `{position: [ServerHL, ...]}` in order of index,
+    with an empty list for positions that have no (new) blocks.
+    '''
+    positions = list(dict.fromkeys(positions))
+    blocks = { position : [] for position in positions }
+
+    if since is None:
+        for batch in _batches(positions, MAX_POSITIONS_PER_QUERY):
+            rows = ServerHL.from_rows(conn.execute(select_sql(len(batch)), batch))
+            profiling.count_query(len(rows))
+            _group_blocks(blocks, rows)
+        return blocks
+
+    for batch in _batches(positions, MAX_POSITIONS_PER_QUERY // 2):
+        marks = []
+        for position in batch:
+            marks.extend((position, *since.get(position, (-1, -1))))
+        rows = ServerHL.from_rows(conn.execute(select_since_sql(len(batch)), marks))
+        profiling.count_query(len(rows))
+        _group_blocks(blocks, rows)
+    return blocks
+
+
+@profiling.timed()
+def load_chains(chains:list[ServerHLChain], conn:sqlite3.Connection) -> list[ServerHLChain]:
+    '''Load `payments_chain` and `dues_chains` of every chain in one batch.'''
+    blocks = read_blocks(conn, [position for chain in chains for position in chain.positions])
+    for chain in chains:
+        chain.assign_blocks(blocks)
+    return chains
+
+
+@profiling.timed()
+def refresh_chains(chains:list[ServerHLChain], conn:sqlite3.Connection) -> list[ServerHLChain]:
+    '''
+    Append blocks minted since each chain's watermarks, in one batch.
+    Chains that were never loaded are read in full.
+    '''
+    since = {}
+    for chain in chains:
+        since.update(chain.watermarks)
+    blocks = read_blocks(conn, [position for chain in chains for position in chain.positions], since)
+    for chain in chains:
+        chain.assign_blocks(blocks, append=True)
+    return chains
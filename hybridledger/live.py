@@ -0,0 +1,93 @@
+'''
+Live tail: new blocks reach open dashboards without a refresh.
+
+One `LedgerWatcher` per process polls the ledger database every
+`config.LIVE_POLL_MS` with `LedgerCache.tail` (a `PRAGMA data_version`,
+plus one query for the appended rows when it changed), so however many
+sessions are open the database sees a single cheap poll per interval.
+Appended blocks go straight into the shared cache, and each position
+they were appended to is stamped with a new version number, cached or
+not: sections reading the summary store, or chains another session
+just marked stale, must rerun too.
+
+Sessions never touch the database to find out: they compare the
+versions of the positions they show with the last ones they drew
+(`changed`), in memory, and rerun only when one of theirs moved. The
+rerun reads the new blocks from the cache.
+'''
+
+import threading
+
+from hybridledger import config
+from hybridledger.cache import LedgerCache
+
+
+class LedgerWatcher:
+    '''
+    Background thread appending new rows to `cache` and counting changes.
+
+    `version` increases every time a poll sees rows appended to any
+    position; `changed(positions, since)` tells whether one of
+    `positions` grew after version `since`.
+    '''
+
+    def __init__(self, cache:LedgerCache, interval_ms:int = config.LIVE_POLL_MS):
+        self.cache = cache
+        self.interval = interval_ms / 1000
+        self.version = 0
+        self.error = None
+        #'''the last poll's exception, None once a poll succeeds'''
+
+        self._changes = {}
+        #'''{position: version it last grew in}'''
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        pass
+
+    def start(self) -> 'LedgerWatcher':
+        '''Start polling (once; later calls do nothing).'''
+        with self._lock:
+            if self._thread is None:
+                # the first tail only records where to start from
+                self.cache.tail()
+                self._thread = threading.Thread(target=self._run, name='hybridledger-live', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stop polling and wait for the thread to finish.'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return
+
+    @property
+    def running(self) -> bool:
+        '''Whether the polling thread is alive.'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self) -> set[str]:
+        '''Tail the database once; returns the positions rows were appended to.'''
+        appended = self.cache.tail()
+        if appended:
+            with self._lock:
+                self.version += 1
+                for position in appended:
+                    self._changes[position] = self.version
+        return appended
+
+    def changed(self, positions:list[str], since:int) -> bool:
+        '''Whether any of `positions` grew after version `since`.'''
+        with self._lock:
+            return any(self._changes.get(position, 0) > since for position in positions)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+                self.error = None
+            except Exception as error:
+                # a locked or briefly missing database; try again next interval
+                self.error = error
+        return
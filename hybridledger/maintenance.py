@@ -0,0 +1,132 @@
+'''
+Index advisor and maintenance for the HybridLedgers table.
+
+    python -m hybridledger.maintenance [--database PATH] [--dry-run] [--wal]
+
+Every chain load looks blocks up by `position` in order of `index`, and
+the server looks single blocks up by `uuid`. The Sequelize model
+(module/db.js) declares no index for either, so without this every
+lookup scans the whole table. The command creates the missing indexes,
+refreshes the planner statistics and prints the query plans of those
+lookups before and after.
+
+With `--wal` it also switches the database to write-ahead logging, so
+the dashboard's readers never block the Node server's writes. Both
+change the server's database file, which is why they are an explicit
+step here and never a side effect of opening the dashboard.
+'''
+
+import argparse
+import sqlite3
+import sys
+
+from hybridledger import config
+from hybridledger.db import enable_wal
+from hybridledger.ledger import select_since_sql, select_sql
+
+
+TABLE = 'HybridLedgers'
+
+INDEXES = {
+    'hybrid_ledgers_position_index' : ('position', 'index'),
+    'hybrid_ledgers_uuid' : ('uuid',),
+}
+'''{index name: columns}; an existing index with the same leading columns counts.'''
+
+QUERIES = {
+    'dashboard chain load' : (select_sql(1), ['']),
+    'dashboard top-up' : (select_since_sql(1), ['', -1, -1]),
+    'HybridLedger.getBlocks' : (f'SELECT * FROM "{TABLE}" WHERE position = ?', ['']),
+    'block by uuid' : (f'SELECT * FROM "{TABLE}" WHERE uuid = ? LIMIT 1', ['']),
+}
+'''The lookups the indexes are for, as `{label: (sql, example parameters)}`.'''
+
+
+def existing_indexes(conn:sqlite3.Connection, table:str = TABLE) -> dict[str, tuple[str, ...]]:
+    '''`{index name: columns}` for every index on `table`.'''
+    indexes = {}
+    for row in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+        name = row[1]
+        indexes[name] = tuple(info[2] for info in conn.execute(f'PRAGMA index_info("{name}")'))
+    return indexes
+
+
+def missing_indexes(conn:sqlite3.Connection, table:str = TABLE) -> dict[str, tuple[str, ...]]:
+    '''The entries of `INDEXES` that no existing index already serves.'''
+    existing = existing_indexes(conn, table).values()
+    return { name : columns for name, columns in INDEXES.items()
+        if not any(have[:len(columns)] == columns for have in existing) }
+
+
+def query_plans(conn:sqlite3.Connection) -> dict[str, list[str]]:
+    '''`EXPLAIN QUERY PLAN` of every query in `QUERIES`, one line per step.'''
+    return { label : [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        for label, (sql, params) in QUERIES.items() }
+
+
+def optimize(conn:sqlite3.Connection, dry_run:bool = False) -> list[str]:
+    '''
+    Create the missing indexes, then run `ANALYZE` and `PRAGMA optimize`.
+
+    Returns the names of the indexes created (or that would be, with `dry_run`).
+    '''
+    missing = missing_indexes(conn)
+    if dry_run:
+        return list(missing)
+
+    with conn:
+        for name, columns in missing.items():
+            quoted = ', '.join(f'"{column}"' for column in columns)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{TABLE}" ({quoted})')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    return list(missing)
+
+
+def _print_plans(title:str, plans:dict[str, list[str]], out=sys.stdout):
+    print(f'== {title}', file=out)
+    for label, steps in plans.items():
+        print(f'{label}:', file=out)
+        for step in steps:
+            print(f'    {step}', file=out)
+    return
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.maintenance',
+        description='Create the HybridLedgers lookup indexes and report query plans.')
+    parser.add_argument('--database', default=config.DATABASE,
+        help='SQLite database (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true',
+        help='only report the missing indexes and current plans')
+    parser.add_argument('--wal', action='store_true',
+        help='also switch the database to write-ahead logging (persistent; lets readers and the server overlap)')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.database, timeout=config.SQLITE_BUSY_MS / 1000)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).fetchone():
+            print(f'{args.database}: no {TABLE} table', file=sys.stderr)
+            return 1
+
+        _print_plans('before', query_plans(conn))
+        created = optimize(conn, dry_run=args.dry_run)
+        if not created:
+            print('== indexes: nothing missing')
+        else:
+            print(f'== indexes {"missing" if args.dry_run else "created"}: {", ".join(created)}')
+        if not args.dry_run:
+            _print_plans('after', query_plans(conn))
+    finally:
+        conn.close()
+
+    if args.wal and not args.dry_run:
+        if not enable_wal(args.database):
+            print(f'{args.database}: could not switch to write-ahead logging (locked or read-only)', file=sys.stderr)
+            return 1
+        print('== journal mode: wal')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
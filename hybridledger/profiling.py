@@ -0,0 +1,144 @@
+'''
+Opt-in instrumentation of the dashboard's hot paths.
+
+Set `HL_PROFILE=1` to record, for every stage (chain reads, decoding,
+each dashboard section and each chart), its wall time and the SQL
+queries and rows it read. Records are appended to `HL_PROFILE_LOG` as
+JSON lines and kept per thread (per session) for the dashboard's
+profiling panel.
+
+Each record also carries `process_peak_kib`, the peak traced memory of
+the whole process since profiling started, as of the stage's end.
+tracemalloc cannot tell threads apart, and sessions run concurrently,
+so it is not the stage's own peak.
+
+With profiling off, `timed` returns the function unchanged and `stage`
+is a shared no-op context manager, so production runs pay nothing.
+Tracing memory slows Python down noticeably while profiling is on.
+'''
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from hybridledger import config
+
+
+ENABLED = config.PROFILE
+'''Whether stages are recorded (`HL_PROFILE`), fixed at import.'''
+
+_NOOP = nullcontext()
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class _Stage:
+    __slots__ = ('name', 'started', 'queries', 'rows', 'depth')
+
+    def __init__(self, name:str, depth:int):
+        self.name = name
+        self.depth = depth
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        pass
+
+
+def _stack() -> list[_Stage]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+        _local.records = []
+    return stack
+
+
+@contextmanager
+def _record(name:str):
+    stack = _stack()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current = _Stage(name, len(stack))
+    stack.append(current)
+    try:
+        yield current
+    finally:
+        wall = time.perf_counter() - current.started
+        stack.pop()
+        if stack:
+            parent = stack[-1]
+            parent.queries += current.queries
+            parent.rows += current.rows
+        _emit({
+            'time': time.time(),
+            'thread': threading.current_thread().name,
+            'stage': name,
+            'depth': current.depth,
+            'wall_ms': round(wall * 1000, 3),
+            'queries': current.queries,
+            'rows': current.rows,
+            # never reset: another session's stage may be running
+            'process_peak_kib': round(tracemalloc.get_traced_memory()[1] / 1024, 1),
+        })
+
+
+def _emit(record:dict):
+    _local.records.append(record)
+    if config.PROFILE_LOG:
+        line = json.dumps(record)
+        with _log_lock, open(config.PROFILE_LOG, 'a') as log:
+            log.write(line + '\n')
+    return
+
+
+def stage(name:str):
+    '''Context manager recording the enclosed block as stage `name`.'''
+    return _record(name) if ENABLED else _NOOP
+
+
+def timed(name:str = None):
+    '''Decorator recording every call of the function as a stage.'''
+    def decorate(function):
+        if not ENABLED:
+            return function
+        label = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _record(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_query(rows:int):
+    '''Count one SQL query returning `rows` rows against the open stage.'''
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].queries += 1
+        stack[-1].rows += rows
+    return
+
+
+def record(name:str, wall:float, **fields):
+    '''Add a stage measured elsewhere (e.g. in a render worker) with `wall` seconds.'''
+    _stack()
+    _emit({
+        'time': time.time(),
+        'thread': threading.current_thread().name,
+        'stage': name,
+        'depth': len(_local.stack),
+        'wall_ms': round(wall * 1000, 3),
+        **fields,
+    })
+    return
+
+
+def collect() -> list[dict]:
+    '''Return and forget the records of this thread, oldest first.'''
+    _stack()
+    records, _local.records = _local.records, []
+    return records
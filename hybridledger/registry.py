@@ -0,0 +1,146 @@
+'''
+The shared bills and the payees responsible for them.
+
+Read once per process from a TOML file (`HL_REGISTRY`, by default
+registry.toml beside this module) into immutable specs, with the
+lookups the dashboard makes in its loops precomputed: position to
+payee, position to bill, and payee to positions and bills. Bills can be
+searched by label (`find_bills`) to page through thousands of them.
+`shared_bills()` turns the specs into new chains for each snapshot,
+since loading fills a chain.
+'''
+
+import json
+import tomllib
+from types import MappingProxyType
+from typing import NamedTuple
+
+from hybridledger import config
+from hybridledger.ledger import ServerHLChain
+
+FREQUENCY_NAMES = ('Bi-monthly', 'Monthly', 'Biweekly', 'Weekly')
+'''Bill frequencies a registry may use (see `reports.FREQUENCIES`).'''
+
+
+class BillSpec(NamedTuple):
+    '''Where a bill's chains live (immutable, shared by every session).'''
+    label:str
+    pos_value:str                       # position hex, monetary value
+    pos_payment_stacks:tuple[str, ...]  # position hex, payment status
+    frequency:str = 'Monthly'
+
+    @property
+    def positions(self) -> tuple[str, ...]:
+        '''Every ledger position of the bill, value chain first.'''
+        return (self.pos_value, *self.pos_payment_stacks)
+
+    def chain(self) -> ServerHLChain:
+        '''A new, unloaded chain for this bill.'''
+        return ServerHLChain(pos_value=self.pos_value, pos_payment_stacks=list(self.pos_payment_stacks),
+            label=self.label, frequency=self.frequency)
+
+
+def load_registry(path:str = config.REGISTRY) -> tuple[tuple[BillSpec, ...], dict[str, tuple[str, ...]]]:
+    '''
+    `(bills, payees)` from a registry file (see registry.toml). Raises
+    `ValueError` naming the entry when a bill lacks a label or value
+    position, has an unknown frequency, or reuses a label or position.
+    '''
+    with open(path, 'rb') as registry:
+        document = tomllib.load(registry)
+
+    bills = []
+    owners = {}
+    for number, entry in enumerate(document.get('bills', []), 1):
+        label = entry.get('label')
+        if not label or not entry.get('value'):
+            raise ValueError(f'{path}: bill {number} needs a label and a value position')
+        bill = BillSpec(label, entry['value'], tuple(entry.get('payments', ())), entry.get('frequency', 'Monthly'))
+        if bill.frequency not in FREQUENCY_NAMES:
+            raise ValueError(f'{path}: {label}: unknown frequency {bill.frequency!r}')
+        for position in bill.positions:
+            # position -> bill must be a function, or chains would be read into two bills
+            if owners.setdefault(position, label) != label or bill.positions.count(position) > 1:
+                raise ValueError(f'{path}: {label}: position {position} is already used by {owners[position]}')
+        bills.append(bill)
+    if len({ bill.label for bill in bills }) != len(bills):
+        raise ValueError(f'{path}: bill labels must be unique')
+
+    payees = { payee : tuple(positions) for payee, positions in document.get('payees', {}).items() }
+    return tuple(bills), payees
+
+
+def write_registry(path:str, bills:list, payees:dict[str, list[str]]):
+    '''Write `bills` (`BillSpec`s or chains) and `payees` as a registry file `load_registry` reads.'''
+    # JSON strings are valid TOML basic strings
+    quote = json.dumps
+    with open(path, 'w') as registry:
+        for bill in bills:
+            registry.write(f'[[bills]]\nlabel = {quote(bill.label)}\nvalue = {quote(bill.pos_value)}\n'
+                f'payments = [{", ".join(map(quote, bill.pos_payment_stacks))}]\nfrequency = {quote(bill.frequency)}\n\n')
+        registry.write('[payees]\n')
+        for payee, positions in payees.items():
+            registry.write(f'{quote(payee)} = [{", ".join(map(quote, positions))}]\n')
+    return
+
+
+def _payee_by_position(payees:dict[str, tuple[str, ...]]) -> dict[str, str]:
+    # first listing wins
+    payee_by_position = {}
+    for payee, positions in payees.items():
+        for position in positions:
+            payee_by_position.setdefault(position, payee)
+    return payee_by_position
+
+
+def _bills_by_payee(bills:tuple[BillSpec, ...], payee_by_position:dict[str, str]) -> dict[str, tuple[str, ...]]:
+    # one pass over every payment position; dicts keep each payee's bills in display order
+    bills_by_payee = {}
+    for bill in bills:
+        for position in bill.pos_payment_stacks:
+            payee = payee_by_position.get(position)
+            if payee is not None:
+                bills_by_payee.setdefault(payee, {})[bill.label] = None
+    return { payee : tuple(labels) for payee, labels in bills_by_payee.items() }
+
+
+BILLS, _PAYEES = load_registry()
+'''Every shared bill, in display order.'''
+
+BILL_LABELS = tuple(bill.label for bill in BILLS)
+
+BILLS_BY_LABEL = MappingProxyType({ bill.label : bill for bill in BILLS })
+
+BILL_BY_POSITION = MappingProxyType({ position : bill for bill in BILLS for position in bill.positions })
+'''{position (value or payment): bill spec}'''
+
+PAYEES = MappingProxyType(_PAYEES)
+'''{payee: (payment position, ...)}'''
+
+PAYEE_BY_POSITION = MappingProxyType(_payee_by_position(PAYEES))
+'''{payment position: payee}'''
+
+BILLS_BY_PAYEE = MappingProxyType(_bills_by_payee(BILLS, PAYEE_BY_POSITION))
+'''{payee: (label of a bill they pay, ...)} in display order'''
+
+_SEARCH_LABELS = tuple(label.casefold() for label in BILL_LABELS)
+
+
+def shared_bills(labels:list[str] = None) -> list[ServerHLChain]:
+    '''Every shared bill (or those with `labels`), as new (unloaded) chains in display order.'''
+    if labels is None:
+        return [bill.chain() for bill in BILLS]
+    return [BILLS_BY_LABEL[label].chain() for label in labels]
+
+
+def find_bills(text:str = '') -> tuple[str, ...]:
+    '''Labels of the bills whose label contains `text` (any case), in display order.'''
+    text = text.strip().casefold()
+    if not text:
+        return BILL_LABELS
+    return tuple(label for label, search in zip(BILL_LABELS, _SEARCH_LABELS) if text in search)
+
+
+def payee_name(position:str) -> str:
+    '''The payee paying at `position`, or 'Unknown'.'''
+    return PAYEE_BY_POSITION.get(position, 'Unknown')
@@ -0,0 +1,316 @@
+'''
+Bill reports, computed from a `LedgerSnapshot` without any UI.
+
+The dashboard renders these tables; the command line writes them in
+batch (no Streamlit, matplotlib or seaborn is imported):
+
+    python -m hybridledger.reports OUTPUT_DIR [--format csv|parquet|json] [--database PATH | --arrow DIR]
+'''
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from hybridledger import config
+from hybridledger.analytics import GRANULARITIES, match_issues, payment_matrix
+from hybridledger.db import connect_readonly
+from hybridledger.ledger import ServerHLChain
+from hybridledger.registry import BILL_LABELS, PAYEE_BY_POSITION, PAYEES, payee_name, shared_bills
+from hybridledger.snapshot import LedgerSnapshot
+
+
+FREQUENCIES = {
+    'Bi-monthly': 2,
+    'Monthly': 1,
+    'Biweekly': 0.5,
+    'Weekly': 0.25
+}
+'''Months per billing period of each bill frequency.'''
+
+PAYMENT_MONTHS = 7
+'''How far back payment histories go by default.'''
+
+FORMATS = ('csv', 'parquet', 'json')
+
+PAYMENT_HISTORY_COLUMNS = ('OK', 'Data', 'Timestamp', 'Bill Value', 'Date Issued')
+'''Columns of a `payment_history` table.'''
+
+
+def bill_issues(bill:ServerHLChain) -> pd.DataFrame:
+    '''The bill's issues: its decoded value chain without the Genesis block.'''
+    return bill.values[~bill.values['genesis']]
+
+
+def overview(snapshot) -> pd.DataFrame:
+    '''
+    One row per bill: last value, payees responsible and approximate
+    monthly share. A bill with no issue yet has no (NaN) last value.
+    '''
+    bill_names = []
+    bill_last_values = []
+    bill_num_responsible = []
+    bill_freq = []
+    for bill in snapshot:
+        bill_freq.append(FREQUENCIES[bill.frequency])
+        bill_num_responsible.append(len(bill.dues_chains))
+        bill_names.append(f'{bill.label} {bill.frequency}')
+        issues = bill_issues(bill)
+        bill_last_values.append(float(issues['amount'].iloc[-1]) if len(issues) else float('nan'))
+
+    return pd.DataFrame({
+        'Bill': bill_names,
+        'Last Value': bill_last_values,
+        '# Responsible': bill_num_responsible,
+        'Appx. Mon. Pay / Responsible': [(value / bill_num_responsible[idx])/bill_freq[idx] for idx, value in enumerate(bill_last_values)],
+        'Frequency': bill_freq
+    })
+
+
+def filter_overview(table:pd.DataFrame, frequency:str = None, num_responsible:int = None) -> pd.DataFrame:
+    '''`overview` rows of one frequency and/or number of payees responsible.'''
+    if frequency:
+        table = table[table['Frequency'] == FREQUENCIES[frequency]]
+    if num_responsible:
+        table = table[table['# Responsible'] == num_responsible]
+    return table
+
+
+def overview_totals(table:pd.DataFrame) -> dict[str, float]:
+    '''
+    Totals of (filtered) `overview` rows: `cost` of the bills per period,
+    `per_responsible` (approximate monthly pay of one payee responsible
+    for each) and `saved`, the difference. Bills with no last value are left out.
+    '''
+    cost = sum(table['Last Value'].dropna())
+    per_responsible = sum((table['Appx. Mon. Pay / Responsible']*table['Frequency']).dropna())
+    return { 'cost' : cost, 'per_responsible' : per_responsible, 'saved' : cost - per_responsible }
+
+
+def frequency_table(snapshot, frequency:str, num_responsible:int = None) -> pd.DataFrame:
+    '''
+    Bills of one `frequency` by last value (highest first), with their
+    approximate monthly cost. Bills whose last value block holds no
+    amount (an empty value chain, or only its Genesis block) are left out.
+    '''
+    bills = [bill for bill in snapshot if bill.frequency == frequency and len(bill.values) > 0
+        and pd.notna(bill.values['amount'].iloc[-1])
+        and (not num_responsible or len(bill.dues_chains) == num_responsible)]
+    table = pd.DataFrame({
+        'Bill': [bill.label for bill in bills],
+        'Last Value': [bill.values['amount'].iloc[-1] for bill in bills],
+        'Appx. Monthly Cost': [bill.values['amount'].iloc[-1]/FREQUENCIES[frequency] for bill in bills],
+        '# Responsible': [len(bill.dues_chains) for bill in bills]
+    })
+    table['Last Value'] = table['Last Value'].astype(float)
+    table['Appx. Monthly Cost'] = table['Appx. Monthly Cost'].astype(float)
+    return table.sort_values(by='Last Value', ascending=False)
+
+
+def summary_overview(bills:pd.DataFrame) -> pd.DataFrame:
+    '''`overview` from bill summaries (`summary.read_bills`), without loading any chain.'''
+    frequency = bills['frequency'].map(FREQUENCIES)
+    return pd.DataFrame({
+        'Bill': bills['bill'] + ' ' + bills['frequency'],
+        'Last Value': bills['last_issue_amount'],
+        '# Responsible': bills['responsible'],
+        'Appx. Mon. Pay / Responsible': (bills['last_issue_amount'] / bills['responsible']) / frequency,
+        'Frequency': frequency
+    })
+
+
+def summary_frequency_table(bills:pd.DataFrame, frequency:str, num_responsible:int = None) -> pd.DataFrame:
+    '''`frequency_table` from bill summaries (`summary.read_bills`), without loading any chain.'''
+    # the decoded amount is NaN (NULL) for an empty value chain or a Genesis block
+    bills = bills[(bills['frequency'] == frequency) & bills['last_amount'].notna()]
+    if num_responsible:
+        bills = bills[bills['responsible'] == num_responsible]
+    table = pd.DataFrame({
+        'Bill': bills['bill'].tolist(),
+        'Last Value': bills['last_amount'].astype(float).tolist(),
+        'Appx. Monthly Cost': (bills['last_amount'] / FREQUENCIES[frequency]).astype(float).tolist(),
+        '# Responsible': bills['responsible'].tolist()
+    })
+    return table.sort_values(by='Last Value', ascending=False)
+
+
+def frequency_total(table:pd.DataFrame) -> float:
+    '''Sum of the last values in a `frequency_table`, in registry order.'''
+    return sum(table.sort_index()['Last Value'])
+
+
+def price_history(bill:ServerHLChain) -> pd.DataFrame:
+    '''Every issue of the bill with its cost and the change from the previous issue; no rows before the first issue.'''
+    issues = bill_issues(bill)
+    return pd.DataFrame({
+        'Issued': issues['issued'].dt.strftime('%Y-%m-%d').tolist(),
+        'Cost': issues['data'].tolist(),
+        # +/- from the last value
+        'Delta': [0] + issues['amount'].diff().iloc[1:].tolist() if len(issues) else []
+    })
+
+
+def _recent(bill:ServerHLChain, position:str, months:int, now:pd.Timestamp) -> pd.DataFrame:
+    payments = bill.dues[position]
+    if not months:
+        return payments
+    # DateOffset carries across year boundaries
+    return payments[payments['issued'] > (pd.Timestamp.now() if now is None else now) - pd.DateOffset(months=months)]
+
+
+def payment_history(bill:ServerHLChain, position:str, months:int = PAYMENT_MONTHS, now:pd.Timestamp = None) -> pd.DataFrame:
+    '''
+    The payments at `position` from the last `months` (all with 0), each
+    with the payee's share of the bill issue it answers and that issue's date.
+    '''
+    payments = _recent(bill, position, months, now)
+    if not len(payments):
+        return pd.DataFrame(columns=PAYMENT_HISTORY_COLUMNS)
+    matched = match_issues(payments, bill.values)
+    return pd.DataFrame({
+        'OK': payments['paid'].tolist(),
+        'Data': payments['data'].where(~payments['genesis'], 'Genesis').tolist(),
+        'Timestamp': payments['issued'].dt.strftime('%Y-%m-%d').tolist(),
+        'Bill Value': ((matched['issue_amount']/len(bill.dues_chains)).map(str)+' ('+matched['issue_data']+')')
+            .where(matched['issue_genesis'] != True, 'Genesis').tolist(),
+        'Date Issued': matched['issue_issued'].dt.strftime('%Y-%m-%d').tolist()
+    })
+
+
+def payment_status(bill:ServerHLChain, position:str, months:int = PAYMENT_MONTHS, now:pd.Timestamp = None) -> dict:
+    '''
+    Whether the payee at `position` paid after the bill's last issue:
+    `{'last_issued': 'YYYY-MM-DD', 'last_payment': 'YYYY-MM-DD' or None, 'received': bool}`.
+    '''
+    payments = _recent(bill, position, months, now)
+    last_issued = bill.values.iloc[-1]['issued'].strftime('%Y-%m-%d')
+    last_payment = payments['issued'].iloc[-1].strftime('%Y-%m-%d') if len(payments) else None
+    return {
+        'last_issued': last_issued,
+        'last_payment': last_payment,
+        # compared by day, as shown
+        'received': last_payment is not None and last_payment > last_issued,
+    }
+
+
+def payment_matrices(snapshot, periods:int = 6, granularity:str = 'M', now:pd.Timestamp = None) -> pd.DataFrame:
+    '''`analytics.payment_matrix` over every bill and payee of the registry.'''
+    return payment_matrix(
+        snapshot.payments,
+        PAYEE_BY_POSITION,
+        payees=list(PAYEES.keys()),
+        bills=[bill.label for bill in snapshot],
+        periods=periods,
+        granularity=granularity,
+        issues=snapshot.issues,
+        now=now
+    )
+
+
+def payment_window(periods:int = 6, granularity:str = 'M', now:pd.Timestamp = None) -> pd.Timestamp | None:
+    '''
+    When the oldest period a `payment_matrix` shows starts (local time,
+    as `issued`), so only payments from then on need reading; None for
+    billing cycles, which each bill starts at its own issue.
+    '''
+    if granularity == 'cycle':
+        return None
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    return pd.period_range(end=now.to_period(granularity), periods=periods)[0].start_time
+
+
+def summary_payment_matrices(payments:pd.DataFrame, issues:pd.DataFrame, periods:int = 6, granularity:str = 'M',
+        now:pd.Timestamp = None) -> pd.DataFrame:
+    '''
+    `payment_matrices` from the summary store (`summary.read_payments`,
+    `read_issues`) without loading any chain: the payments need only
+    reach back to `payment_window`, and billing cycles need only each
+    bill's last `periods` issues.
+    '''
+    return payment_matrix(
+        payments,
+        PAYEE_BY_POSITION,
+        payees=list(PAYEES.keys()),
+        bills=list(BILL_LABELS),
+        periods=periods,
+        granularity=granularity,
+        issues=issues,
+        now=now
+    )
+
+
+def build_reports(snapshot, months:int = PAYMENT_MONTHS, periods:int = 6, granularity:str = 'M', now:pd.Timestamp = None) -> dict[str, pd.DataFrame]:
+    '''Every report as a flat table, keyed by report name.'''
+    by_frequency = [frequency_table(snapshot, frequency).assign(Frequency=frequency) for frequency in FREQUENCIES]
+    history = [price_history(bill).assign(Bill=bill.label) for bill in snapshot]
+    payments = []
+    status = []
+    for bill in snapshot:
+        for position in bill.dues_chains:
+            payee = payee_name(position)
+            payments.append(payment_history(bill, position, months, now).assign(Bill=bill.label, Payee=payee))
+            paid = payment_status(bill, position, months, now)
+            status.append({ 'Bill' : bill.label, 'Payee' : payee, 'Last Bill Issued' : paid['last_issued'],
+                'Last Payment' : paid['last_payment'], 'Received' : paid['received'] })
+    matrix = payment_matrices(snapshot, periods, granularity, now)
+
+    return {
+        'overview' : overview(snapshot),
+        'by_frequency' : pd.concat(by_frequency, ignore_index=True),
+        'price_history' : pd.concat(history, ignore_index=True),
+        'payment_history' : pd.concat(payments, ignore_index=True),
+        'payment_status' : pd.DataFrame(status),
+        'payment_matrix' : matrix.stack().rename('Paid').rename_axis(['Payee', 'Bill', 'Period']).reset_index(),
+    }
+
+
+def write_reports(reports:dict[str, pd.DataFrame], directory:str, format:str = 'csv') -> list[str]:
+    '''Write each report to `directory/<name>.<format>`; returns the paths.'''
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in reports.items():
+        path = os.path.join(directory, f'{name}.{format}')
+        if format == 'csv':
+            table.to_csv(path, index=False)
+        elif format == 'parquet':
+            table.to_parquet(path, index=False)
+        elif format == 'json':
+            table.to_json(path, orient='records', date_format='iso', indent=2)
+        else:
+            raise ValueError(f'unknown report format: {format}')
+        paths.append(path)
+    return paths
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.reports',
+        description='Write the bill reports without starting the dashboard.')
+    parser.add_argument('output', help='directory to write the reports to')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--arrow', metavar='DIR', default=config.ARROW_DATASET or None,
+        help='read a columnar export (hybridledger.columnar) instead of the database')
+    parser.add_argument('--months', type=int, default=PAYMENT_MONTHS,
+        help='payment history to include, in months; 0 for all (default: %(default)s)')
+    parser.add_argument('--periods', type=int, default=6, help='payment matrix periods (default: %(default)s)')
+    parser.add_argument('--granularity', choices=list(GRANULARITIES), default='Month')
+    args = parser.parse_args(argv)
+
+    if args.arrow:
+        from hybridledger.columnar import ArrowSource
+        snapshot = LedgerSnapshot(shared_bills(), ArrowSource(args.arrow))
+    else:
+        conn = connect_readonly(args.database)
+        try:
+            snapshot = LedgerSnapshot(shared_bills(), conn)
+        finally:
+            conn.close()
+    reports = build_reports(snapshot, args.months, args.periods, GRANULARITIES[args.granularity])
+    for path in write_reports(reports, args.output, args.format):
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
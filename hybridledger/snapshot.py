@@ -0,0 +1,74 @@
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from hybridledger.decode import decode_blocks
+from hybridledger.ledger import ServerHLChain, load_chains
+
+
+class LedgerSnapshot:
+    '''
+    Every bill's chains as of a single read point.
+
+    Build one per page run and let every section read from it, so
+    each chain is loaded once and all sections agree on the data.
+    `source` is an open `sqlite3.Connection`, read inside one read
+    transaction, or a `LedgerCache`, which returns cached and newly read
+    positions as of one database version unless the ledger keeps
+    changing while they are gathered (see `LedgerCache.get_blocks`).
+    '''
+
+    def __init__(self, bills:list[ServerHLChain], source):
+        if isinstance(source, sqlite3.Connection):
+            started = not source.in_transaction
+            if started:
+                source.execute('BEGIN')
+            try:
+                load_chains(bills, source)
+            finally:
+                if started:
+                    source.execute('COMMIT')
+        else:
+            source.load_chains(bills)
+
+        self.bills = bills
+        #'''loaded chains, in registry order'''
+        self.taken_at = datetime.now()
+        #'''when the snapshot was read'''
+        self._issues = None
+        self._payments = None
+        self._by_label = None
+        pass
+
+    def __iter__(self):
+        return iter(self.bills)
+
+    def bill(self, label:str) -> ServerHLChain:
+        '''The loaded chain with this label.'''
+        if self._by_label is None:
+            self._by_label = { bill.label : bill for bill in self.bills }
+        return self._by_label[label]
+
+    @property
+    def issues(self) -> pd.DataFrame:
+        '''Every bill issue (non-Genesis value block), with a `bill` label column.'''
+        if self._issues is None:
+            frames = [bill.values[~bill.values['genesis']].assign(bill=bill.label) for bill in self.bills]
+            self._issues = _concat(frames)
+        return self._issues
+
+    @property
+    def payments(self) -> pd.DataFrame:
+        '''Every payment-status block of every bill, with a `bill` label column.'''
+        if self._payments is None:
+            frames = [frame.assign(bill=bill.label) for bill in self.bills for frame in bill.dues.values()]
+            self._payments = _concat(frames)
+        return self._payments
+
+
+def _concat(frames:list[pd.DataFrame]) -> pd.DataFrame:
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return decode_blocks([]).assign(bill=pd.Series(dtype=object))
+    return pd.concat(frames, ignore_index=True)
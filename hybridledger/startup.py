@@ -0,0 +1,115 @@
+'''
+Startup benchmark: what the dashboard imports before its first paint.
+
+    python -m hybridledger.startup [--repeat 5] [--budget-ms MS] [--output startup.json]
+
+Imports the dashboard's modules in fresh interpreters under
+`python -X importtime` and reports the total and the slowest
+packages. Fails (exit status 1) when a plotting library is imported
+at startup, or when the import time exceeds `--budget-ms`.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DASHBOARD_IMPORTS = (
+    'streamlit',
+    'pandas',
+    'hybridledger.analytics',
+    'hybridledger.audit',
+    'hybridledger.cache',
+    'hybridledger.charts',
+    'hybridledger.db',
+    'hybridledger.interactive',
+    'hybridledger.live',
+    'hybridledger.profiling',
+    'hybridledger.registry',
+    'hybridledger.reports',
+    'hybridledger.snapshot',
+    'hybridledger.summary',
+    'hybridledger.tiles',
+)
+'''What streamlit-main.py imports before drawing anything.'''
+
+DEFERRED = ('matplotlib', 'seaborn')
+'''Packages that must only be imported once a chart is drawn.'''
+
+
+def import_times(modules:tuple[str, ...] = DASHBOARD_IMPORTS) -> list[tuple[str, int, int]]:
+    '''
+    `[(module, cumulative microseconds, nesting depth), ...]` for every
+    module a fresh interpreter imports to import `modules`.
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+        cwd=root, capture_output=True, text=True, check=True)
+
+    times = []
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package (indented 2 per level)
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times.append((name.strip(), int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2))
+    return times
+
+
+def _packages(times:list[tuple[str, int, int]]) -> dict[str, int]:
+    # microseconds per top-level package, from the outermost imports only
+    packages = {}
+    for name, cumulative, depth in times:
+        if depth == 0:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + cumulative
+    return packages
+
+
+def measure(repeat:int = 5, modules:tuple[str, ...] = DASHBOARD_IMPORTS) -> dict:
+    '''Best of `repeat` cold imports: total, per-package times and deferred packages imported.'''
+    runs = [import_times(modules) for _ in range(repeat)]
+    totals = [sum(_packages(times).values()) for times in runs]
+    best = runs[totals.index(min(totals))]
+    return {
+        'modules': list(modules),
+        'total_ms': round(min(totals) / 1000, 1),
+        'runs_ms': [round(total / 1000, 1) for total in totals],
+        'packages_ms': { package : round(us / 1000, 1)
+            for package, us in sorted(_packages(best).items(), key=lambda item: -item[1]) },
+        'deferred_imported': sorted({ name.split('.')[0] for name, _, _ in best } & set(DEFERRED)),
+    }
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.startup',
+        description='Measure the dashboard import time with -X importtime.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, help='fail when the best total exceeds this')
+    parser.add_argument('--top', type=int, default=10, help='packages to list (default: %(default)s)')
+    parser.add_argument('--output', help='also write the result as JSON')
+    args = parser.parse_args(argv)
+
+    result = measure(args.repeat)
+    print(f'startup imports: {result["total_ms"]} ms (best of {args.repeat}: {result["runs_ms"]})')
+    for package, ms in list(result['packages_ms'].items())[:args.top]:
+        print(f'{ms:>10.1f} ms  {package}')
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+
+    failed = False
+    if result['deferred_imported']:
+        print(f'imported at startup: {", ".join(result["deferred_imported"])}', file=sys.stderr)
+        failed = True
+    if args.budget_ms is not None and result['total_ms'] > args.budget_ms:
+        print(f'over budget: {result["total_ms"]} ms > {args.budget_ms} ms', file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+'''
+Per-bill summaries, kept up to date from newly appended blocks.
+
+    python -m hybridledger.summary [--database PATH] [--store PATH] [--full]
+
+The Overview and Billing by Frequency sections need a handful of
+numbers per bill (its last value, last and previous issue, delta and
+issue count), the bills' issues and their paid ("ok") payments. They
+are kept in a side SQLite database (`HL_SUMMARY_STORE`, in
+`HL_STATE_DIR`), and `update` folds in only the blocks past each
+chain's watermark (one batched `read_blocks` query), so the sections
+read O(bills) summary rows instead of loading every chain, plus the
+issues and payments of the window they show (indexed by bill and time):
+a page of bills' issues, or the payments of the payment grids' periods.
+
+Summaries follow the registry: a bill whose positions or frequency
+changed is summarized again from its first block.
+'''
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+from dateutil import tz
+
+from hybridledger import config, profiling
+from hybridledger.db import connect_readonly
+from hybridledger.decode import decode_blocks
+from hybridledger.ledger import read_blocks
+from hybridledger.registry import BILLS, BillSpec
+
+STORE_DDL = (
+    '''CREATE TABLE IF NOT EXISTS bills (
+        bill TEXT PRIMARY KEY,
+        spec TEXT NOT NULL,
+        value_blocks INTEGER NOT NULL,
+        last_data TEXT,
+        last_amount REAL,
+        issues INTEGER NOT NULL,
+        last_issue_amount REAL,
+        previous_issue_amount REAL,
+        last_issued INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS issues (
+        bill TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        amount REAL)''',
+    'CREATE INDEX IF NOT EXISTS issues_bill_time ON issues (bill, timestamp)',
+    '''CREATE TABLE IF NOT EXISTS payments (
+        bill TEXT NOT NULL,
+        position TEXT NOT NULL,
+        timestamp INTEGER NOT NULL)''',
+    'CREATE INDEX IF NOT EXISTS payments_bill_time ON payments (bill, timestamp)',
+    'CREATE INDEX IF NOT EXISTS payments_time ON payments (timestamp)',
+    # superseded by the indexes above
+    'DROP INDEX IF EXISTS issues_bill',
+    'DROP INDEX IF EXISTS payments_bill',
+    '''CREATE TABLE IF NOT EXISTS marks (
+        bill TEXT NOT NULL,
+        position TEXT NOT NULL,
+        "index" INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        PRIMARY KEY (bill, position))''',
+    'CREATE TABLE IF NOT EXISTS store (key TEXT PRIMARY KEY, value)',
+)
+'''Bill summaries, every bill issue and paid payment, and the watermark of each chain summarized.'''
+
+# each bill's `last` latest issues, ranked as `analytics.payment_matrix` ranks billing cycles
+_LAST_ISSUES = '''SELECT id, bill, timestamp, amount FROM (
+        SELECT rowid AS id, bill, timestamp, amount,
+            ROW_NUMBER() OVER (PARTITION BY bill ORDER BY timestamp DESC, rowid DESC) AS cycle
+        FROM issues WHERE bill IN (SELECT value FROM json_each(?)))
+    WHERE cycle <= ?'''
+
+BILL_COLUMNS = ('value_blocks', 'last_data', 'last_amount', 'issues', 'last_issue_amount',
+    'previous_issue_amount', 'last_issued')
+
+SUMMARY_TABLES = ('bills', 'issues', 'payments', 'marks')
+
+STORE_VERSION = 2
+'''Layout of the store tables; a store of another version is summarized again.'''
+
+
+def _spec(bill:BillSpec) -> str:
+    return json.dumps([bill.pos_value, list(bill.pos_payment_stacks), bill.frequency])
+
+
+def _empty_bill() -> dict:
+    return { 'value_blocks' : 0, 'last_data' : None, 'last_amount' : None, 'issues' : 0,
+        'last_issue_amount' : None, 'previous_issue_amount' : None, 'last_issued' : None }
+
+
+def _number(value) -> float | None:
+    # NaN is stored as NULL
+    return None if pd.isna(value) else float(value)
+
+
+def fold_values(row:dict, values:pd.DataFrame) -> dict:
+    '''Add value blocks appended to a bill (decoded, in chain order) to its summary `row`.'''
+    if not len(values):
+        return row
+    row['value_blocks'] += len(values)
+    row['last_data'] = values['data'].iloc[-1]
+    row['last_amount'] = _number(values['amount'].iloc[-1])
+    issues = values[~values['genesis']]
+    if len(issues):
+        amounts = [_number(amount) for amount in issues['amount']]
+        row['previous_issue_amount'] = amounts[-2] if len(amounts) > 1 else (
+            row['last_issue_amount'] if row['issues'] else None)
+        row['last_issue_amount'] = amounts[-1]
+        row['last_issued'] = int(issues['timestamp'].iloc[-1])
+        row['issues'] += len(issues)
+    return row
+
+
+def connect_store(path:str = config.SUMMARY_STORE) -> sqlite3.Connection:
+    '''Open (creating it and its directory if needed) the summary store; autocommit, transactions are explicit.'''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=config.SQLITE_BUSY_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for ddl in STORE_DDL:
+        conn.execute(ddl)
+    return conn
+
+
+def _state(conn:sqlite3.Connection, key:str, default=None):
+    row = conn.execute('SELECT value FROM store WHERE key = ?', (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+def _marks(conn:sqlite3.Connection, bills:tuple[BillSpec, ...]) -> dict[str, tuple[int, int]]:
+    # watermarks of the chains whose bill is summarized under its current spec
+    specs = dict(conn.execute('SELECT bill, spec FROM bills'))
+    current = { bill.label for bill in bills if specs.get(bill.label) == _spec(bill) }
+    return { position : (index, timestamp) for bill, position, index, timestamp
+        in conn.execute('SELECT bill, position, "index", timestamp FROM marks') if bill in current }
+
+
+def _past(blocks:list, mark:tuple[int, int] | None) -> list:
+    # blocks read before another session moved the watermark are skipped
+    if mark is None:
+        return blocks
+    return [block for block in blocks if (block.index, block.timestamp) > mark]
+
+
+@profiling.timed()
+def update(database:str = config.DATABASE, store:str = config.SUMMARY_STORE, bills:tuple[BillSpec, ...] = BILLS,
+        full:bool = False) -> int:
+    '''
+    Fold the blocks appended to every bill's chains since the last
+    update into the store (all of them with `full`, or when it was
+    built from another database or layout). Returns how many blocks were folded;
+    an update with nothing new writes nothing.
+    '''
+    database = os.path.abspath(database)
+    conn = connect_store(store)
+    ledger = connect_readonly(database)
+    try:
+        if full or _state(conn, 'database') != database or _state(conn, 'version') != STORE_VERSION:
+            conn.execute('BEGIN IMMEDIATE')
+            for table in SUMMARY_TABLES:
+                conn.execute(f'DELETE FROM {table}')
+            conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?)',
+                [('database', database), ('version', STORE_VERSION)])
+            conn.execute('COMMIT')
+
+        since = _marks(conn, bills)
+        positions = [position for bill in bills for position in bill.positions]
+        ledger.execute('BEGIN')
+        try:
+            blocks = read_blocks(ledger, positions, since)
+        finally:
+            ledger.execute('COMMIT')
+        labels = [bill.label for bill in bills]
+        summarized = [row[0] for row in conn.execute('SELECT bill FROM bills ORDER BY rowid')]
+        if not any(blocks.values()) and len(since) == len(positions) and summarized == labels:
+            return 0
+
+        folded = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # another session may have folded some of the blocks meanwhile
+            marks = _marks(conn, bills)
+            rows = { row[0] : dict(zip(BILL_COLUMNS, row[2:])) for row in conn.execute('SELECT * FROM bills') }
+            for bill in bills:
+                if bill.pos_value not in marks:
+                    # new or changed bill: summarized again from its first block
+                    for table in SUMMARY_TABLES[1:]:
+                        conn.execute(f'DELETE FROM {table} WHERE bill = ?', (bill.label,))
+                    rows[bill.label] = _empty_bill()
+
+                for position in bill.positions:
+                    new = _past(blocks[position], marks.get(position))
+                    if not new:
+                        if position not in marks:
+                            # an empty chain is summarized too
+                            conn.execute('INSERT OR REPLACE INTO marks VALUES (?, ?, -1, -1)', (bill.label, position))
+                        continue
+                    decoded = decode_blocks(new)
+                    if position == bill.pos_value:
+                        fold_values(rows[bill.label], decoded)
+                        issues = decoded[~decoded['genesis']]
+                        conn.executemany('INSERT INTO issues VALUES (?, ?, ?)', [(bill.label, int(timestamp), _number(amount))
+                            for timestamp, amount in zip(issues['timestamp'], issues['amount'])])
+                    else:
+                        conn.executemany('INSERT INTO payments VALUES (?, ?, ?)', [(bill.label, position, int(timestamp))
+                            for timestamp in decoded.loc[decoded['paid'], 'timestamp']])
+                    conn.execute('INSERT OR REPLACE INTO marks VALUES (?, ?, ?, ?)',
+                        (bill.label, position, new[-1].index, new[-1].timestamp))
+                    folded += len(new)
+
+            # rewritten in registry order, which `read_bills` keeps
+            conn.execute('DELETE FROM bills')
+            conn.executemany(f'INSERT INTO bills VALUES ({", ".join("?" * (2 + len(BILL_COLUMNS)))})',
+                [(bill.label, _spec(bill), *(rows[bill.label][column] for column in BILL_COLUMNS)) for bill in bills])
+            for table in SUMMARY_TABLES[1:]:
+                conn.execute(f'DELETE FROM {table} WHERE bill NOT IN ({", ".join("?" * len(labels))})', labels)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        ledger.close()
+        conn.close()
+    return folded
+
+
+def _bills_frame(rows:list[tuple], bills:tuple[BillSpec, ...]) -> pd.DataFrame:
+    by_label = { bill.label : bill for bill in bills }
+    frame = pd.DataFrame.from_records(rows, columns=['bill', *BILL_COLUMNS])
+    frame.insert(1, 'frequency', [by_label[label].frequency for label in frame['bill']])
+    frame.insert(2, 'responsible', [len(by_label[label].pos_payment_stacks) for label in frame['bill']])
+    frame = frame.astype({ 'last_amount' : 'float64', 'last_issue_amount' : 'float64',
+        'previous_issue_amount' : 'float64', 'last_data' : object })
+    frame['delta'] = frame['last_issue_amount'] - frame['previous_issue_amount']
+    frame['last_issued'] = _local(frame['last_issued'])
+    return frame
+
+
+def _local(timestamps:pd.Series) -> pd.Series:
+    # as `decode_blocks` shows times: local, timezone-naive
+    return (pd.to_datetime(timestamps, unit='ms', utc=True)
+        .dt.tz_convert(tz.tzlocal())
+        .dt.tz_localize(None))
+
+
+def _epoch_ms(when:pd.Timestamp) -> int:
+    # inverse of `_local`
+    return int(pd.Timestamp(when).tz_localize(tz.tzlocal(), ambiguous=True, nonexistent='shift_forward').value // 1_000_000)
+
+
+def _read(store:str, sql:str, parameters:tuple = ()) -> list[tuple] | None:
+    if not os.path.exists(store):
+        return None
+    conn = connect_readonly(store)
+    try:
+        return conn.execute(sql, parameters).fetchall()
+    except sqlite3.OperationalError:
+        # not created yet
+        return None
+    finally:
+        conn.close()
+
+
+def read_bills(store:str = config.SUMMARY_STORE, bills:tuple[BillSpec, ...] = BILLS) -> pd.DataFrame | None:
+    '''
+    One row per bill, in registry order: `bill`, `frequency`,
+    `responsible`, `value_blocks`, `last_data` and `last_amount` (of the
+    last value block), `issues`, `last_issue_amount`,
+    `previous_issue_amount`, `delta` and `last_issued`. None unless the
+    store summarizes exactly the registry's bills.
+    '''
+    rows = _read(store, f'SELECT bill, spec, {", ".join(BILL_COLUMNS)} FROM bills ORDER BY rowid')
+    if rows is None or [(row[0], row[1]) for row in rows] != [(bill.label, _spec(bill)) for bill in bills]:
+        return None
+    return _bills_frame([(row[0], *row[2:]) for row in rows], bills)
+
+
+def read_issues(store:str = config.SUMMARY_STORE, bills:tuple[BillSpec, ...] = BILLS, last:int = None) -> pd.DataFrame:
+    '''
+    The issues of `bills` (of each bill only its `last` latest, with
+    `last`): `bill`, `timestamp`, `issued` and `amount`, bill by bill in
+    `bills` (then chain) order.
+    '''
+    labels = json.dumps([bill.label for bill in bills])
+    if last is None:
+        rows = _read(store, 'SELECT bill, timestamp, amount FROM issues '
+            'WHERE bill IN (SELECT value FROM json_each(?)) ORDER BY rowid', (labels,)) or []
+    else:
+        rows = _read(store, f'SELECT bill, timestamp, amount FROM ({_LAST_ISSUES}) ORDER BY id', (labels, last)) or []
+    frame = pd.DataFrame.from_records(rows, columns=['bill', 'timestamp', 'amount']).astype({ 'amount' : 'float64' })
+    order = pd.Categorical(frame['bill'], categories=[bill.label for bill in bills]).codes
+    frame = frame.iloc[order.argsort(kind='stable')].reset_index(drop=True)
+    frame.insert(2, 'issued', _local(frame['timestamp']))
+    return frame
+
+
+def read_payments(store:str = config.SUMMARY_STORE, since:pd.Timestamp = None, cycles:int = None,
+        bills:tuple[BillSpec, ...] = BILLS) -> pd.DataFrame:
+    '''
+    The paid ("ok") payment blocks a `analytics.payment_matrix` window
+    shows: `bill`, `position`, `timestamp`, `issued` and `paid` (always
+    true), as it reads them from `LedgerSnapshot.payments`. With `since`
+    (local time, as `issued`), only those issued from then on; with
+    `cycles`, only those after the oldest of each bill's `cycles` latest
+    issues (`read_issues(last=cycles)`). Only the window is read.
+    '''
+    sql = 'SELECT bill, position, timestamp FROM payments'
+    parameters = ()
+    if cycles is not None:
+        sql = (f'SELECT payments.bill, position, payments.timestamp FROM payments JOIN '
+            f'(SELECT bill, MIN(timestamp) AS first FROM ({_LAST_ISSUES}) GROUP BY bill) AS kept '
+            'ON payments.bill = kept.bill AND payments.timestamp > kept.first')
+        parameters = (json.dumps([bill.label for bill in bills]), cycles)
+    if since is not None:
+        sql += (' AND' if cycles is not None else ' WHERE') + ' payments.timestamp >= ?'
+        parameters += (_epoch_ms(since),)
+    rows = _read(store, sql + ' ORDER BY payments.rowid', parameters) or []
+    frame = pd.DataFrame.from_records(rows, columns=['bill', 'position', 'timestamp'])
+    frame['issued'] = _local(frame['timestamp'])
+    frame['paid'] = True
+    return frame
+
+
+def summarize(snapshot, bills:tuple[BillSpec, ...] = BILLS) -> pd.DataFrame:
+    '''`read_bills` computed from loaded chains (a `LedgerSnapshot`), for when there is no store.'''
+    rows = []
+    for chain in snapshot:
+        rows.append((chain.label, *fold_values(_empty_bill(), chain.values).values()))
+    return _bills_frame(rows, bills)
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.summary',
+        description='Fold the blocks appended since the last update into the bill summaries.')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--store', default=config.SUMMARY_STORE, help='summary store (default: %(default)s)')
+    parser.add_argument('--full', action='store_true', help='summarize every block again')
+    args = parser.parse_args(argv)
+
+    folded = update(args.database, args.store, full=args.full)
+    print(f'{args.store}: {folded} blocks folded')
+    print(read_bills(args.store).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
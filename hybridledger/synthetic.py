@@ -0,0 +1,228 @@
+'''
+Synthetic ledger databases for benchmarks and tests.
+
+    python -m hybridledger.synthetic PATH [--bills N] [--payees N] [--years Y] [--blocks N] [--registry FILE]
+
+Writes the `HybridLedgers` (and empty `Users`) tables exactly as
+Sequelize creates them from module/db.js, filled with bill ledgers
+shaped like the dashboard's: a value chain of bill amounts per bill and
+one payment chain per responsible payee, each opened by a Genesis block
+and linked by `previousHash` the way module/block.js hashes blocks, so
+`checkPristine()` holds for every generated ledger.
+'''
+
+import argparse
+import hashlib
+import math
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from hybridledger.ledger import ServerHLChain
+
+
+USERS_DDL = (
+    'CREATE TABLE IF NOT EXISTS `Users` (`id` INTEGER PRIMARY KEY AUTOINCREMENT, '
+    '`userUUID` VARCHAR(255) NOT NULL UNIQUE, `userName` VARCHAR(255) NOT NULL UNIQUE, '
+    '`userEmail` VARCHAR(255), `publicName` VARCHAR(255), `accountType` INTEGER DEFAULT 0, '
+    '`emoji` VARCHAR(255), `displayEmail` TINYINT(1) NOT NULL DEFAULT 0, '
+    '`privatePassword` VARCHAR(255) NOT NULL, `createdAt` DATETIME NOT NULL, `updatedAt` DATETIME NOT NULL)')
+
+LEDGERS_DDL = (
+    'CREATE TABLE IF NOT EXISTS `HybridLedgers` (`id` INTEGER PRIMARY KEY AUTOINCREMENT, '
+    '`index` INTEGER NOT NULL DEFAULT 0, `position` VARCHAR(255) NOT NULL, '
+    '`ownership` VARCHAR(255) NOT NULL, `blockType` INTEGER NOT NULL DEFAULT 0, `data` VARCHAR(255), '
+    "`previousHash` VARCHAR(255) NOT NULL DEFAULT '0', `minted` INTEGER NOT NULL DEFAULT 0, "
+    '`nonce` INTEGER NOT NULL, `timestamp` INTEGER NOT NULL, `uuid` VARCHAR(255) NOT NULL, '
+    '`createdAt` DATETIME NOT NULL, `updatedAt` DATETIME NOT NULL)')
+'''Sequelize's sqlite DDL for the models in module/db.js.'''
+
+GENESIS_DATA = 'Genesis Ledger Registration'
+
+PERIOD_DAYS = {
+    'Weekly': 7,
+    'Biweekly': 14,
+    'Monthly': 30,
+    'Bi-monthly': 61,
+}
+'''Days between bill issues for each frequency the dashboard knows.'''
+
+PAYMENT_NOTES = (('ok', 70), ('OK paid', 15), ('late', 10), ('partial', 5))
+'''Payment `data` payloads and their weights; "ok" anywhere means paid.'''
+
+DAY_MS = 86400000
+INSERT_BATCH = 50000
+
+
+def block_hash(index:int, position:str, minted:int, ownership:str, block_type:int,
+        timestamp:int, previous_hash:str, data:str, nonce:int) -> str:
+    '''`Block.getHash()` from module/block.js.'''
+    return hashlib.sha256((f'{index}{position}{minted}{ownership}{block_type}'
+        f'{timestamp}{previous_hash}{"null" if data is None else data}{nonce}').encode()).hexdigest()
+
+
+def mint(index:int, position:str, ownership:str, block_type:int,
+        timestamp:int, previous_hash:str, data:str, difficulty:int) -> tuple[int, int, str]:
+    '''`Block.mint(difficulty)` on a fresh block; returns `(minted, nonce, hash)`.'''
+    nonce = 0
+    digest = block_hash(index, position, 1, ownership, block_type, timestamp, previous_hash, data, nonce)
+    while not digest.startswith('0' * difficulty):
+        nonce += 1
+        digest = block_hash(index, position, 1, ownership, block_type, timestamp, previous_hash, data, nonce)
+    return 1, nonce, digest
+
+
+def bills_for(blocks:int, payees_per_bill:float = 1.5, years:float = 1.0) -> int:
+    '''How many bills `generate` needs to write about `blocks` blocks.'''
+    days = years * 365
+    per_chain = sum(days / period + 1 for period in PERIOD_DAYS.values()) / len(PERIOD_DAYS)
+    return max(1, math.ceil(blocks / (per_chain * (1 + payees_per_bill))))
+
+
+def _position(x:int, y:int) -> str:
+    # signed hex coordinates, like the dashboard's '-a8,-c2'
+    return f'{"-" if x < 0 else ""}{abs(x):x},{"-" if y < 0 else ""}{abs(y):x}'
+
+
+def _sequelize_time(ms:int) -> str:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + ' +00:00'
+
+
+class _Writer:
+    # appends blocks to one ledger at a time, hashing and batching the inserts
+
+    def __init__(self, conn:sqlite3.Connection, rng:random.Random, difficulty:int):
+        self.conn = conn
+        self.rng = rng
+        self.difficulty = difficulty
+        self.rows = []
+        self.count = 0
+        pass
+
+    def ledger(self, position:str, ownership:str, blocks:list[tuple[int, int, str]]):
+        # blocks: [(blockType, timestamp, data), ...]
+        previous_hash = '0'
+        for index, (block_type, timestamp, data) in enumerate(blocks):
+            minted, nonce, digest = mint(index, position, ownership, block_type,
+                timestamp, previous_hash, data, self.difficulty)
+            stamp = _sequelize_time(timestamp)
+            self.rows.append((index, position, ownership, block_type, data, previous_hash,
+                minted, nonce, timestamp, str(uuid.UUID(int=self.rng.getrandbits(128), version=4)), stamp, stamp))
+            previous_hash = digest
+        self.count += len(blocks)
+        if len(self.rows) >= INSERT_BATCH:
+            self.flush()
+        return
+
+    def flush(self):
+        self.conn.executemany('INSERT INTO `HybridLedgers` (`index`, `position`, `ownership`, `blockType`, '
+            '`data`, `previousHash`, `minted`, `nonce`, `timestamp`, `uuid`, `createdAt`, `updatedAt`) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.rows)
+        self.rows.clear()
+        return
+
+
+def generate(
+        path:str,
+        bills:int = 12,
+        payees:int = 2,
+        years:float = 1.0,
+        seed:int = 0,
+        difficulty:int = 0,
+        now:int = None
+    ) -> tuple[list[ServerHLChain], dict[str, list[str]]]:
+    '''
+    Write a ledger database at `path` (replacing its `HybridLedgers` rows).
+
+    Bill `k` keeps its amounts at position `k,0` and the payments of its
+    responsible payees (one or two of `payees`) at `k,1`, `k,2`, ...
+    Frequencies cycle through `PERIOD_DAYS`, with `years` of issues
+    ending at `now` (epoch ms). `difficulty` is the proof of work every
+    block is minted with; 0 skips it (blocks still link correctly).
+
+    Returns the registry of the generated data: `(bills, payees)` in the
+    dashboard's `SharedBills` / `Payees` shapes.
+    '''
+    rng = random.Random(seed)
+    now = int(time.time() * 1000) if now is None else now
+    payee_names = [f'Payee {number + 1}' for number in range(payees)]
+    payee_uuids = { name : str(uuid.UUID(int=rng.getrandbits(128), version=4)) for name in payee_names }
+    notes, weights = zip(*PAYMENT_NOTES)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute(USERS_DDL)
+        conn.execute(LEDGERS_DDL)
+        conn.execute('DELETE FROM `HybridLedgers`')
+        writer = _Writer(conn, rng, difficulty)
+
+        registry = []
+        positions = { name : [] for name in payee_names }
+        frequencies = list(PERIOD_DAYS)
+        for k in range(bills):
+            frequency = frequencies[k % len(frequencies)]
+            period = PERIOD_DAYS[frequency] * DAY_MS
+            issued = list(range(now - int(years * 365 * DAY_MS), now, period))
+            responsible = rng.sample(payee_names, min(len(payee_names), rng.choice((1, 2))))
+            owner = payee_uuids[responsible[0]]
+
+            amount = rng.uniform(40, 200)
+            issues = [(1, issued[0] - DAY_MS, GENESIS_DATA)]
+            for timestamp in issued:
+                amount = max(1.0, amount * rng.uniform(0.85, 1.15))
+                issues.append((2, timestamp, f'{amount:.2f}'))
+            value_position = _position(k, 0)
+            writer.ledger(value_position, owner, issues)
+
+            payment_positions = []
+            for number, payee in enumerate(responsible):
+                payments = [(1, issued[0] - DAY_MS, GENESIS_DATA)]
+                for timestamp in issued:
+                    if rng.random() < 0.9:
+                        paid_at = min(now - 1, timestamp + rng.randint(1, 5) * DAY_MS)
+                        payments.append((2, paid_at, rng.choices(notes, weights)[0]))
+                position = _position(k, number + 1)
+                writer.ledger(position, payee_uuids[payee], payments)
+                payment_positions.append(position)
+                positions[payee].append(position)
+
+            registry.append(ServerHLChain(pos_value=value_position, pos_payment_stacks=payment_positions,
+                label=f'Bill {k + 1}', frequency=frequency))
+        writer.flush()
+        conn.commit()
+    finally:
+        conn.close()
+    return registry, positions
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.synthetic',
+        description='Write a synthetic HybridLedgers database.')
+    parser.add_argument('path')
+    parser.add_argument('--bills', type=int, default=12)
+    parser.add_argument('--blocks', type=int, help='size for about this many blocks (overrides --bills)')
+    parser.add_argument('--payees', type=int, default=2)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--difficulty', type=int, default=0, help='leading zeros to mint (slow above 3)')
+    parser.add_argument('--registry', help='also write the bills and payees as a registry file (for HL_REGISTRY)')
+    args = parser.parse_args(argv)
+
+    bills = bills_for(args.blocks, years=args.years) if args.blocks else args.bills
+    started = time.perf_counter()
+    registry, positions = generate(args.path, bills, args.payees, args.years, args.seed, args.difficulty)
+    print(f'{args.path}: {len(registry)} bills in {time.perf_counter() - started:.1f}s')
+    if args.registry:
+        # imported here: the registry module reads HL_REGISTRY when imported
+        from hybridledger.registry import write_registry
+        write_registry(args.registry, registry, positions)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
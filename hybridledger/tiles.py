@@ -0,0 +1,354 @@
+'''
+Spatial index of ledger positions, and a tile pyramid of their blocks.
+
+    python -m hybridledger.tiles [--database PATH] [--index PATH] [--full]
+
+Positions are hex coordinates on an unbounded grid, optionally in a
+realm (`-a8,-c2`, `<uuid>:0x0,0x0`); the server reads them with
+`parseInt(part, 16)` and draws gate areas of 8x8 cells, one
+`callHybridLedger` per cell. Here every position is parsed once into
+integer coordinates, and every block is added to one tile per zoom
+level: a level-`z` tile covers 2**z x 2**z cells, so level 0 is a
+single cell and `GATE_LEVEL` a gate area.
+
+Tiles hold pre-aggregated statistics: blocks, ledgers, the owner and
+timestamp of the latest block written in the tile (not the owners of
+its ledgers), and value. They are kept in a side SQLite database
+(`HL_TILE_INDEX`, in `HL_STATE_DIR`) and updated from the rows added
+since the last update, so a map at any zoom reads a bounded number of
+tiles and never the ledger table.
+
+Value is the sum of `HybridLedger.getValue()` over the tile's ledgers,
+approximately: it counts the same blocks (no EMPTY ones) and subtracts
+transactions, but every block's value ages with time, so tiles keep
+the parts that add up linearly (`mint_values`, the blocks' timestamps,
+`spent_values`) and `read_tiles` sums them for the time asked. Blocks
+valued below zero are not clamped, `Block.getValue`'s rounding is
+skipped, and transaction amounts that are not numbers count as 0, so
+it is an estimate; `hybridledger.valuation` computes exact values.
+'''
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from hybridledger import config, profiling
+from hybridledger.db import connect_readonly
+from hybridledger.ledger import LEDGER_COLUMNS
+from hybridledger.valuation import AGING_MS, JS_WHITESPACE, VALUED_TYPES, block_hashes, mint_values, spent_values
+
+PUBLIC_REALM = 'public'
+'''Realm of positions without a `realm:` prefix (as `HybridLedger` names it).'''
+
+GATE_SIZE = 8
+'''Cells per side of a server gate area (`TimeMatrix`).'''
+
+GATE_LEVEL = 3
+'''The zoom level whose tiles are gate areas (2**3 = `GATE_SIZE`).'''
+
+MAX_COORDINATE = 2**53
+'''Coordinates at or beyond this lose precision in JS; such positions are not indexed.'''
+
+TILE_BATCH = 200000
+'''Ledger rows added to the pyramid per transaction.'''
+
+MAP_MAX_SIDE = 128
+'''Most tiles per side a map reads (see `fit_level`).'''
+
+METRICS = ('blocks', 'ledgers', 'value', 'owner')
+
+INDEX_VERSION = 2
+'''Layout of the tiles table; an index of another version is rebuilt.'''
+
+TILES_DDL = '''CREATE TABLE IF NOT EXISTS tiles (
+    realm TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    blocks INTEGER NOT NULL,
+    ledgers INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    last_timestamp INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    valued INTEGER NOT NULL,
+    mint_value REAL NOT NULL,
+    aging REAL NOT NULL,
+    spent REAL NOT NULL,
+    PRIMARY KEY (realm, level, x, y)) WITHOUT ROWID'''
+
+INDEX_DDL = (
+    '''CREATE TABLE IF NOT EXISTS positions (
+        position TEXT PRIMARY KEY,
+        realm TEXT,
+        x INTEGER,
+        y INTEGER)''',
+    'CREATE INDEX IF NOT EXISTS positions_cell ON positions (realm, x, y)',
+    TILES_DDL,
+    'CREATE TABLE IF NOT EXISTS pyramid (key TEXT PRIMARY KEY, value)',
+)
+'''Positions (NULL coordinates when unparseable), tiles, and the update state.'''
+
+_UPSERT_TILE = '''INSERT INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (realm, level, x, y) DO UPDATE SET
+        blocks = blocks + excluded.blocks,
+        ledgers = ledgers + excluded.ledgers,
+        owner = iif((excluded.last_timestamp, excluded.last_id) > (last_timestamp, last_id), excluded.owner, owner),
+        last_timestamp = max(last_timestamp, excluded.last_timestamp),
+        last_id = iif((excluded.last_timestamp, excluded.last_id) > (last_timestamp, last_id), excluded.last_id, last_id),
+        valued = valued + excluded.valued,
+        mint_value = mint_value + excluded.mint_value,
+        aging = aging + excluded.aging,
+        spent = spent + excluded.spent'''
+
+
+def parse_coordinate(text:str) -> int | None:
+    '''`parseInt(text, 16)`: an optional sign and `0x`, then the leading hex digits; None for NaN.'''
+    text = text.lstrip(JS_WHITESPACE)
+    sign = -1 if text[:1] == '-' else 1
+    if text[:1] in '+-':
+        text = text[1:]
+    if text[:2] in ('0x', '0X'):
+        text = text[2:]
+    digits = len(text) - len(text.lstrip('0123456789abcdefABCDEF'))
+    if not digits:
+        return None
+    value = sign * int(text[:digits], 16)
+    return value if abs(value) < MAX_COORDINATE else None
+
+
+def parse_position(position:str) -> tuple[str, int, int] | None:
+    '''`(realm, x, y)` of a position like `-a8,-c2` or `realm:0x0,0x0`; None if it is not a coordinate.'''
+    realm, colon, coordinates = position.partition(':')
+    if not colon:
+        realm, coordinates = PUBLIC_REALM, position
+    parts = coordinates.split(',')
+    if len(parts) != 2:
+        return None
+    x, y = parse_coordinate(parts[0]), parse_coordinate(parts[1])
+    return None if x is None or y is None else (realm, x, y)
+
+
+def gate(x:int, y:int) -> tuple[int, int]:
+    '''The gate area (`/gate/last/X/Y`) holding cell `(x, y)`.'''
+    return x // GATE_SIZE, y // GATE_SIZE
+
+
+def connect_index(path:str = config.TILE_INDEX) -> sqlite3.Connection:
+    '''Open (creating it and its directory if needed) the tile index; autocommit, transactions are explicit.'''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=config.SQLITE_BUSY_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for ddl in INDEX_DDL:
+        conn.execute(ddl)
+    return conn
+
+
+def _state(conn:sqlite3.Connection, key:str, default=None):
+    row = conn.execute('SELECT value FROM pyramid WHERE key = ?', (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+def _set_state(conn:sqlite3.Connection, **values):
+    conn.executemany('INSERT OR REPLACE INTO pyramid VALUES (?, ?)', values.items())
+    return
+
+
+def _add_blocks(conn:sqlite3.Connection, frame:pd.DataFrame, levels:int) -> int:
+    # index new positions; a block at a position seen for the first time adds a ledger
+    parsed = {}
+    new = set()
+    for position in frame['position'].unique():
+        parsed[position] = parse_position(position)
+        cell = parsed[position] or (None, None, None)
+        if conn.execute('INSERT OR IGNORE INTO positions VALUES (?, ?, ?, ?)', (position, *cell)).rowcount:
+            new.add(position)
+
+    frame = frame[frame['position'].map(parsed).notna().to_numpy()].reset_index(drop=True)
+    if not len(frame):
+        return 0
+    cells = frame['position'].map(parsed)
+    realm = cells.str[0].to_numpy(dtype=object)
+    x = np.array(cells.str[1].tolist(), dtype='int64')
+    y = np.array(cells.str[2].tolist(), dtype='int64')
+
+    mint = mint_values(frame, block_hashes(frame)[1])
+    # as HybridLedger.getValue: EMPTY blocks add nothing, transactions subtract their amount
+    valued = np.isin(frame['blockType'].to_numpy(), VALUED_TYPES)
+    spent = spent_values(frame)
+    blocks = pd.DataFrame({
+        'realm': realm,
+        'ledgers': (frame['position'].isin(new) & ~frame['position'].duplicated()).astype('int64'),
+        'owner': frame['ownership'].to_numpy(dtype=object),
+        'timestamp': frame['timestamp'].to_numpy(dtype='int64'),
+        'id': frame['id'].to_numpy(dtype='int64'),
+        'valued': valued.astype('int64'),
+        # a block minted 0 times is worth Infinity; it would swamp its every tile
+        'mint_value': np.where(valued & np.isfinite(mint), mint, 0.0),
+        'aging': np.where(valued, frame['timestamp'].to_numpy(dtype='float64') / AGING_MS, 0.0),
+        'spent': np.where(np.isfinite(spent), spent, 0.0),
+    }).sort_values(['timestamp', 'id'], kind='stable')
+
+    for level in range(levels):
+        # >> floors, so negative coordinates tile like positive ones
+        tiles = blocks.assign(level=level, x=x[blocks.index] >> level, y=y[blocks.index] >> level)
+        grouped = tiles.groupby(['realm', 'level', 'x', 'y'], sort=False)
+        summary = grouped.agg(blocks=('id', 'size'), ledgers=('ledgers', 'sum'), owner=('owner', 'last'),
+            last_timestamp=('timestamp', 'last'), last_id=('id', 'last'), valued=('valued', 'sum'),
+            mint_value=('mint_value', 'sum'), aging=('aging', 'sum'), spent=('spent', 'sum')).reset_index()
+        conn.executemany(_UPSERT_TILE, summary.itertuples(index=False, name=None))
+    return len(frame)
+
+
+@profiling.timed()
+def update(database:str = config.DATABASE, index:str = config.TILE_INDEX, full:bool = False,
+        levels:int = config.TILE_LEVELS) -> dict:
+    '''
+    Add the blocks written to `database` since the last update to the
+    pyramid (every block with `full`, when `levels` or the layout
+    changed, or when it was built from another database). Safe to call from concurrent
+    sessions: each batch is added inside one write transaction.
+    '''
+    database = os.path.abspath(database)
+    conn = connect_index(index)
+    ledger = connect_readonly(database)
+    columns = ', '.join(f'"{column}"' for column in ('id', *LEDGER_COLUMNS))
+    added = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if (full or _state(conn, 'database') != database or _state(conn, 'levels') != levels
+                    or _state(conn, 'version') != INDEX_VERSION):
+                conn.execute('DELETE FROM positions')
+                # recreated, as an older layout lacks columns
+                conn.execute('DROP TABLE tiles')
+                conn.execute(TILES_DDL)
+                _set_state(conn, database=database, levels=levels, version=INDEX_VERSION, last_id=0)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                after = _state(conn, 'last_id', 0)
+                rows = ledger.execute(f'SELECT {columns} FROM "HybridLedgers" WHERE "id" > ? ORDER BY "id" LIMIT ?',
+                    (after, TILE_BATCH)).fetchall()
+                if rows:
+                    added += _add_blocks(conn, pd.DataFrame.from_records(rows, columns=['id', *LEDGER_COLUMNS]), levels)
+                    _set_state(conn, last_id=rows[-1][0], updated_at=int(time.time() * 1000))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if len(rows) < TILE_BATCH:
+                break
+        last_id = _state(conn, 'last_id', 0)
+    finally:
+        ledger.close()
+        conn.close()
+    return { 'added' : added, 'last_id' : last_id }
+
+
+def _connect(index:str) -> sqlite3.Connection | None:
+    return connect_readonly(index) if os.path.exists(index) else None
+
+
+def realms(index:str = config.TILE_INDEX) -> list[str]:
+    '''Realms with indexed blocks, the public realm first.'''
+    conn = _connect(index)
+    if conn is None:
+        return []
+    try:
+        names = [row[0] for row in conn.execute('SELECT DISTINCT realm FROM tiles WHERE level = 0')]
+    finally:
+        conn.close()
+    return sorted(names, key=lambda realm: (realm != PUBLIC_REALM, realm))
+
+
+def extent(realm:str, level:int, index:str = config.TILE_INDEX) -> tuple[int, int, int, int] | None:
+    '''`(min x, max x, min y, max y)` of the realm's tiles at `level`, or None.'''
+    conn = _connect(index)
+    if conn is None:
+        return None
+    try:
+        bounds = conn.execute('SELECT min(x), max(x), min(y), max(y) FROM tiles WHERE realm = ? AND level = ?',
+            (realm, level)).fetchone()
+    finally:
+        conn.close()
+    return None if bounds[0] is None else bounds
+
+
+def fit_level(realm:str, index:str = config.TILE_INDEX, max_side:int = MAP_MAX_SIDE,
+        levels:int = config.TILE_LEVELS) -> int:
+    '''The most detailed level at which the whole realm fits in `max_side` x `max_side` tiles.'''
+    for level in range(levels):
+        bounds = extent(realm, level, index)
+        if bounds is None or max(bounds[1] - bounds[0], bounds[3] - bounds[2]) < max_side:
+            return level
+    return levels - 1
+
+
+def read_tiles(realm:str, level:int, window:tuple[int, int, int, int] = None, now:int = None,
+        index:str = config.TILE_INDEX) -> pd.DataFrame:
+    '''
+    The realm's tiles at `level` (within `window`, `(x0, x1, y0, y1)`
+    inclusive, in tile coordinates): `x`, `y`, `blocks`, `ledgers`,
+    `owner` and `last_timestamp` of the latest block, and the
+    approximate `value` of the tile's ledgers at `now` (ms, default: the
+    current time; see the module docstring).
+    '''
+    columns = ['x', 'y', 'blocks', 'ledgers', 'owner', 'last_timestamp', 'valued', 'mint_value', 'aging', 'spent']
+    conn = _connect(index)
+    rows = []
+    if conn is not None:
+        try:
+            sql = f'SELECT {", ".join(columns)} FROM tiles WHERE realm = ? AND level = ?'
+            parameters = (realm, level)
+            if window is not None:
+                sql += ' AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?'
+                parameters += tuple(window)
+            rows = conn.execute(sql, parameters).fetchall()
+        finally:
+            conn.close()
+
+    tiles = pd.DataFrame.from_records(rows, columns=columns)
+    now = int(time.time() * 1000) if now is None else now
+    # sum over valued blocks of (mint value + (now - timestamp) / AGING_MS), less transactions
+    tiles['value'] = tiles['mint_value'] + tiles['valued'] * (now / AGING_MS) - tiles['aging'] - tiles['spent']
+    return tiles.drop(columns=['valued', 'mint_value', 'aging', 'spent'])
+
+
+def tile_matrix(tiles:pd.DataFrame, metric:str, window:tuple[int, int, int, int] = None) -> pd.DataFrame:
+    '''`metric` of `read_tiles` rows as a grid: one column per x, one row per y (north up); empty tiles are NaN.'''
+    if window is None:
+        window = (tiles['x'].min(), tiles['x'].max(), tiles['y'].min(), tiles['y'].max()) if len(tiles) else (0, 0, 0, 0)
+    x0, x1, y0, y1 = (int(bound) for bound in window)
+    grid = tiles.pivot(index='y', columns='x', values=metric)
+    return grid.reindex(index=range(y1, y0 - 1, -1), columns=range(x0, x1 + 1))
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.tiles',
+        description='Update the tile pyramid with the blocks added since the last update.')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--index', default=config.TILE_INDEX, help='tile index database (default: %(default)s)')
+    parser.add_argument('--levels', type=int, default=config.TILE_LEVELS, help='zoom levels (default: %(default)s)')
+    parser.add_argument('--full', action='store_true', help='rebuild the pyramid from every block')
+    args = parser.parse_args(argv)
+
+    result = update(args.database, args.index, args.full, args.levels)
+    print(f'{args.index}: {result["added"]} blocks added, up to id {result["last_id"]}')
+    for realm in realms(args.index):
+        level = fit_level(realm, args.index, levels=args.levels)
+        print(f'  {realm}: whole map fits at level {level}, extent {extent(realm, level, args.index)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+'''
+Block and ledger valuation, as the Node server computes it, over whole tables.
+
+    python -m hybridledger.valuation [--database PATH | --arrow DIR] [--top 20] [--output DIR]
+
+Ports `Block.getHash`, `Block.getDifficulty` and `Block.getValue`
+(module/block.js), `HybridLedger.getValue` (module/ledger.js) and
+`UserAccount.netValue` (module/user.js). Results are bit-for-bit: the
+value terms are evaluated in the same float64 operation order, and sums
+run left to right like the JS loops (`np.bincount` accumulates in input
+order; pairwise or compensated sums would differ in the last bits).
+'''
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from hybridledger import config, profiling
+from hybridledger.db import connect_readonly
+from hybridledger.ledger import LEDGER_COLUMNS
+
+HASH_BATCH = 1 << 18
+'''Blocks hashed per batch, bounding the digest arrays' memory.'''
+
+AGING_MS = 1050000000
+'''Milliseconds per unit of `agingValue`.'''
+
+VALUED_TYPES = (1, 2, 3, 4, 5, 6)
+'''Block types `HybridLedger.getValue` adds the value of (EMPTY is left out).'''
+
+TRANSACTION = 3
+
+JS_WHITESPACE = ' \t\n\v\f\r\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+'''What JS trims from strings before reading numbers from them.'''
+
+UNOWNED = '0'
+'''Ownership of blocks nobody holds.'''
+
+_JS_NUMBER = r'^[+-]?(?:Infinity|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)$'
+_JS_RADIX = { r'^0[xX][0-9a-fA-F]+$' : 16, r'^0[oO][0-7]+$' : 8, r'^0[bB][01]+$' : 2 }
+_JS_FLOAT_PREFIX = r'^([+-]?(?:Infinity|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?))'
+
+
+class Valuation(NamedTuple):
+    '''What `valuate` computes in one pass.'''
+    blocks:pd.DataFrame   # the rows, with `hash`, `difficulty` and `value`
+    ledgers:pd.DataFrame  # per position: `blocks`, `owner`, `value`
+    owners:pd.DataFrame   # per ownership: `ledgers`, `ledger_value`, `transactions`, `net_value`
+
+
+def read_ledgers(conn:sqlite3.Connection) -> pd.DataFrame:
+    '''Every `HybridLedgers` row with its `id`, in chain order (position, index, then row id).'''
+    columns = ', '.join(f'"{column}"' for column in ('id', *LEDGER_COLUMNS))
+    rows = conn.execute(f'SELECT {columns} FROM "HybridLedgers" ORDER BY "position", "index", "id"').fetchall()
+    return pd.DataFrame.from_records(rows, columns=['id', *LEDGER_COLUMNS])
+
+
+def _js_string(column:pd.Series) -> list[str]:
+    # String(value): NULL is 'null'; the columns hold no floats
+    if column.dtype.kind in 'iu':
+        return list(map(str, column.tolist()))
+    if not column.isna().any():
+        return list(map(str, column.tolist()))
+    return ['null' if value is None else str(value) for value in column.astype(object).where(column.notna(), None)]
+
+
+def _js_number(column:pd.Series) -> np.ndarray:
+    # Number(value), as `ledgerValue -= blk.data` coerces it: NULL and blank are 0, junk is NaN
+    text = pd.Series(_js_string(column), dtype=object).where(column.notna().to_numpy(), '').str.strip(JS_WHITESPACE)
+    numbers = np.full(len(text), np.nan)
+    decimal = text.str.fullmatch(_JS_NUMBER).to_numpy(dtype=bool)
+    numbers[decimal] = [float(value) for value in text[decimal].str.replace('Infinity', 'inf')]
+    for pattern, base in _JS_RADIX.items():
+        radix = text.str.fullmatch(pattern).to_numpy(dtype=bool)
+        numbers[radix] = [float(int(value[2:], base)) for value in text[radix]]
+    numbers[(text == '').to_numpy(dtype=bool)] = 0.0
+    return numbers
+
+
+def _js_parse_float(column:pd.Series) -> np.ndarray:
+    # parseFloat(value): the longest numeric prefix, NaN without one (NULL parses 'null')
+    prefix = pd.Series(_js_string(column), dtype=object).str.lstrip(JS_WHITESPACE).str.extract(_JS_FLOAT_PREFIX)[0]
+    return np.array([np.nan if pd.isna(value) else float(value.replace('Infinity', 'inf')) for value in prefix],
+        dtype='float64')
+
+
+def _js_round(values:np.ndarray) -> np.ndarray:
+    # Math.round: the nearest integer, halves toward +Infinity; -0 stays -0
+    floor = np.floor(values)
+    rounded = floor + ((values - floor) >= 0.5)
+    return np.where(rounded == 0, np.copysign(0.0, values), rounded)
+
+
+def block_hashes(frame:pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    `Block.getHash()` and `Block.getDifficulty()` of every row of `frame`
+    (holding `LEDGER_COLUMNS`): `(hex digests, leading zero counts)`.
+    '''
+    fields = [_js_string(frame[column]) for column in
+        ('index', 'position', 'minted', 'ownership', 'blockType', 'timestamp', 'previousHash', 'data', 'nonce')]
+    hashes = np.empty(len(frame), dtype=object)
+    difficulty = np.empty(len(frame), dtype='int64')
+    for start in range(0, len(frame), HASH_BATCH):
+        digests = [hashlib.sha256(''.join(values).encode()).digest()
+            for values in zip(*(field[start:start + HASH_BATCH] for field in fields))]
+        hashes[start:start + len(digests)] = [digest.hex() for digest in digests]
+
+        # leading hex zeros: two per zero byte, one more when the next byte is below 0x10
+        digest_bytes = np.frombuffer(b''.join(digests), dtype=np.uint8).reshape(-1, 32)
+        nonzero = digest_bytes != 0
+        zero_bytes = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), 32)
+        first = digest_bytes[np.arange(len(digests)), np.minimum(zero_bytes, 31)]
+        difficulty[start:start + len(digests)] = 2*zero_bytes + ((zero_bytes < 32) & (first < 0x10))
+    return hashes, difficulty
+
+
+def mint_values(frame:pd.DataFrame, difficulty:np.ndarray) -> np.ndarray:
+    '''The time-independent part of `Block.getValue()` (the `nonce`, `minted` and difficulty terms).'''
+    nonce = frame['nonce'].to_numpy(dtype='float64')
+    minted = frame['minted'].to_numpy(dtype='int64')
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return ((nonce/1000000)/minted + (0.0002 * (difficulty - 1))) + (0.005 - (0.001*(minted-1)) * difficulty)
+
+
+def spent_values(frame:pd.DataFrame) -> np.ndarray:
+    '''What `HybridLedger.getValue()` subtracts for every row of `frame`: `Number(data)` of transactions, else 0.'''
+    spent = np.zeros(len(frame))
+    transaction = frame['blockType'].to_numpy() == TRANSACTION
+    spent[transaction] = _js_number(frame['data'][transaction])
+    return spent
+
+
+def block_values(frame:pd.DataFrame, difficulty:np.ndarray, now:int = None) -> np.ndarray:
+    '''`Block.getValue()` of every row of `frame` at `now` (ms, default: the current time).'''
+    now = int(time.time() * 1000) if now is None else now
+    timestamp = frame['timestamp'].to_numpy(dtype='int64')
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # new Date(timestamp) is an Invalid Date beyond 8.64e15 ms
+        aging = np.where(np.abs(timestamp) <= 8.64e15, (now - timestamp) / AGING_MS, np.nan)
+        value = _js_round((mint_values(frame, difficulty) + aging) * 1000000) / 1000000
+        # value can never be less than zero (NaN stays NaN)
+        value[value < 0] = 0
+    return value
+
+
+def _ledger_values(blocks:pd.DataFrame, ledger:np.ndarray, count:int) -> np.ndarray:
+    # per block: += value (valued types), then -= Number(data) (transactions)
+    block_type = blocks['blockType'].to_numpy()
+    transaction = block_type == TRANSACTION
+    terms = np.zeros((len(blocks), 2))
+    terms[:, 0] = np.where(np.isin(block_type, VALUED_TYPES), blocks['value'].to_numpy(), 0.0)
+    terms[transaction, 1] = -spent_values(blocks)[transaction]
+    return np.bincount(np.repeat(ledger, 2), weights=terms.ravel(), minlength=count)
+
+
+def _net_values(blocks:pd.DataFrame, ledgers:pd.DataFrame, ledger:np.ndarray) -> pd.DataFrame:
+    ownership = blocks['ownership'].to_numpy(dtype=object)
+    owner, owners = pd.factorize(ownership, sort=True)
+    ledger_owner = np.searchsorted(owners, ledgers['owner'].to_numpy(dtype=object))
+    ids = blocks['id'].to_numpy()
+
+    # netValue walks the owner's ledgers in the order their first blocks were written
+    first_id = pd.Series(ids).groupby([owner, ledger]).min()
+    owned = first_id[ledger_owner[first_id.index.get_level_values(1)] == first_id.index.get_level_values(0)]
+    ledger_order = pd.Series(owned.to_numpy(), index=owned.index.get_level_values(1))
+
+    # -value of each block held by someone else, in chain order, then +the ledger's value
+    foreign = (ownership != UNOWNED) & (ownership != owners[ledger_owner[ledger]])
+    foreign_ledgers = ledger[foreign]
+    terms = pd.DataFrame({
+        'owner': np.concatenate([ledger_owner[foreign_ledgers], ledger_owner[ledger_order.index]]),
+        'first_id': np.concatenate([ledger_order.reindex(foreign_ledgers).to_numpy(), ledger_order.to_numpy()]),
+        'last': np.concatenate([np.zeros(foreign.sum(), dtype=bool), np.ones(len(ledger_order), dtype=bool)]),
+        'term': np.concatenate([-blocks['value'].to_numpy()[foreign], ledgers['value'].to_numpy()[ledger_order.index]]),
+    }).sort_values(['owner', 'first_id', 'last'], kind='stable')
+    ledger_value = np.bincount(terms['owner'], weights=terms['term'], minlength=len(owners))
+
+    # parseFloat(data) of every transaction the owner wrote, in row order
+    transaction = np.flatnonzero(blocks['blockType'].to_numpy() == TRANSACTION)
+    transaction = transaction[np.argsort(ids[transaction], kind='stable')]
+    spent = np.bincount(owner[transaction], weights=_js_parse_float(blocks['data'].iloc[transaction]),
+        minlength=len(owners))
+
+    table = pd.DataFrame({
+        'owner': owners,
+        'ledgers': np.bincount(ledger_owner, minlength=len(owners)),
+        'ledger_value': ledger_value,
+        'transactions': spent,
+        'net_value': ledger_value - spent,
+    })
+    return table[table['owner'] != UNOWNED].sort_values('net_value', ascending=False, kind='stable').reset_index(drop=True)
+
+
+@profiling.timed()
+def valuate(frame:pd.DataFrame, now:int = None) -> Valuation:
+    '''
+    Value every block, ledger and owner of `frame` (`read_ledgers` rows;
+    any order) at `now` (ms, default: the current time). Net values
+    leave out unowned (`'0'`) blocks' ownership.
+    '''
+    ledger, positions = pd.factorize(frame['position'].to_numpy(dtype=object), sort=True)
+    order = np.lexsort((frame['id'].to_numpy(), frame['index'].to_numpy(), ledger))
+    # read_ledgers rows are in chain order already; reordering string columns is not free
+    if (order != np.arange(len(order))).any():
+        frame = frame.take(order)
+        ledger = ledger[order]
+    blocks = frame.reset_index(drop=True)
+    hashes, difficulty = block_hashes(blocks)
+    blocks['hash'] = pd.Series(hashes, dtype=object)
+    blocks['difficulty'] = difficulty
+    blocks['value'] = block_values(blocks, difficulty, now)
+
+    counts = np.bincount(ledger, minlength=len(positions))
+    ledgers = pd.DataFrame({
+        'position': positions,
+        'blocks': counts,
+        # callHybridLedger: the last block (by index) owns the ledger
+        'owner': blocks['ownership'].to_numpy(dtype=object)[np.cumsum(counts) - 1],
+        'value': _ledger_values(blocks, ledger, len(positions)),
+    })
+    return Valuation(blocks, ledgers, _net_values(blocks, ledgers, ledger))
+
+
+def user_names(conn:sqlite3.Connection) -> dict[str, str]:
+    '''`{userUUID: publicName or userName}` from the server's `Users` table.'''
+    try:
+        rows = conn.execute('SELECT "userUUID", COALESCE("publicName", "userName") FROM "Users"').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return dict(rows)
+
+
+def main(argv:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m hybridledger.valuation',
+        description='Value every block, ledger and owner like the Node server does.')
+    parser.add_argument('--database', default=config.DATABASE, help='SQLite database (default: %(default)s)')
+    parser.add_argument('--arrow', metavar='DIR', default=config.ARROW_DATASET or None,
+        help='read a columnar export (hybridledger.columnar) instead of the database')
+    parser.add_argument('--now', type=int, help='value as of this time, in ms since the epoch (default: now)')
+    parser.add_argument('--top', type=int, default=20, help='leaderboard entries to print (default: %(default)s)')
+    parser.add_argument('--output', metavar='DIR', help='also write the leaderboard, ledgers and per-block audit')
+    parser.add_argument('--format', choices=('csv', 'parquet', 'json'), default='csv')
+    args = parser.parse_args(argv)
+
+    names = {}
+    frame = None
+    if args.arrow:
+        from hybridledger.columnar import ArrowSource
+        frame = ArrowSource(args.arrow).dataset().to_table().to_pandas()
+    if os.path.exists(args.database):
+        conn = connect_readonly(args.database)
+        try:
+            names = user_names(conn)
+            if frame is None:
+                frame = read_ledgers(conn)
+        finally:
+            conn.close()
+    if frame is None:
+        parser.error(f'no database at {args.database}')
+
+    valuation = valuate(frame, args.now)
+    leaderboard = valuation.owners.assign(name=valuation.owners['owner'].map(names))
+    for rank, row in enumerate(leaderboard.head(args.top).itertuples(), 1):
+        print(f'{rank:>4}. {row.net_value:>16.6f}  {row.ledgers:>6} ledgers  {row.name if isinstance(row.name, str) else row.owner}')
+
+    if args.output:
+        from hybridledger.reports import write_reports
+        tables = { 'leaderboard' : leaderboard, 'ledgers' : valuation.ledgers,
+            'blocks' : valuation.blocks[['id', 'position', 'index', 'ownership', 'blockType', 'hash', 'difficulty', 'value']] }
+        for path in write_reports(tables, args.output, args.format):
+            print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+'''
+Process pools for CPU-bound work (drawing charts, hashing chains).
+
+Workers start with forkserver (or spawn), never fork, since forking a
+threaded server such as Streamlit's is unsafe. A new worker re-runs
+the parent's `__main__`, which under Streamlit is the dashboard script,
+so `start_pool` starts every worker at once with a blank `__main__` in
+its place. That swap is process-wide: one lock serializes it for every
+module starting a pool.
+'''
+
+import multiprocessing
+import multiprocessing.pool
+import sys
+import threading
+import types
+
+_main_lock = threading.Lock()
+
+
+def start_pool(processes:int, preload:list[str] = ()) -> multiprocessing.pool.Pool:
+    '''
+    A pool of `processes` workers, all started before it returns. With
+    forkserver, the server imports `preload` first (it starts once, so
+    only the first pool's modules are preloaded).
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    with _main_lock:
+        if preload and context.get_start_method() == 'forkserver':
+            context.set_forkserver_preload(list(preload))
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            return context.Pool(processes=processes)
+        finally:
+            sys.modules['__main__'] = main
@@ -1,149 +1,378 @@
 import streamlit as st
 import hashlib
-import pandas as pd
 import sqlite3
-import matplotlib
-import matplotlib.pyplot
-import seaborn as sns
-from datetime import datetime
-
-# Database
-dbFile = '/home/inpw/Desktop/hybridledger/module/database.sqlite'
-
-conn = sqlite3.connect(dbFile)
-
-class ServerHL:
-
-    def __init__(
-            self,
-            index       :int, # 0+
-            position    :str, # a4,b3
-            ownership   :str, # uuid (owner)
-            blockType   :int, # 1 GEN 2 MINT 3 TX 4 ACQ 5 LCK 6 OBF
-            data        :str, # {text}
-            previousHash:str, # SHA256
-            minted      :int, # num. minted
-            nonce       :int, # num. iter
-            timestamp   :int, # unix timestamp
-            uuid        :str  # uuid (object)
-        ):
-        
-        self.index          = index
-        self.position       = position
-        self.ownership      = ownership
-        self.blockType      = blockType
-        self.data           = data
-        self.previousHash   = previousHash
-        self.minted         = minted
-        self.nonce          = nonce
-        self.timestamp      = timestamp
-        self.uuid           = uuid
-
-        pass
-
-class ServerHLChain:
-
-    def __init__(
-            self, 
-            pos_value:str,                  # position hex, monetary value
-            pos_payment_stacks:list[str],   # position hex, payment status
-            label:str = 'Unknown',
-            frequency:str = 'Monthly'
-        ):
-        self.label = label
-        #'''label of bill'''
-        self.pos_value = pos_value
-        #'''monetary value chain position hex'''
-
-        self.frequency = frequency
-
-        self.pos_payment_stacks = pos_payment_stacks
-        #'''payment status chain position hex'''
-        self.persons_paying = len(pos_payment_stacks)
-
-        self.payments_chain = []
-        #'''payment status chain'''
-        self.dues_chains = { position : [] for position in pos_payment_stacks }
-        #'''value chain'''
-        pass
-
-    def read_database(self):
-        '''Read the Database file with pandas.'''
-        # payment chain (payment status)
-        p_df = pd.read_sql_query(f"SELECT * FROM 'HybridLedgers' WHERE position = '{self.pos_value}'", conn)
-        self.payments_chain = []
-        for i in range(len(p_df)):
-            self.payments_chain.append(ServerHL(
-                index       = p_df.iloc[i]['index'],
-                position    = p_df.iloc[i]['position'],
-                ownership   = p_df.iloc[i]['ownership'],
-                blockType   = p_df.iloc[i]['blockType'],
-                data        = p_df.iloc[i]['data'],
-                previousHash= p_df.iloc[i]['previousHash'],
-                minted      = p_df.iloc[i]['minted'],
-                nonce       = p_df.iloc[i]['nonce'],
-                timestamp   = p_df.iloc[i]['timestamp'],
-                uuid        = p_df.iloc[i]['uuid']
-            ))
-        # Ensure chain is in order of index.
-        self.payments_chain.sort(key=lambda x: x.index)
-
-        # Do the same for each position:list in the dues chain
-        for position in self.pos_payment_stacks:
-            # value chain (payment status)
-            v_df = pd.read_sql_query(f"SELECT * FROM 'HybridLedgers' WHERE position = '{position}'", conn)
-            self.dues_chains[position] = []
-            for i in range(len(v_df)):
-                self.dues_chains[position].append(ServerHL(
-                    index       = v_df.iloc[i]['index'],
-                    position    = v_df.iloc[i]['position'],
-                    ownership   = v_df.iloc[i]['ownership'],
-                    blockType   = v_df.iloc[i]['blockType'],
-                    data        = v_df.iloc[i]['data'],
-                    previousHash= v_df.iloc[i]['previousHash'],
-                    minted      = v_df.iloc[i]['minted'],
-                    nonce       = v_df.iloc[i]['nonce'],
-                    timestamp   = v_df.iloc[i]['timestamp'],
-                    uuid        = v_df.iloc[i]['uuid']
-                ))
-            # Ensure chain is in order of index.
-            self.dues_chains[position].sort(key=lambda x: x.index)
-        return
+import pandas as pd
+
+from hybridledger import audit, charts, config, interactive, profiling, summary, tiles
+from hybridledger import reports
+from hybridledger.analytics import GRANULARITIES
+from hybridledger.cache import LedgerCache
+from hybridledger.charts import ChartCache
+from hybridledger.db import ConnectionPool
+from hybridledger.live import LedgerWatcher
+from hybridledger.registry import (BILL_BY_POSITION, BILL_LABELS, BILLS_BY_LABEL, BILLS_BY_PAYEE, PAYEES, find_bills, payee_name,
+    shared_bills)
+from hybridledger.snapshot import LedgerSnapshot
+
+# Database (set HL_DATABASE to read another file)
+dbFile = config.DATABASE
+
+@st.cache_resource
+def get_connection_pool():
+    '''Read-only connections shared by every session (see `python -m hybridledger.maintenance --wal`).'''
+    return ConnectionPool(dbFile)
+
+@st.cache_resource
+def get_ledger_cache():
+    '''One ledger cache per process, shared by every session.'''
+    if config.ARROW_DATASET:
+        # pyarrow is only needed when reading a columnar export
+        from hybridledger.columnar import ArrowSource
+        return ArrowSource(config.ARROW_DATASET)
+    return LedgerCache(get_connection_pool())
+
+@st.cache_resource
+def get_chart_cache():
+    '''Rendered charts shared by every session, keyed by their input data.'''
+    return ChartCache()
+
+@st.cache_data(ttl=60)
+def get_chain_audit():
+    '''The last chain audit (python -m hybridledger.audit) and the bills it found broken.'''
+    return audit.last_run(config.AUDIT_STATE), audit.broken_bills(audit.broken_chains(config.AUDIT_STATE))
+
+@st.cache_data(ttl=60)
+def update_tiles():
+    '''Add new blocks to the tile pyramid, at most once a minute; None if the index cannot be written.'''
+    try:
+        return tiles.update(dbFile, config.TILE_INDEX)
+    except (sqlite3.OperationalError, OSError):
+        return None
+
+@st.cache_resource
+def get_ledger_watcher():
+    '''One live tail per process, feeding the shared ledger cache.'''
+    return LedgerWatcher(ledger_cache).start()
+
+@st.cache_data(max_entries=1, ttl=60)
+def update_summaries(data_version:int) -> bool:
+    '''
+    Fold new blocks into the summary store once per database version (and
+    at most once a minute without one); False if the store cannot be written.
+    '''
+    try:
+        summary.update(dbFile, config.SUMMARY_STORE)
+    except (sqlite3.OperationalError, OSError):
+        return False
+    return True
+
+def bill_summaries() -> tuple[pd.DataFrame, LedgerSnapshot | None]:
+    '''
+    Every bill's summary, from the summary store after folding in new
+    blocks, and None; or, without a store, from a snapshot of every bill,
+    and that snapshot (see `summary_issues`, `summary_payments`).
+    '''
+    # an Arrow export has no data_version; its dashboard updates the store by the minute
+    update_summaries(ledger_cache.data_version() if isinstance(ledger_cache, LedgerCache) else None)
+    bills = summary.read_bills(config.SUMMARY_STORE)
+    if bills is None:
+        # the store could not be written (see HL_STATE_DIR): summarize loaded chains
+        snapshot = LedgerSnapshot(shared_bills(), ledger_cache)
+        return summary.summarize(snapshot), snapshot
+    return bills, None
+
+def summary_issues(fallback:LedgerSnapshot | None, labels:tuple[str, ...] = BILL_LABELS, last:int = None) -> pd.DataFrame:
+    '''Issues of the bills with `labels` (each bill's `last` latest), read from the summary store (or `fallback`).'''
+    if fallback is not None:
+        return fallback.issues
+    return summary.read_issues(config.SUMMARY_STORE, tuple(map(BILLS_BY_LABEL.get, labels)), last=last)
+
+def summary_payments(fallback:LedgerSnapshot | None, periods:int, granularity:str, now:pd.Timestamp) -> pd.DataFrame:
+    '''The paid payments a payment grid window shows, read from the summary store (or `fallback`).'''
+    if fallback is not None:
+        return fallback.payments
+    return summary.read_payments(config.SUMMARY_STORE, since=reports.payment_window(periods, granularity, now),
+        cycles=periods if granularity == 'cycle' else None)
+
+ledger_cache = get_ledger_cache()
+# records left over from fragment reruns belong to no panel
+profiling.collect()
+chart_cache = get_chart_cache()
 
 st.write('''# 💵️ Bill Review''')
 
-SharedBills = [
-    ServerHLChain(pos_value='-a8,-c2', pos_payment_stacks=['-a8,-c4','-a8,-c5'], label='Hydro One Electricity'),
-    ServerHLChain(pos_value='-a7,-c2', pos_payment_stacks=['-a7,-c4','-a7,-c5'], label='Water/Waste Utilities', frequency='Bi-monthly'),
-    ServerHLChain(pos_value='-a6,-c2', pos_payment_stacks=['-a6,-c4','-a6,-c5'], label='Bell Internet'),
-    ServerHLChain(pos_value='-a5,-c2', pos_payment_stacks=['-a5,-c4','-a5,-c5'], label='Enbridge Gas'),
-    ServerHLChain(pos_value='-a4,-c2', pos_payment_stacks=['-a4,-c4','-a4,-c5'], label='Rental'),
-    ServerHLChain(pos_value='-a8,-c7', pos_payment_stacks=['-a8,-c8'], label='Weed', frequency='Biweekly'),
-    ServerHLChain(pos_value='-a7,-c7', pos_payment_stacks=['-a7,-c8'], label='RV Lot Rental'),
-    ServerHLChain(pos_value='-a6,-c7', pos_payment_stacks=['-a6,-c8'], label='TD RV Loan', frequency='Weekly'),
-    ServerHLChain(pos_value='-a5,-c7', pos_payment_stacks=['-a5,-c8'], label='Scotiabank Truck Loan', frequency='Biweekly'),
-    ServerHLChain(pos_value='-a4,-c7', pos_payment_stacks=['-a4,-c8'], label='BMO Credit Card'),
-    ServerHLChain(pos_value='-a3,-c7', pos_payment_stacks=['-a3,-c8'], label='BMO Line of Credit', frequency='Biweekly'),
-    ServerHLChain(pos_value='-a2,-c7', pos_payment_stacks=['-a2,-c8'], label='Koodo Phones')
-
-]
-
-Payees = {
-    'Ryan & Ara' : ['-a8,-c5', '-a7,-c5', '-a6,-c5', '-a5,-c5', '-a4,-c5', '-a8,-c8', '-a7,-c8', '-a6,-c8', '-a5,-c8', '-a4,-c8', '-a3,-c8', '-a2,-c8', '-a1,-c8'],
-    'Ellie & Heather' : ['-a8,-c4', '-a7,-c4', '-a6,-c4', '-a5,-c4', '-a4,-c4']
-}
-
-def get_payee_name_by_position(position):
-    for payee, positions in Payees.items():
-        if position in positions:
-            return payee
-    return 'Unknown'
+def bill_page(key:str) -> tuple[str, ...]:
+    '''Every bill label; past BILL_PAGE_SIZE bills, one page of those matching a search.'''
+    if len(BILL_LABELS) <= config.BILL_PAGE_SIZE:
+        return BILL_LABELS
+    search_col, page_col = st.columns([3, 1])
+    found = find_bills(search_col.text_input('Find a bill', key=f'{key}_search'))
+    pages = max(1, -(-len(found) // config.BILL_PAGE_SIZE))
+    if st.session_state.get(f'{key}_page', 1) > pages:
+        # a new search has fewer pages
+        st.session_state[f'{key}_page'] = 1
+    page = page_col.number_input(f'Page (of {pages})', min_value=1, max_value=pages, key=f'{key}_page')
+    return found[(page - 1) * config.BILL_PAGE_SIZE:page * config.BILL_PAGE_SIZE]
+
+def bill_table(table:pd.DataFrame):
+    '''A static table; past BILL_PAGE_SIZE rows, a scrolling one that only sends the rows in view.'''
+    if len(table) <= config.BILL_PAGE_SIZE:
+        st.table(table)
+    else:
+        st.dataframe(table)
+
+#################################
+#   ALL BILLS (lazy sections)   #
+#################################
+# Each section is a fragment: it only runs while its expander is open,
+# and its own widgets rerun just that section, not the whole page.
+
+@st.fragment
+@profiling.timed('section:Overview')
+def overview_section(bills:pd.DataFrame, fallback:LedgerSnapshot | None):
+    bill_ov = reports.summary_overview(bills)
+
+    bttn_col1, bttn_col2 = st.columns(2)
+
+    with bttn_col1:
+        frequency_select = st.selectbox('Table Filter by Frequency', [None] + list(reports.FREQUENCIES.keys()))
+        num_responsible_select = st.selectbox('Table Filter by # Responsible', [None, 1, 2])
+
+    bill_filtered_ov = reports.filter_overview(bill_ov, frequency_select, num_responsible_select)
+    totals = reports.overview_totals(bill_filtered_ov)
+
+    # Show appx. month pay / responsible sum, but based on the filtered df
+    st.write(f'Appx. Mon. Pay / Responsible (Sum) = `${totals["per_responsible"]:.2f}`')
+
+    with bttn_col2:
+        st.metric(label='Cost of Bills', value=totals['cost'], delta=f'{totals["saved"]:.2f}')
+
+
+    # don't display frequency in the table
+    bill_filtered_ov_table = bill_filtered_ov.drop(columns=['Frequency'])
+
+    bill_table(bill_filtered_ov_table)
+
+
+
+    st.markdown('---')
+
+    # All bill issues, from the summary store, to graph:
+    # Y = The cost $
+    # X = The date
+    # Color each line differently based on the bill label and display a legend
+    # (past BILL_PAGE_SIZE bills, only the bills of one page)
+    page = bill_page('overview')
+    issues = summary_issues(fallback, page)
+    if len(page) < len(BILL_LABELS):
+        issues = issues[issues['bill'].isin(page)]
+    bill_history_df = pd.DataFrame({
+        'Date': issues['issued'].dt.strftime('%Y-%m-%d'),
+        'Value': issues['amount'],
+        'Bill': issues['bill']
+    })
+    # Correct order of dates
+    bill_history_df = bill_history_df.sort_values(by='Date')
+
+    # Plot the bill history
+    st.image(chart_cache.render(charts.bill_history, bill_history_df))
+
+@st.fragment
+@profiling.timed('section:Billing by Frequency')
+def billing_by_frequency_section(bills:pd.DataFrame, fallback:LedgerSnapshot | None):
+    select_num_responsible = st.selectbox('Filter by # Responsible', [None, 1, 2])
+
+    # charts are drawn together (in parallel) after the loop, into these slots
+    chart_slots = []
+    chart_jobs = []
+
+    for frequency in reports.FREQUENCIES.keys():
+
+        st.markdown('---')
+
+        if not select_num_responsible:
+            for label in bills['bill'][(bills['frequency'] == frequency) & (bills['value_blocks'] == 0)]:
+                st.warning(f"Couldn't load {label}")
+
+        bill_month_ov = reports.summary_frequency_table(bills, frequency, select_num_responsible)
+        bill_last_sum = reports.frequency_total(bill_month_ov)
+        st.write(f'### 💸️ {frequency} | `${bill_last_sum}` | `${bill_last_sum/reports.FREQUENCIES[frequency]}`/month (total)')
+        bill_table(bill_month_ov)
+
+        # drop index; charts show the BILL_PAGE_SIZE highest bills
+        bill_month_ov = bill_month_ov.head(config.BILL_PAGE_SIZE).reset_index(drop=True)
+
+        chart_slots += [st.container(), st.container()]
+        chart_jobs += [
+            charts.job(charts.frequency_bars, frequency, bill_month_ov),
+            charts.job(charts.responsibility_bars, frequency, bill_month_ov)
+        ]
+
+    history_col1, history_col2 = st.columns(2)
+    with history_col1:
+        history_granularity = st.selectbox('Payment History by', list(GRANULARITIES.keys()))
+    with history_col2:
+        history_periods = st.number_input('Payment History periods', min_value=1, max_value=52, value=6)
+
+    # payee x bill x period, computed once for every payee below, from the payments in its window
+    granularity = GRANULARITIES[history_granularity]
+    now = pd.Timestamp.now()
+    payments = summary_payments(fallback, history_periods, granularity, now)
+    issues = summary_issues(fallback, last=history_periods) if granularity == 'cycle' else None
+    payment_history_matrix = reports.summary_payment_matrices(payments, issues, history_periods, granularity, now)
+
+    for payee in PAYEES.keys():
+
+        st.write(f'## {payee}')
+
+        payment_history_df = payment_history_matrix.loc[payee].rename_axis(None)
+        if len(payment_history_df) > config.BILL_PAGE_SIZE:
+            # only the bills this payee pays, and a chart of the first page of them
+            payment_history_df = payment_history_df.loc[list(BILLS_BY_PAYEE.get(payee, ()))]
+
+        #############################
+        #   Graph Payment History   #
+        #############################
+        chart_slots.append(st.container())
+        chart_jobs.append(charts.job(charts.payment_history, payment_history_df.head(config.BILL_PAGE_SIZE), xlabel=history_granularity))
+
+        ####################################################
+        #    Create a table to show the payment history    #
+        ####################################################
+        bill_table(payment_history_df)
+
+    for slot, image in zip(chart_slots, chart_cache.render_many(chart_jobs)):
+        slot.image(image)
+
+@st.fragment
+@profiling.timed('section:Interactive History')
+def interactive_history(bill_name:str, history_table:pd.DataFrame, key:str):
+    # the overview holds at most CHART_POINTS issues; brushing it reruns only
+    # this fragment, to send the brushed range in detail
+    points = interactive.history_points(history_table)
+    overview = interactive.price_overview(bill_name, interactive.downsample(points), len(points))
+    event = st.altair_chart(overview, on_select='rerun', selection_mode=interactive.BRUSH, key=key, width='stretch')
+    detail_range = interactive.selected_range(event.selection)
+    if detail_range:
+        st.altair_chart(interactive.price_detail(bill_name, interactive.downsample(points, domain=detail_range)), width='stretch')
+    else:
+        st.caption('Drag across the chart to see a range in detail.')
+
+@st.fragment
+@profiling.timed('section:Price History')
+def price_history_section():
+    chart_slots = []
+    chart_jobs = []
+
+    # Read the bills of this page once, at one read point; other pages are never loaded.
+    page = bill_page('price_history')
+    snapshot = LedgerSnapshot(shared_bills(list(page)), ledger_cache)
+    watch('price_history', [position for bill in snapshot for position in bill.positions])
+
+    for bill in snapshot:
+        #####################
+        #   graph deltas    #
+        #####################
+        bill_name = bill.label
+        history_table = reports.price_history(bill)
+        bill_history = history_table['Issued'].tolist()
+        bill_values = history_table['Cost'].tolist()
+        bill_deltas = history_table['Delta'].tolist()
+
+        # Create a table to show the bill history
+        st.write(f'## {bill_name} History')
+
+        if history_table.empty:
+            st.write('No bill issued yet.')
+            continue
+
+        st.table(history_table)
+
+        if interactive_charts:
+            interactive_history(bill_name, history_table, key=f'history_chart_{bill_name}')
+            continue
+
+        # Create a chart to show the bill deltas
+        chart_slots.append(st.container())
+        chart_jobs.append(charts.job(charts.price_delta, bill_name, bill_history, bill_deltas, bill_values))
+
+        #########################
+        #   Graph Deltas (2)    #
+        #########################
+        chart_slots.append(st.container())
+        chart_jobs.append(charts.job(charts.delta_heatmap, bill_name, bill_history, bill_deltas))
+
+    for slot, image in zip(chart_slots, chart_cache.render_many(chart_jobs)):
+        slot.image(image)
+
+# tile value is an estimate (see hybridledger.tiles); owner is that of the tile's latest block
+MAP_METRICS = { 'Blocks' : 'blocks', 'Ledgers' : 'ledgers', 'Value (approx.)' : 'value', 'Last minter' : 'owner' }
+
+@st.fragment
+@profiling.timed('section:Map')
+def map_section():
+    if update_tiles() is None:
+        st.warning(f'Could not update the tile index ({config.TILE_INDEX}); showing it as last built.')
+    realm_names = tiles.realms(config.TILE_INDEX)
+    if not realm_names:
+        st.write('No positions indexed yet.')
+        return
+
+    realm_col, level_col, metric_col = st.columns(3)
+    realm = realm_col.selectbox('Realm', realm_names, key='map_realm')
+    fit = tiles.fit_level(realm, config.TILE_INDEX)
+    level = level_col.number_input('Zoom level', min_value=0, max_value=config.TILE_LEVELS - 1, value=fit, key='map_level',
+        help=f'Each tile covers 2^level cells a side; level {tiles.GATE_LEVEL} tiles are gate areas.')
+    metric = metric_col.selectbox('Metric', list(MAP_METRICS), key='map_metric')
+
+    # below the level the whole realm fits at, read only a window around a cell
+    window = None
+    if level < fit:
+        center_col, x_col, y_col = st.columns(3)
+        x0, x1, y0, y1 = tiles.extent(realm, level, config.TILE_INDEX)
+        center_col.write(f'Showing {tiles.MAP_MAX_SIDE} x {tiles.MAP_MAX_SIDE} tiles around:')
+        x = x_col.number_input('x (tile)', value=(x0 + x1) // 2, key='map_x')
+        y = y_col.number_input('y (tile)', value=(y0 + y1) // 2, key='map_y')
+        half = tiles.MAP_MAX_SIDE // 2
+        window = (x - half, x + half - 1, y - half, y + half - 1)
+
+    grid = tiles.read_tiles(realm, level, window, index=config.TILE_INDEX)
+    if not len(grid):
+        st.write('No blocks in this window.')
+        return
+    matrix = tiles.tile_matrix(grid, MAP_METRICS[metric], window)
+    st.image(chart_cache.render(charts.tile_map, matrix, f'{realm} at level {level}', metric))
+
+def watch(view:str, positions:list[str]):
+    '''Show new blocks of `positions` live, for `view` (a fragment replaces its own when it reruns).'''
+    st.session_state['live_positions'][view] = tuple(positions)
+
+@st.fragment(run_every=config.LIVE_POLL_MS / 1000)
+def live_updates(watcher:LedgerWatcher):
+    # runs every poll interval, in memory; redraws the page only when a position shown grew
+    positions = [position for shown in st.session_state['live_positions'].values() for position in shown]
+    if watcher.changed(positions, st.session_state['live_version']):
+        st.rerun()
 
 # Create a dropdown to select a bill or an option to view all of them at once
+last_audit, broken_bills = get_chain_audit()
+
 bill_selection = st.selectbox(
     "Select a bill:",
-    ['All Bills'] + [bill.label for bill in SharedBills],
+    ['All Bills', *bill_page('bill_selection')],
+    format_func=lambda label: f'{label} ⚠️' if label in broken_bills else label,
 )
+interactive_charts = st.toggle('Interactive charts', value=config.INTERACTIVE_CHARTS, key='interactive_charts',
+    help=f'Draw price histories in the browser, downsampled to {config.CHART_POINTS} issues, instead of as images.')
+# an Arrow export is only as fresh as its last run; live mode tails SQLite
+live = st.toggle('Live', value=config.LIVE_TAIL, key='live', disabled=not isinstance(ledger_cache, LedgerCache),
+    help='Show new blocks as soon as they are minted, without a refresh.') and isinstance(ledger_cache, LedgerCache)
+if live:
+    watcher = get_ledger_watcher()
+    # read before any block is, so a block appended while drawing triggers another run
+    st.session_state['live_version'] = watcher.version
+# {view: positions it shows}; filled while drawing this run
+st.session_state['live_positions'] = {}
 
 ######################
 #   INDIVIDUAL BILL  #
@@ -152,490 +381,123 @@ bill_selection = st.selectbox(
 if (bill_selection != 'All Bills'):
     with st.spinner('Loading Bill...'):
 
-        for bill in SharedBills:
-            if bill.label == bill_selection:
-                
-                bill.read_database()
-                st.write(f'## {bill.label} ({bill.frequency})')
-
-                responsible = ', '.join([get_payee_name_by_position(position) for position in bill.dues_chains.keys()])
-
-                st.write(f'Responsibility: {responsible}')
-
-                payment_floats = bill.payments_chain
-                last_pay_float = payment_floats[-1]
-
-                bill_name = bill.label
-                bill_values = [hl.data for hl in bill.payments_chain if 'Genesis' not in hl.data]
-                bill_history = [datetime.fromtimestamp(hl.timestamp/1000).strftime('%Y-%m-%d') for hl in bill.payments_chain if 'Genesis' not in hl.data]
-
-                # Calculate a list of deltas; +/- from the last value
-                bill_deltas = [0]
-                for i in range(1, len(bill_values)):
-                    bill_deltas.append(float(bill_values[i]) - float(bill_values[i-1]))
-
-                # Create a table to show the bill history
-                with st.expander(f'{bill_name} History', icon='⏳️'):
-
-                    st.table(pd.DataFrame({
-                        'Issued': bill_history,
-                        'Cost': bill_values,
-                        'Delta': bill_deltas
-                    }))
-
-                    # Create a chart to show the bill deltas
-                    matplotlib.pyplot.figure(figsize=(10, 5))
-                    matplotlib.pyplot.xlabel('Date')
-                    matplotlib.pyplot.ylabel('Delta ($)')
-                    matplotlib.pyplot.title(f'{bill_name} Price Delta')
-                    matplotlib.pyplot.xticks(rotation=45)
-                    matplotlib.pyplot.plot(bill_history, bill_deltas)
-                    # display horizontal line from zero
-                    matplotlib.pyplot.axhline(y=0, color='gray', linestyle='--')
-                    # text overlay the value of the bill in that date
-                    for i in range(len(bill_history)):
-                        matplotlib.pyplot.text(bill_history[i], bill_deltas[i], bill_values[i], ha='center', va='bottom')
-                    st.pyplot(matplotlib.pyplot.gcf())
-
-                    
-                    matplotlib.pyplot.figure(figsize=(10,5))
-                    matplotlib.pyplot.xlabel('Date')
-                    matplotlib.pyplot.ylabel('Cost ($)')
-                    matplotlib.pyplot.title(f'{bill_name} Cost Over Time')
-                    # generate the cost of the bill by the date and make sure the labels on the left are the value
-                    # the cost on the third item is lower than the second ...
-
-                    cost_data = pd.DataFrame({
-                        'Date': bill_history,
-                        'Values': [float(f) for f in bill_values],
-                        'Delta': bill_deltas
-                    })
-
-                    sns.lineplot(x='Date', y='Values', data=cost_data, color='gray')
-                    matplotlib.pyplot.xticks(rotation=45)
-                    # Show the delta below each point along with a white label background
-                    for i in range(len(cost_data)):
-                        matplotlib.pyplot.text(cost_data['Date'][i], cost_data['Values'][i], f"${cost_data['Values'][i]} | d=\${cost_data['Delta'][i]:.2f} ", ha='center', va='bottom')
-                    
-                    # Show line for each y
-                    for i in range(len(cost_data)):
-                        matplotlib.pyplot.axhline(y=cost_data['Values'][i], color='gray', linestyle='--')
-                    # Show the date on the x-axis
-                    matplotlib.pyplot.xticks(rotation=45)
-                    st.pyplot(matplotlib.pyplot.gcf())
-
-                    # Create a heatmap to show the bill deltas
-                    heatmap_data = pd.DataFrame({
-                        'Date': bill_history,
-                        'Delta': bill_deltas
-                    })
-
-                    # Setting Date as the index for a clean heatmap display
-                    heatmap_data['Date'] = pd.to_datetime(heatmap_data['Date'])
-                    heatmap_data = heatmap_data.set_index('Date')
-
-                    # Reshape the data if there are multiple bills over time (otherwise skip pivot)
-                    heatmap_data = heatmap_data.T  # Transpose to have dates as columns
-
-                    # Plot the heatmap
-                    matplotlib.pyplot.figure(figsize=(10, 2))  # Adjust height for better readability
-                    sns.heatmap(heatmap_data, annot=True, fmt=".1f", cmap="seismic", center=0, cbar_kws={'label': 'Delta ($)'})
-                    matplotlib.pyplot.title(f'{bill_name} Delta Changes Over Time')
-                    matplotlib.pyplot.xlabel('Date')
-                    matplotlib.pyplot.ylabel('Delta ($)')
-
-                    # format the date labels to YYYY-MM-DD
-                    matplotlib.pyplot.xticks(rotation=45)
-
-                    matplotlib.pyplot.xticks(ticks=range(len(bill_history)),labels=[str(i) for i in bill_history])
-                    # move tick to center of cell
-                    matplotlib.pyplot.tick_params(axis='x', which='major', pad=10)
-
-                    # Display heatmap in Streamlit
-                    st.pyplot(matplotlib.pyplot.gcf())
-
-                    matplotlib.pyplot.close()
-
-
-
-
-                # Individuals Graphs
-
-                for position, payment_chain in bill.dues_chains.items():
-                    payee_name = get_payee_name_by_position(position)
-                    dates = [datetime.fromtimestamp(HL.timestamp/1000) for HL in payment_chain if 'ok' in HL.data.lower()]
-
-                    with st.expander(f'{payee_name}', expanded=True, icon='🪪️'):
-                        #st.markdown('---')
-
-                        # Create a list of the last 6 months
-                        months = [datetime.now().replace(month=i).strftime('%b') for i in range(datetime.now().month, datetime.now().month - 6, -1)]
-
-                        month_has_payment = {month : False for month in months}
-
-                        # For each datetime object, check if there was a payment for a month in the past 6 months
-                        for date in dates:
-                            if date.month in [i for i in range(datetime.now().month, datetime.now().month - 6, -1)]:
-                                month_has_payment[date.strftime('%b')] = True
-
-                        # Create a list of 1s and 0s for each month
-                        payment_history = [1 if month_has_payment[month] else 0 for month in months]
-
-                        # Plot the payment history
-                        #matplotlib.pyplot.bar(months, payment_history)
-                        #st.pyplot(matplotlib.pyplot.gcf())
-
-                        payment_info_chain = [HL for HL in payment_chain if HL.timestamp/1000 > datetime.now().replace(month=datetime.now().month - 7).timestamp()]
-                        # attempt to get the HL from payment_floats that came before each HL in payment_chain_info
-                        #payment_float_chain = [HL for HL in payment_floats if HL.timestamp/1000 < payment_info_chain[0].timestamp/1000]
-
-                        payment_float_chain = []
-                        for iHL in payment_info_chain:
-                            # Attempt to get the HL right before the iHL timestamp.
-                            corresponding_vHL = None
-                            for vHL in payment_floats:
-                                if vHL.timestamp < iHL.timestamp:
-                                    corresponding_vHL = vHL
-
-                            payment_float_chain.append(corresponding_vHL)
-
-
-                        # if there is nothing before in the payment_chain_info, make sure they are of the same length
-                        if len(payment_info_chain) > len(payment_float_chain):
-                            payment_float_chain = payment_float_chain + [payment_float_chain[-1]] * (len(payment_info_chain) - len(payment_float_chain))
+        # a new chain per run; loading fills it
+        bill = BILLS_BY_LABEL[bill_selection].chain()
 
-                        payment_chain_info_df = pd.DataFrame({
-                            'OK': [(True if 'ok' in HL.data.lower() else False) for HL in payment_info_chain],
-                            'Data': [(HL.data if 'Genesis' not in HL.data else 'Genesis') for HL in payment_info_chain],
-                            'Timestamp': [datetime.fromtimestamp(HL.timestamp/1000).strftime('%Y-%m-%d') for HL in payment_info_chain],
-                            'Bill Value': [(str(float(HL.data)/len(bill.dues_chains))+f' ({HL.data})' if 'Genesis' not in HL.data else 'Genesis') for HL in payment_float_chain],
-                            'Date Issued': [datetime.fromtimestamp(HL.timestamp/1000).strftime('%Y-%m-%d') for HL in payment_float_chain]
-                            # Get from payment_floats the HL that has the timestamp that is right before the payment_chain_info timestamp
-                            #'Previous Payment': [datetime.fromtimestamp(payment_floats[i].timestamp/1000).strftime('%Y-%m-%d') for i in range(len(payment_chain_info))],
-                        })
-                        #{'column':[row_data,row_data,...]}
-                        last_bill_issue_date = datetime.fromtimestamp(last_pay_float.timestamp/1000).strftime('%Y-%m-%d')
-                        last_ok_for_bill = datetime.fromtimestamp(payment_info_chain[-1].timestamp/1000).strftime('%Y-%m-%d')
+        ledger_cache.load_chains([bill])
+        watch('bill', bill.positions)
+        st.write(f'## {bill.label} ({bill.frequency})')
 
-                        # get datetime object
-                        dt_last_bill_ok = datetime.strptime(last_ok_for_bill, '%Y-%m-%d')
-                        dt_last_bill_issue = datetime.strptime(last_bill_issue_date, '%Y-%m-%d')
+        # hash chain integrity, as of the last audit
+        for position, index in broken_bills.get(bill.label, {}).items():
+            st.badge(f'Broken chain at {position}, block {index}', icon='⚠️', color='red')
+        if last_audit and bill.label not in broken_bills:
+            st.badge(f'Chains verified {last_audit["finished_at"][:10]}', icon='✔️', color='green')
 
-                        st.write(f'{("👍️ Payment Received" if (dt_last_bill_ok > dt_last_bill_issue) else "Payment Due")}')
-                        st.write(f'### Last Bill Issued: `{last_bill_issue_date}` | Last Payment: `{last_ok_for_bill}`')
+        responsible = ', '.join([payee_name(position) for position in bill.dues_chains.keys()])
 
-                        st.write(f'#### {payee_name} Payment History')
-                        st.table(payment_chain_info_df)
-                    
+        st.write(f'Responsibility: {responsible}')
 
-#################
-#   ALL BILLS   #
-#################   
-         
-else:
+        bill_name = bill.label
+        bill_issues = reports.bill_issues(bill)
+        history_table = reports.price_history(bill)
+        bill_history = history_table['Issued'].tolist()
+        bill_values = history_table['Cost'].tolist()
+        bill_deltas = history_table['Delta'].tolist()
 
-    with st.expander('Overview', icon='💹'):
-
-        frequencies = {
-            'Bi-monthly': 2,
-            'Monthly': 1,
-            'Biweekly': 0.5,
-            'Weekly': 0.25
-        }
-
-        bill_frames = []
-        bill_names = []
-        bill_last_values = []
-        bill_num_responsible = []
-        bill_freq = []
-        for bill in SharedBills:
-            bill.read_database()
-            #if 'rental' not in bill.label.lower():
-            # Add the bill label, value, and date to a dataframe,
-            # then create a graph:
-            # Y = The cost $
-            # X = The date
-            # Color each line differently based on the bill label and display a legend
-            # Make sure the dates are in order
-            bill.read_database()
-            bill_frames.append(pd.DataFrame({
-                'Date': [datetime.fromtimestamp(hl.timestamp/1000).strftime('%Y-%m-%d') for hl in bill.payments_chain if 'Genesis' not in hl.data],
-                'Value': [float(hl.data) for hl in bill.payments_chain if 'Genesis' not in hl.data],
-                'Bill': [bill.label] * len([hl for hl in bill.payments_chain if 'Genesis' not in hl.data])
-            }))
-            bill_freq.append(frequencies[bill.frequency])
-            bill_num_responsible.append(len(bill.dues_chains))
-            bill_names.append(f'{bill.label} {bill.frequency}')
-            bill_last_values.append([float(hl.data) for hl in bill.payments_chain if 'Genesis' not in hl.data][-1])
-
-        bill_ov = pd.DataFrame({
-            'Bill': bill_names,
-            'Last Value': bill_last_values,
-            '# Responsible': bill_num_responsible,
-            'Appx. Mon. Pay / Responsible': [(i / bill_num_responsible[idx])/bill_freq[idx] for idx,i in list(enumerate(bill_last_values))],
-            'Frequency': bill_freq
-        })
-
-        bttn_col1, bttn_col2 = st.columns(2)
-
-        with bttn_col1:
-            frequency_select = st.selectbox('Table Filter by Frequency', [None] + [f for f in frequencies.keys()])
-            num_responsible_select = st.selectbox('Table Filter by # Responsible', [None, 1, 2])
-
-        bill_filtered_ov = bill_ov.copy()
-
-        if frequency_select:
-            bill_filtered_ov = bill_filtered_ov[bill_filtered_ov['Frequency'] == frequencies[frequency_select]]
-        
-        if num_responsible_select:
-            bill_filtered_ov = bill_filtered_ov[bill_filtered_ov['# Responsible'] == num_responsible_select]
-        
-        #bill_filtered_ov[bill_filtered_ov['Frequency'] == frequency_select]
-
-        #st.write(f'Appx. Mon. Pay / Responsible (Sum) = `${sum([(i / bill_num_responsible[idx])/bill_freq[idx] for idx,i in list(enumerate(bill_last_values))]):.2f}`')
-
-        # Show appx. month pay / responsible sum, but based on the filtered df
-        st.write(f'Appx. Mon. Pay / Responsible (Sum) = `${sum(bill_filtered_ov["Appx. Mon. Pay / Responsible"]*bill_filtered_ov['Frequency']):.2f}`')
-
-        with bttn_col2:
-            money_saved = f'{float(sum(bill_filtered_ov['Last Value'])-sum(bill_filtered_ov["Appx. Mon. Pay / Responsible"]*bill_filtered_ov['Frequency'])):.2f}'
-            st.metric(label='Cost of Bills', value=sum(bill_filtered_ov['Last Value']), delta=money_saved)
-
-
-        # don't display frequency in the table
-        bill_filtered_ov_table = bill_filtered_ov.drop(columns=['Frequency'])
-        
-        st.table(bill_filtered_ov_table)
-
-        
+        # Create a table to show the bill history
+        with st.expander(f'{bill_name} History', icon='⏳️'):
 
-        st.markdown('---')
-        
-        # Concatenate the dataframes
-        bill_history_df = pd.concat(bill_frames)
-        # Correct order of dates
-        bill_history_df = bill_history_df.sort_values(by='Date')
-
-        # Draw a vertical line over each point, then display the date above the line
-
-        # Plot the bill history
-        matplotlib.pyplot.figure(figsize=(10, 8))
-        matplotlib.pyplot.xlabel('Date')
-        matplotlib.pyplot.ylabel('Cost ($)')
-        matplotlib.pyplot.title('Bill History')
-        matplotlib.pyplot.xticks(rotation=45)
-        sns.lineplot(x='Date', y='Value', hue='Bill', data=bill_history_df)
-        # put the legend beside the graph instead of on it
-        matplotlib.pyplot.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
-        # Show the date on the x-axis
-        matplotlib.pyplot.xticks(rotation=45)
-        st.pyplot(matplotlib.pyplot.gcf())
-
-        matplotlib.pyplot.close()
-
-    with st.expander('Billing by Frequency', icon='💸️'):
-        select_num_responsible = st.selectbox('Filter by # Responsible', [None, 1, 2])
-
-        for frequency in frequencies.keys():
-
-            st.markdown('---')
-            
-            bill_labels = []
-            bill_last_values = []
-            bill_appx_month = []
-            bill_num_responsible = []
-
-            if (select_num_responsible):
-                for bill in [SHL for SHL in SharedBills if SHL.frequency == frequency and len(SHL.dues_chains) == select_num_responsible]:
-                    if len(bill.payments_chain) >0:
-                        bill_labels.append(bill.label)
-                        last_hl = bill.payments_chain[-1]
-                        bill_last_values.append(last_hl.data)
-                        bill_appx_month.append(float(last_hl.data)/frequencies[frequency])
-                        bill_num_responsible.append(len(bill.dues_chains))
+            if history_table.empty:
+                st.write('No bill issued yet.')
             else:
-                for bill in [SHL for SHL in SharedBills if SHL.frequency == frequency]:
-                    if len(bill.payments_chain) >0:
-                        bill_labels.append(bill.label)
-                        last_hl = bill.payments_chain[-1]
-                        bill_last_values.append(last_hl.data)
-                        bill_appx_month.append(float(last_hl.data)/frequencies[frequency])
-                        bill_num_responsible.append(len(bill.dues_chains))
-                    else:
-                        st.warning(f"Couldn't load {bill.label}")
-            
-            bill_last_sum = sum([float(f) for f in bill_last_values])
-            st.write(f'### 💸️ {frequency} | `${bill_last_sum}` | `${bill_last_sum/frequencies[frequency]}`/month (total)')
-            bill_month_ov = pd.DataFrame({
-                'Bill': bill_labels,
-                'Last Value': bill_last_values,
-                'Appx. Monthly Cost': bill_appx_month,
-                '# Responsible': bill_num_responsible
-            })
-
-            # sort the dataframe by last value (as float)
-            bill_month_ov['Last Value'] = bill_month_ov['Last Value'].astype(float)
-            bill_month_ov['Appx. Monthly Cost'] = bill_month_ov['Appx. Monthly Cost'].astype(float)
-
-            bill_month_ov = bill_month_ov.sort_values(by='Last Value', ascending=False)
-            st.table(bill_month_ov)
+                st.table(history_table)
+
+                if interactive_charts:
+                    interactive_history(bill_name, history_table, key='history_chart')
+                else:
+                    for image in chart_cache.render_many([
+                        # Create a chart to show the bill deltas
+                        charts.job(charts.price_delta, bill_name, bill_history, bill_deltas, bill_values),
+                        # generate the cost of the bill by the date and make sure the labels on the left are the value
+                        charts.job(charts.cost_over_time, bill_name, bill_history, bill_issues['amount'].tolist(), bill_deltas),
+                        # Create a heatmap to show the bill deltas
+                        charts.job(charts.delta_heatmap, bill_name, bill_history, bill_deltas, date_ticks=True)
+                    ]):
+                        st.image(image)
+
+
+
+
+        # Individuals Graphs
+
+        for position in bill.dues.keys():
+            payee = payee_name(position)
+
+            with st.expander(f'{payee}', expanded=True, icon='🪪️'):
+                # Payments from the past 7 months, each with the bill issue it answers
+                payment_chain_info_df = reports.payment_history(bill, position)
+                status = reports.payment_status(bill, position)
+
+                st.write(f'{("👍️ Payment Received" if status["received"] else "Payment Due")}')
+                st.write(f'### Last Bill Issued: `{status["last_issued"]}` | Last Payment: `{status["last_payment"]}`')
+
+                st.write(f'#### {payee} Payment History')
+                st.table(payment_chain_info_df)
             
-            # drop index
 
-            bill_month_ov = bill_month_ov.reset_index(drop=True)
+#################
+#   ALL BILLS   #
+#################   
+         
+else:
 
-            # that didn't display the labels in the right order, fix
+    overview = st.expander('Overview', icon='💹', key='overview_open', on_change='rerun')
+    billing_by_frequency = st.expander('Billing by Frequency', icon='💸️', key='billing_by_frequency_open', on_change='rerun')
+    price_history = st.expander('Price History', icon='⌛', key='price_history_open', on_change='rerun')
+    ledger_map = st.expander('Map', icon='🗺️', key='map_open', on_change='rerun')
 
-            matplotlib.pyplot.figure(figsize=(10, 5))
-            matplotlib.pyplot.xlabel('Bill')
-            matplotlib.pyplot.ylabel('Last Value ($)')
-            matplotlib.pyplot.title(f'{frequency} Bills')
-            matplotlib.pyplot.xticks(rotation=45)
-            for i, bill in enumerate(bill_month_ov['Bill']):
-                # display a red bar in the background showing the monthly value
-                matplotlib.pyplot.bar(i, bill_month_ov['Appx. Monthly Cost'][i], color='#2f2f2f')
-                matplotlib.pyplot.bar(i, bill_month_ov['Last Value'][i], color='lightblue')
-                matplotlib.pyplot.text(i, bill_month_ov['Last Value'][i]/2, f"${bill_month_ov['Last Value'][i]:.2f}", ha='center', va='center')
-                if frequency not in ['Monthly', 'Bi-monthly']:
-                    matplotlib.pyplot.text(i, bill_month_ov['Appx. Monthly Cost'][i], f"${bill_month_ov['Appx. Monthly Cost'][i]:.2f}/month", ha='center', va='bottom')
+    if overview.open or billing_by_frequency.open:
+        # a few numbers per bill, its issues and payments, kept up to date in the summary store
+        bill_summary, summary_fallback = bill_summaries()
+        # summaries of every bill
+        watch('summaries', BILL_BY_POSITION.keys())
 
-            matplotlib.pyplot.xticks(ticks=range(len(bill_month_ov['Bill'])),labels=bill_month_ov['Bill'])
+    with overview:
+        if overview.open:
+            overview_section(bill_summary, summary_fallback)
 
-            st.pyplot(matplotlib.pyplot.gcf())
+    with billing_by_frequency:
+        if billing_by_frequency.open:
+            billing_by_frequency_section(bill_summary, summary_fallback)
 
-            matplotlib.pyplot.close()
+    with price_history:
+        if price_history.open:
+            price_history_section()
 
-            matplotlib.pyplot.figure(figsize=(10, 5))
-            matplotlib.pyplot.xlabel('Bill')
-            matplotlib.pyplot.ylabel('Appx. Value Per Responsible ($)')
-            matplotlib.pyplot.title(f'{frequency} Bills by Responsibility')
-            matplotlib.pyplot.xticks(rotation=45)
-            for i, bill in enumerate(bill_month_ov['Bill']):
-                matplotlib.pyplot.bar(i, bill_month_ov['Last Value'][i] / bill_month_ov['# Responsible'][i], color='lightblue')
-                #matplotlib.pyplot.bar(i, bill_month_ov['Appx. Monthly Cost'][i], color='#2f2f2f')
-                #matplotlib.pyplot.bar(i, bill_month_ov['Last Value'][i] / bill_num_responsible[i], color='lightblue')
-                matplotlib.pyplot.text(i, (bill_month_ov['Last Value'][i] / bill_month_ov['# Responsible'][i]) / 2, f"${(bill_month_ov['Last Value'][i] / bill_month_ov['# Responsible'][i]):.2f} * {bill_month_ov['# Responsible'][i]}", ha='center', va='center')
-                #if frequency not in ['Monthly', 'Bi-monthly']:
-                #    matplotlib.pyplot.text(i, bill_month_ov['Appx. Monthly Cost'][i], f"${bill_month_ov['Appx. Monthly Cost'][i]:.2f}/month", ha='center', va='bottom')
+    with ledger_map:
+        if ledger_map.open:
+            map_section()
 
-            matplotlib.pyplot.xticks(ticks=range(len(bill_month_ov['Bill'])),labels=bill_month_ov['Bill'])
 
-            st.pyplot(matplotlib.pyplot.gcf())
+if live and st.session_state['live_positions']:
+    live_updates(watcher)
 
-            matplotlib.pyplot.close()
+#################
+#   PROFILING   #
+#################
 
-        for payee in Payees.keys():
-            
-            st.write(f'## {payee}')
-
-            #############################
-            #   Graph Payment History   #
-            #############################
-            matplotlib.pyplot.figure(figsize=(10, 5))
-            matplotlib.pyplot.xlabel('Month')
-            matplotlib.pyplot.ylabel('Bill')
-            matplotlib.pyplot.title('Payment History')
-            matplotlib.pyplot.xticks(rotation=45)
-
-            # Create a list of the last 6 months
-            months = [datetime.now().replace(month=i).strftime('%b') for i in range(datetime.now().month, datetime.now().month - 6, -1)]
-
-            # Create a list of bills
-            bills = [bill.label for bill in SharedBills]
-
-            # Create a 2D array to store the payment history
-            payment_history = [[0 for _ in range(len(months))] for _ in range(len(bills))]
-
-            # For each bill, check if there was a payment for a month in the past 6 months
-            for i, bill in enumerate(SharedBills):
-                bill.read_database()
-                for position, payment_chain in bill.dues_chains.items():
-                    if payee == get_payee_name_by_position(position):
-                        dates = [datetime.fromtimestamp(HL.timestamp/1000) for HL in payment_chain if 'ok' in HL.data.lower()]
-                        for date in dates:
-                            if date.month in [i for i in range(datetime.now().month, datetime.now().month - 6, -1)]:
-                                payment_history[i][months.index(date.strftime('%b'))] = 1
-
-            # Plot the payment history
-            matplotlib.pyplot.imshow(payment_history, cmap='Greys', aspect='auto')
-            matplotlib.pyplot.yticks(range(len(bills)), bills)
-            matplotlib.pyplot.xticks(range(len(months)), months)
-            st.pyplot(matplotlib.pyplot.gcf())
-
-            matplotlib.pyplot.close()
-
-            ####################################################
-            #    Create a table to show the payment history    #
-            ####################################################
-            payment_history_df = pd.DataFrame(payment_history, columns=months, index=bills)
-            st.table(payment_history_df)
-
-    with st.expander('Price History', icon='⌛'):
-
-        for bill in SharedBills:
-            #####################
-            #   graph deltas    #
-            #####################
-            bill_name = bill.label
-            bill_values = [hl.data for hl in bill.payments_chain if 'Genesis' not in hl.data]
-            bill_history = [datetime.fromtimestamp(hl.timestamp/1000).strftime('%Y-%m-%d') for hl in bill.payments_chain if 'Genesis' not in hl.data]
-
-            # Calculate a list of deltas; +/- from the last value
-            bill_deltas = [0]
-            for i in range(1, len(bill_values)):
-                bill_deltas.append(float(bill_values[i]) - float(bill_values[i-1]))
-
-            # Create a table to show the bill history
-            st.write(f'## {bill_name} History')
-
-            st.table(pd.DataFrame({
-                'Issued': bill_history,
-                'Cost': bill_values,
-                'Delta': bill_deltas
-            }))
-
-            # Create a chart to show the bill deltas
-            matplotlib.pyplot.figure(figsize=(10, 5))
-            matplotlib.pyplot.xlabel('Date')
-            matplotlib.pyplot.ylabel('Delta ($)')
-            matplotlib.pyplot.title(f'{bill_name} Price Delta')
-            matplotlib.pyplot.xticks(rotation=45)
-            matplotlib.pyplot.plot(bill_history, bill_deltas)
-            # display horizontal line from zero
-            matplotlib.pyplot.axhline(y=0, color='gray', linestyle='--')
-            # text overlay the value of the bill in that date
-            for i in range(len(bill_history)):
-                matplotlib.pyplot.text(bill_history[i], bill_deltas[i], bill_values[i], ha='center', va='bottom')
-            st.pyplot(matplotlib.pyplot.gcf())
-
-            matplotlib.pyplot.close()
-
-            #########################
-            #   Graph Deltas (2)    #
-            #########################
-            heatmap_data = pd.DataFrame({
-                'Date': bill_history,
-                'Delta': bill_deltas
-            })
-
-            # Setting Date as the index for a clean heatmap display
-            heatmap_data['Date'] = pd.to_datetime(heatmap_data['Date'])
-            heatmap_data = heatmap_data.set_index('Date')
-
-            # Reshape the data if there are multiple bills over time (otherwise skip pivot)
-            heatmap_data = heatmap_data.T  # Transpose to have dates as columns
-
-            # Plot the heatmap
-            matplotlib.pyplot.figure(figsize=(10, 2))  # Adjust height for better readability
-            sns.heatmap(heatmap_data, annot=True, fmt=".1f", cmap="seismic", center=0, cbar_kws={'label': 'Delta ($)'})
-            matplotlib.pyplot.title(f'{bill_name} Delta Changes Over Time')
-            matplotlib.pyplot.xlabel('Date')
-            matplotlib.pyplot.ylabel('Delta ($)')
-
-            # Display heatmap in Streamlit
-            st.pyplot(matplotlib.pyplot.gcf())
-
-            matplotlib.pyplot.close()
-
-
-conn.close()
\ No newline at end of file
+if profiling.ENABLED:
+    # HL_PROFILE=1: this run's stages, innermost first (also in HL_PROFILE_LOG)
+    profile = pd.DataFrame(profiling.collect())
+    with st.sidebar:
+        st.write('## ⏱️ Profiling')
+        if len(profile):
+            top = profile[profile['depth'] == 0]
+            st.metric('Recorded (top-level stages)', f'{top["wall_ms"].sum():.0f} ms')
+            st.write(f'SQL: `{int(top["queries"].fillna(0).sum())}` queries, `{int(top["rows"].fillna(0).sum())}` rows')
+            if 'process_peak_kib' in profile.columns:
+                # tracemalloc is process-wide: every session's allocations count
+                st.metric('Traced memory peak (whole process)', f'{profile["process_peak_kib"].max():.0f} KiB')
+            st.dataframe(profile[[column for column in ('stage', 'wall_ms', 'queries', 'rows')
+                if column in profile.columns]], hide_index=True)
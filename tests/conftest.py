@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from hybridledger.synthetic import generate
+
+NOW = 1_700_000_000_000
+'''Epoch ms the synthetic ledgers end at, so every run sees the same blocks.'''
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    '''A small synthetic ledger in WAL mode (readers and the test's writes overlap): `(path, bills, payees)`.'''
+    path = str(tmp_path / 'ledger.sqlite')
+    bills, payees = generate(path, bills=4, payees=2, years=0.25, now=NOW)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    return path, bills, payees
+
+
+@pytest.fixture
+def database(ledger):
+    return ledger[0]
+
+
+def mint(path:str, position:str, data:str = 'ok', block_type:int = 2) -> int:
+    '''Append one block to `position` the way the Node server does; returns its index.'''
+    conn = sqlite3.connect(path)
+    try:
+        index, timestamp = conn.execute('SELECT MAX(`index`), MAX(`timestamp`) FROM `HybridLedgers` '
+            'WHERE `position` = ?', (position,)).fetchone()
+        conn.execute('INSERT INTO `HybridLedgers` (`index`, `position`, `ownership`, `blockType`, `data`, '
+            "`previousHash`, `minted`, `nonce`, `timestamp`, `uuid`, `createdAt`, `updatedAt`) "
+            "VALUES (?, ?, 'owner', ?, ?, '0', 1, 0, ?, ?, '', '')",
+            (index + 1, position, block_type, data, timestamp + 1, f'uuid-{position}-{index + 1}'))
+        conn.commit()
+    finally:
+        conn.close()
+    return index + 1
+
+
+def last_index(path:str, position:str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT MAX(`index`) FROM `HybridLedgers` WHERE `position` = ?', (position,)).fetchone()[0]
+    finally:
+        conn.close()
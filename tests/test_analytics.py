@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybridledger.analytics import ISSUE_PREFIX, match_issues, payment_matrix
+
+
+def frame(bills:list[str], timestamps:list[int], **columns) -> pd.DataFrame:
+    return pd.DataFrame({ 'bill' : bills, 'timestamp' : timestamps, **columns })
+
+
+def test_match_issues_pairs_the_last_earlier_issue():
+    issues = frame(['Gas', 'Water', 'Gas'], [100, 150, 200], amount=[1.0, 2.0, 3.0])
+    # out of order, on a non-default index; 200 is not strictly after the issue at 200
+    payments = frame(['Gas', 'Gas', 'Water', 'Gas'], [250, 50, 160, 200]).set_axis([7, 3, 9, 1])
+
+    matched = match_issues(payments, issues)
+    assert matched.index.tolist() == [7, 3, 9, 1]
+    assert matched['timestamp'].tolist() == [250, 50, 160, 200]
+    assert matched[ISSUE_PREFIX + 'amount'].tolist()[0] == 3.0
+    assert np.isnan(matched[ISSUE_PREFIX + 'amount'].tolist()[1])
+    assert matched[ISSUE_PREFIX + 'amount'].tolist()[2:] == [2.0, 2.0]
+
+    by_bill = match_issues(payments, issues, by='bill')
+    assert by_bill[ISSUE_PREFIX + 'amount'].tolist()[2:] == [2.0, 1.0]
+
+
+def test_match_issues_agrees_with_a_scan():
+    rng = np.random.default_rng(7)
+    bills = ['Gas', 'Water', 'Hydro']
+    issues = frame(list(rng.choice(bills, 40)), list(rng.integers(0, 1000, 40)), amount=np.arange(40.0))
+    payments = frame(list(rng.choice(bills, 200)), list(rng.integers(0, 1000, 200)))
+
+    matched = match_issues(payments, issues, by='bill')
+    for (_, payment), amount in zip(payments.iterrows(), matched[ISSUE_PREFIX + 'amount']):
+        earlier = issues[(issues['bill'] == payment['bill']) & (issues['timestamp'] < payment['timestamp'])]
+        if earlier.empty:
+            assert np.isnan(amount)
+        else:
+            # the last of equal timestamps, as the chain minted them
+            assert amount == earlier.sort_values('timestamp', kind='stable')['amount'].iloc[-1]
+
+
+def payments_frame(rows:list[tuple[str, str, str, bool]]) -> pd.DataFrame:
+    # (bill, position, issued date, paid)
+    issued = pd.to_datetime([row[2] for row in rows])
+    return pd.DataFrame({
+        'bill': [row[0] for row in rows],
+        'position': [row[1] for row in rows],
+        'issued': issued,
+        'timestamp': issued.astype('int64') // 10**6,
+        'paid': np.array([row[3] for row in rows], dtype=bool),
+    })
+
+
+def test_payment_matrix_by_month_across_a_year():
+    payments = payments_frame([
+        ('Gas', 'a', '2024-01-20', True),
+        ('Gas', 'a', '2024-01-25', True),    # one hit per period
+        ('Gas', 'b', '2023-12-03', True),
+        ('Water', 'b', '2023-11-30', False), # unpaid
+        ('Water', 'x', '2023-11-02', True),  # no payee
+        ('Water', 'a', '2023-06-01', True),  # outside the window
+    ])
+    matrix = payment_matrix(payments, { 'a' : 'Ann', 'b' : 'Bo' }, ['Ann', 'Bo'], ['Gas', 'Water'],
+        periods=3, granularity='M', now=pd.Timestamp('2024-01-31'))
+
+    assert matrix.columns.tolist() == ['Jan', 'Dec', 'Nov']
+    assert matrix.index.tolist() == [('Ann', 'Gas'), ('Ann', 'Water'), ('Bo', 'Gas'), ('Bo', 'Water')]
+    assert matrix.to_numpy().tolist() == [[1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 0, 0]]
+    # the unknown payee's payment counts for no listed payee
+    assert matrix.to_numpy().sum() == 2
+
+
+def test_payment_matrix_by_billing_cycle():
+    issues = payments_frame([
+        ('Gas', '', '2024-01-01', False),
+        ('Gas', '', '2024-02-01', False),
+        ('Gas', '', '2024-03-01', False),
+        ('Water', '', '2024-02-15', False),
+    ])
+    payments = payments_frame([
+        ('Gas', 'a', '2024-03-05', True),    # answers Gas's latest issue
+        ('Gas', 'a', '2024-01-10', True),    # two issues back
+        ('Water', 'a', '2024-03-20', True),  # Water's only issue is its latest
+        ('Water', 'a', '2024-02-01', True),  # before any Water issue
+    ])
+    matrix = payment_matrix(payments, { 'a' : 'Ann' }, ['Ann'], ['Gas', 'Water'],
+        periods=3, granularity='cycle', issues=issues, now=pd.Timestamp('2024-03-31'))
+
+    assert matrix.columns.tolist() == ['Current', '-1', '-2']
+    assert matrix.loc[('Ann', 'Gas')].tolist() == [1, 0, 1]
+    assert matrix.loc[('Ann', 'Water')].tolist() == [1, 0, 0]
+
+    with pytest.raises(ValueError):
+        payment_matrix(payments, {}, ['Ann'], ['Gas'], granularity='cycle')
+
+
+def test_payment_matrix_without_payments():
+    matrix = payment_matrix(payments_frame([]), {}, ['Ann'], ['Gas'], periods=2, granularity='W',
+        now=pd.Timestamp('2024-03-31'))
+    assert matrix.to_numpy().tolist() == [[0, 0]]
+    assert matrix.columns.tolist() == ['2024-03-25', '2024-03-18']
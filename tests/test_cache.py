@@ -0,0 +1,94 @@
+from hybridledger import cache as cache_module
+from hybridledger.cache import LedgerCache
+from hybridledger.ledger import read_blocks
+
+from conftest import last_index, mint
+
+
+def race_first_read(monkeypatch, path:str, cache:LedgerCache, position:str):
+    # mint and tail after the cache's first read has taken its snapshot, before it stores the blocks
+    raced = []
+
+    def racing_read(conn, positions, since=None):
+        blocks = read_blocks(conn, positions, since)
+        if not raced:
+            raced.append(mint(path, position))
+            cache.tail()
+        return blocks
+
+    monkeypatch.setattr(cache_module, 'read_blocks', racing_read)
+    return raced
+
+
+def test_tail_during_read_of_missing_position(monkeypatch, database):
+    cache = LedgerCache(database)
+    position = '0,1'
+    cache.tail()
+    raced = race_first_read(monkeypatch, database, cache, position)
+
+    blocks = cache.get_blocks([position])[position]
+
+    assert raced and blocks[-1].index == raced[0] == last_index(database, position)
+    # later reads and polls keep the block and the index sequence
+    mint(database, position)
+    cache.tail()
+    blocks = cache.get_blocks([position])[position]
+    assert [block.index for block in blocks] == list(range(last_index(database, position) + 1))
+    cache.close()
+
+
+def test_tail_during_top_up_of_stale_position(monkeypatch, database):
+    cache = LedgerCache(database)
+    position = '1,0'
+    cache.get_blocks([position])
+    # a commit the cache notices on its next read (no tail has run), marking the position stale
+    mint(database, position)
+    cache.tail()
+    raced = race_first_read(monkeypatch, database, cache, position)
+
+    blocks = cache.get_blocks([position])[position]
+
+    assert raced and blocks[-1].index == raced[0] == last_index(database, position)
+    assert [block.index for block in blocks] == list(range(raced[0] + 1))
+    cache.close()
+
+
+def test_version_change_during_read(monkeypatch, database):
+    # another session's read notices the commit first and marks the cache stale
+    cache = LedgerCache(database)
+    position = '0,1'
+    cache.get_blocks(['1,0'])
+    raced = []
+
+    def racing_read(conn, positions, since=None):
+        blocks = read_blocks(conn, positions, since)
+        if not raced:
+            raced.append(mint(database, position))
+            monkeypatch.setattr(cache_module, 'read_blocks', read_blocks)
+            cache.get_blocks(['1,0'])
+        return blocks
+
+    monkeypatch.setattr(cache_module, 'read_blocks', racing_read)
+    blocks = cache.get_blocks([position])[position]
+
+    assert blocks[-1].index == raced[0]
+    assert cache.get_blocks([position])[position][-1].index == raced[0]
+    cache.close()
+
+
+def test_cached_and_read_positions_share_a_version(monkeypatch, database):
+    cache = LedgerCache(database)
+    cache.get_blocks(['0,0'])
+    raced = []
+
+    def racing_read(conn, positions, since=None):
+        if not raced:
+            # committed after the cached position was checked, before this read
+            raced.append(mint(database, '0,0'))
+        return read_blocks(conn, positions, since)
+
+    monkeypatch.setattr(cache_module, 'read_blocks', racing_read)
+    blocks = cache.get_blocks(['0,0', '1,0'])
+
+    assert blocks['0,0'][-1].index == raced[0]
+    cache.close()
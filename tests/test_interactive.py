@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybridledger.interactive import BRUSH, downsample, lttb, selected_range
+
+
+def reference_lttb(x:list[float], y:list[float], threshold:int) -> list[int]:
+    # Steinarsson's LTTB, point by point
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for bucket in range(threshold - 2):
+        following = range(math.floor((bucket + 1) * every) + 1, min(math.floor((bucket + 2) * every) + 1, n))
+        cx = sum(x[i] for i in following) / len(following)
+        cy = sum(y[i] for i in following) / len(following)
+        best, best_area = None, -1
+        for i in range(math.floor(bucket * every) + 1, math.floor((bucket + 1) * every) + 1):
+            area = abs((x[a] - cx) * (y[i] - y[a]) - (x[a] - x[i]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        a = best
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 3), (100, 7), (1000, 50), (997, 500)])
+def test_lttb_matches_the_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.integers(1, 10, n)).astype('float64')
+    y = rng.normal(100, 20, n)
+    assert lttb(x, y, threshold).tolist() == reference_lttb(x.tolist(), y.tolist(), threshold)
+
+
+def test_lttb_keeps_short_series_and_spikes():
+    x = np.arange(20, dtype='float64')
+    y = np.zeros(20)
+    assert lttb(x, y, 20).tolist() == list(range(20))
+    assert lttb(x, y, 2).tolist() == list(range(20))
+
+    y[13] = 50
+    kept = lttb(x, y, 5)
+    assert kept[0] == 0 and kept[-1] == 19 and 13 in kept
+    assert (np.diff(kept) > 0).all()
+
+
+def test_downsample_within_a_domain():
+    points = pd.DataFrame({
+        'Date': pd.date_range('2024-01-01', periods=60, freq='W'),
+        'Cost': np.linspace(50, 110, 60),
+        'Delta': np.arange(60, dtype='float64'),
+    })
+    domain = (points['Date'][10], points['Date'][39])
+    detail = downsample(points, threshold=10, domain=domain)
+
+    assert len(detail) == 10
+    assert detail['Date'].iloc[0] == domain[0] and detail['Date'].iloc[-1] == domain[1]
+    # each point keeps its own issue's delta
+    assert (detail['Delta'].to_numpy() == points.set_index('Date').loc[detail['Date'], 'Delta'].to_numpy()).all()
+
+
+def test_selected_range():
+    assert selected_range(None) is None
+    assert selected_range({}) is None
+    assert selected_range({ BRUSH : {} }) is None
+
+    start, end = pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-15')
+    epoch = { BRUSH : { 'Date' : [start.value // 10**6, end.value // 10**6] } }
+    assert selected_range(epoch) == (start, end)
+    iso = { BRUSH : { 'Date' : ['2024-02-01', '2024-03-15T00:00:00'] } }
+    assert selected_range(iso) == (start, end)
@@ -0,0 +1,38 @@
+import pytest
+
+from hybridledger.cache import LedgerCache
+from hybridledger.live import LedgerWatcher
+
+from conftest import last_index, mint
+
+
+@pytest.fixture
+def watcher(database):
+    # polled by hand
+    watcher = LedgerWatcher(LedgerCache(database), interval_ms=3_600_000).start()
+    yield watcher
+    watcher.stop()
+    watcher.cache.close()
+
+
+def test_append_to_an_uncached_position(database, watcher):
+    # what sections reading the summary store watch
+    since = watcher.version
+    mint(database, '0,1')
+
+    assert '0,1' in watcher.poll()
+    assert watcher.changed(['0,1'], since)
+    assert not watcher.changed(['1,0'], since)
+
+
+def test_append_to_a_position_another_read_marked_stale(database, watcher):
+    cache = watcher.cache
+    cache.get_blocks(['0,0', '1,0'])
+    since = watcher.version
+    index = mint(database, '0,0')
+    # another session notices the commit first: every cached position is stale
+    cache.get_blocks(['1,0'])
+
+    assert watcher.poll() == {'0,0'}
+    assert watcher.changed(['0,0'], since)
+    assert cache.get_blocks(['0,0'])['0,0'][-1].index == index == last_index(database, '0,0')
@@ -0,0 +1,15 @@
+import sqlite3
+
+from hybridledger import maintenance
+
+
+def test_optimize_indexes_the_dashboard_queries(database):
+    conn = sqlite3.connect(database)
+    try:
+        assert set(maintenance.optimize(conn)) == set(maintenance.INDEXES)
+        assert maintenance.missing_indexes(conn) == {}
+        plans = maintenance.query_plans(conn)
+        for label in ('dashboard chain load', 'dashboard top-up', 'block by uuid'):
+            assert any('USING INDEX' in step for step in plans[label]), plans[label]
+    finally:
+        conn.close()
@@ -0,0 +1,38 @@
+import pytest
+
+from hybridledger.registry import BillSpec, load_registry, write_registry
+
+
+def registry(tmp_path, text:str) -> str:
+    path = tmp_path / 'registry.toml'
+    path.write_text(text)
+    return str(path)
+
+
+def test_written_registry_loads_back(tmp_path):
+    bills = [BillSpec('Gas "North"', '0,0', ('0,1', '0,2'), 'Weekly'), BillSpec('Water', '1,0', ())]
+    payees = { 'Ann' : ['0,1'], 'Bo' : ['0,2', '9,9'] }
+    path = str(tmp_path / 'registry.toml')
+    write_registry(path, bills, payees)
+
+    assert load_registry(path) == (tuple(bills), { 'Ann' : ('0,1',), 'Bo' : ('0,2', '9,9') })
+
+
+@pytest.mark.parametrize('text, error', [
+    ('[[bills]]\nvalue = "0,0"\n', 'bill 1 needs a label'),
+    ('[[bills]]\nlabel = "Gas"\nvalue = "0,0"\n[[bills]]\nlabel = "Water"\n', 'bill 2 needs a label'),
+    ('[[bills]]\nlabel = "Gas"\nvalue = "0,0"\nfrequency = "Daily"\n', "Gas: unknown frequency 'Daily'"),
+    ('[[bills]]\nlabel = "Gas"\nvalue = "0,0"\npayments = ["0,1", "0,1"]\n', 'Gas: position 0,1 is already used by Gas'),
+    ('[[bills]]\nlabel = "Gas"\nvalue = "0,0"\n[[bills]]\nlabel = "Water"\nvalue = "1,0"\npayments = ["0,0"]\n',
+        'Water: position 0,0 is already used by Gas'),
+    ('[[bills]]\nlabel = "Gas"\nvalue = "0,0"\n[[bills]]\nlabel = "Gas"\nvalue = "1,0"\n', 'bill labels must be unique'),
+])
+def test_invalid_registries_name_the_entry(tmp_path, text, error):
+    path = registry(tmp_path, text)
+    with pytest.raises(ValueError, match=error) as raised:
+        load_registry(path)
+    assert str(raised.value).startswith(path)
+
+
+def test_empty_registry(tmp_path):
+    assert load_registry(registry(tmp_path, '')) == ((), {})
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from hybridledger import reports
+
+
+def test_summary_frequency_table_leaves_out_bills_without_an_amount():
+    bills = pd.DataFrame({
+        'bill': ['Gas', 'Water', 'Hydro', 'Phone'],
+        'frequency': ['Biweekly', 'Biweekly', 'Biweekly', 'Monthly'],
+        'responsible': [2, 1, 2, 1],
+        # Water's value chain holds only its Genesis block, Hydro's nothing
+        'value_blocks': [3, 1, 0, 2],
+        'last_data': ['42.50', 'Genesis Ledger Registration', None, '60'],
+        'last_amount': [42.5, np.nan, np.nan, 60.0],
+    })
+    table = reports.summary_frequency_table(bills, 'Biweekly')
+
+    assert table['Bill'].tolist() == ['Gas']
+    assert table['Last Value'].tolist() == [42.5]
+    assert table['Appx. Monthly Cost'].tolist() == [42.5 / reports.FREQUENCIES['Biweekly']]
+    assert reports.summary_frequency_table(bills, 'Biweekly', num_responsible=1).empty
+
+
+def test_frequency_table_leaves_out_bills_without_an_amount():
+    def bill(label:str, data:list[str], amounts:list[float]) -> SimpleNamespace:
+        values = pd.DataFrame({ 'data' : data, 'amount' : amounts })
+        return SimpleNamespace(label=label, frequency='Biweekly', values=values, dues_chains={ 'a' : None })
+
+    snapshot = [
+        bill('Gas', ['Genesis Ledger Registration', '42.50'], [np.nan, 42.5]),
+        bill('Water', ['Genesis Ledger Registration'], [np.nan]),
+        bill('Hydro', [], []),
+    ]
+    table = reports.frequency_table(snapshot, 'Biweekly')
+
+    assert table['Bill'].tolist() == ['Gas']
+    assert table['Last Value'].tolist() == [42.5]
+
+
+def test_genesis_only_bill_has_no_history():
+    # a bill registered but never issued, and a payee who never paid
+    genesis = pd.DataFrame({
+        'data': ['Genesis Ledger Registration'],
+        'amount': [np.nan],
+        'genesis': [True],
+        'issued': [pd.Timestamp('2024-01-05')],
+        'paid': np.array([False]),
+    })
+    bill = SimpleNamespace(label='Water', values=genesis, dues={ '1,1' : genesis.iloc[:0] }, dues_chains={ '1,1' : None })
+
+    assert reports.price_history(bill).empty
+    history = reports.payment_history(bill, '1,1', now=pd.Timestamp('2024-02-01'))
+    assert history.empty
+    assert tuple(history.columns) == reports.PAYMENT_HISTORY_COLUMNS
+
+
+def test_overview_of_a_bill_with_no_issue_yet():
+    def bill(label:str, amounts:list[float]) -> SimpleNamespace:
+        values = pd.DataFrame({ 'amount' : [np.nan] + amounts, 'genesis' : [True] + [False] * len(amounts) })
+        return SimpleNamespace(label=label, frequency='Monthly', values=values, dues_chains={ 'a' : None, 'b' : None })
+
+    table = reports.overview([bill('Gas', [40.0, 42.0]), bill('Water', [])])
+
+    assert table['Last Value'].tolist()[0] == 42.0
+    assert np.isnan(table['Last Value'].tolist()[1])
+    assert reports.overview_totals(table) == { 'cost' : 42.0, 'per_responsible' : 21.0, 'saved' : 21.0 }
@@ -0,0 +1,85 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from hybridledger import reports, summary
+from hybridledger.analytics import payment_matrix
+from hybridledger.db import connect_readonly
+from hybridledger.registry import BillSpec
+from hybridledger.snapshot import LedgerSnapshot
+
+from conftest import NOW, mint
+
+
+@pytest.fixture
+def specs(ledger):
+    _, bills, _ = ledger
+    return tuple(BillSpec(bill.label, bill.pos_value, tuple(bill.pos_payment_stacks), bill.frequency) for bill in bills)
+
+
+def snapshot_of(path:str, specs:tuple[BillSpec, ...]) -> LedgerSnapshot:
+    conn = connect_readonly(path)
+    try:
+        return LedgerSnapshot([spec.chain() for spec in specs], conn)
+    finally:
+        conn.close()
+
+
+def assert_store_matches(path:str, store:str, specs:tuple[BillSpec, ...], payees:dict[str, list[str]]):
+    snapshot = snapshot_of(path, specs)
+    pd.testing.assert_frame_equal(summary.read_bills(store, specs), summary.summarize(snapshot, specs))
+
+    issues = summary.read_issues(store, specs)
+    columns = ['bill', 'timestamp', 'issued', 'amount']
+    pd.testing.assert_frame_equal(issues[columns], snapshot.issues[columns].reset_index(drop=True), check_dtype=False)
+
+    payee_by_position = { position : payee for payee, positions in payees.items() for position in positions }
+    labels = [spec.label for spec in specs]
+    now = summary._local(pd.Series([NOW])).iloc[0]
+    for periods, granularity in itertools.product((2, 8), ('M', 'W', 'cycle')):
+        # only the window shown is read from the store
+        cycles = periods if granularity == 'cycle' else None
+        payments = summary.read_payments(store, since=reports.payment_window(periods, granularity, now), cycles=cycles, bills=specs)
+        stored = payment_matrix(payments, payee_by_position, list(payees), labels, periods=periods, granularity=granularity,
+            issues=summary.read_issues(store, specs, last=cycles) if cycles else None, now=now)
+        loaded = payment_matrix(snapshot.payments, payee_by_position, list(payees), labels,
+            periods=periods, granularity=granularity, issues=snapshot.issues, now=now)
+        pd.testing.assert_frame_equal(stored, loaded)
+        assert stored.to_numpy().any()
+        if periods == 2:
+            assert 0 < len(payments) < snapshot.payments['paid'].sum()
+
+
+def test_incremental_update_matches_a_full_load(ledger, specs, tmp_path):
+    path, bills, payees = ledger
+    store = str(tmp_path / 'summary.sqlite')
+
+    assert summary.update(path, store, specs) > 0
+    assert_store_matches(path, store, specs, payees)
+    assert summary.update(path, store, specs) == 0
+
+    # new issues and payments (paid and not) are folded in on top of the store
+    mint(path, specs[0].pos_value, '123.45')
+    mint(path, specs[0].pos_payment_stacks[0], 'ok')
+    mint(path, specs[1].pos_payment_stacks[0], 'late')
+    mint(path, specs[1].pos_value, '67.89')
+    assert summary.update(path, store, specs) == 4
+    assert_store_matches(path, store, specs, payees)
+
+    full = str(tmp_path / 'full.sqlite')
+    summary.update(path, full, specs)
+    pd.testing.assert_frame_equal(summary.read_bills(store, specs), summary.read_bills(full, specs))
+
+
+def test_changed_bill_is_summarized_again(ledger, specs, tmp_path):
+    path, bills, payees = ledger
+    store = str(tmp_path / 'summary.sqlite')
+    summary.update(path, store, specs)
+
+    # the registry moves a bill to another frequency and drops its second bill
+    changed = (specs[0]._replace(frequency='Weekly'), *specs[2:])
+    summary.update(path, store, changed)
+
+    assert summary.read_bills(store, specs) is None
+    assert_store_matches(path, store, changed, payees)
@@ -0,0 +1,46 @@
+import pytest
+
+from hybridledger import tiles
+from hybridledger.db import connect_readonly
+from hybridledger.valuation import read_ledgers, valuate
+
+from conftest import NOW, mint
+
+
+@pytest.mark.parametrize('position, parsed', [
+    ('-a8,-c2', ('public', -0xa8, -0xc2)),
+    ('0,1', ('public', 0, 1)),
+    ('realm:0x10,-0X1', ('realm', 16, -1)),
+    (' 1fz, +2', ('public', 0x1f, 2)),
+    ('g,1', None),
+    ('1,2,3', None),
+    ('1', None),
+])
+def test_parse_position(position, parsed):
+    assert tiles.parse_position(position) == parsed
+
+
+def test_gate():
+    assert tiles.gate(0, 7) == (0, 0)
+    assert tiles.gate(8, -1) == (1, -1)
+    assert tiles.gate(-8, -9) == (-1, -2)
+
+
+def test_tile_value_sums_ledger_values(database, tmp_path):
+    # a transaction and an EMPTY block, which HybridLedger.getValue subtracts and skips
+    mint(database, '0,0', '0.25', block_type=3)
+    mint(database, '1,0', 'nothing', block_type=0)
+    index = str(tmp_path / 'tiles.sqlite')
+    tiles.update(database, index, levels=3)
+
+    conn = connect_readonly(database)
+    try:
+        valuation = valuate(read_ledgers(conn), NOW)
+    finally:
+        conn.close()
+    # every generated position is in tile (0, 0) at level 2
+    tile = tiles.read_tiles(tiles.PUBLIC_REALM, 2, now=NOW, index=index)
+    assert len(tile) == 1
+    assert tile['blocks'].iloc[0] == len(valuation.blocks)
+    # unclamped and unrounded, each block within Block.getValue's rounding
+    assert tile['value'].iloc[0] == pytest.approx(valuation.ledgers['value'].sum(), abs=1e-6 * len(valuation.blocks))
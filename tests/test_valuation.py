@@ -0,0 +1,90 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybridledger.db import connect_readonly
+from hybridledger.valuation import _js_round, read_ledgers, spent_values, valuate
+
+from conftest import NOW, mint
+
+MODULE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'module')
+
+
+def test_js_round_is_math_round():
+    # Math.round(...) of each, from node
+    values = np.array([2.5, -2.5, 0.49999999999999994, -0.5, -0.4, 1.5e300, -3.7, 7.0, np.nan, np.inf])
+    with np.errstate(invalid='ignore'):
+        rounded = _js_round(values)
+    np.testing.assert_array_equal(rounded, [3, -2, 0, -0.0, -0.0, 1.5e300, -4, 7, np.nan, np.inf])
+    assert np.signbit(rounded[[3, 4]]).all() and not np.signbit(rounded[2])
+
+
+def test_spent_values_coerce_like_number():
+    frame = pd.DataFrame({
+        'blockType': [3, 3, 3, 3, 3, 2],
+        'data': [' 12.5\n', '0x10', '', 'junk', None, '99'],
+    })
+    np.testing.assert_array_equal(spent_values(frame), [12.5, 16, 0, np.nan, 0, 0])
+
+
+def js_method(source:str, name:str) -> str:
+    # a class method, from its signature to the closing brace at the same indentation
+    return re.search(rf'^    {name}\(\)\s*\{{.*?^    \}}', source, re.M | re.S).group(0)
+
+
+def node_values(frame:pd.DataFrame, now:int) -> tuple[list, dict]:
+    # Block.getHash/getDifficulty/getValue and HybridLedger.getValue from module/, with crypto-js's SHA256 and the clock replaced
+    with open(os.path.join(MODULE, 'block.js')) as block, open(os.path.join(MODULE, 'ledger.js')) as ledger:
+        block_source, ledger_source = block.read(), ledger.read()
+    script = '\n'.join([
+        "const crypto = require('crypto');",
+        "const SHA256 = (text) => crypto.createHash('sha256').update(text);",
+        "crypto.Hash.prototype.toString = function () { return this.digest('hex') };",
+        'console.log = () => {};',
+        f'const RealDate = Date; globalThis.Date = class extends RealDate {{ constructor(...args) {{ args.length ? super(...args) : super({now}) }} }};',
+        'class Block {', *(js_method(block_source, name) for name in ('getHash', 'getValue', 'getDifficulty')), '}',
+        'class HybridLedger {', js_method(ledger_source, 'getValue'), '}',
+        "const rows = JSON.parse(require('fs').readFileSync(0, 'utf8'));",
+        'const ledgers = {};',
+        'const values = rows.map((row) => {',
+        '    const block = Object.assign(Object.create(Block.prototype), row);',
+        '    block.hash = block.getHash();',
+        '    (ledgers[row.position] ??= Object.assign(Object.create(HybridLedger.prototype), { ledger: [] })).ledger.push(block);',
+        '    return block.getValue();',
+        '});',
+        'const ledgerValues = Object.fromEntries(Object.entries(ledgers).map(([position, ledger]) => [position, ledger.getValue()]));',
+        'process.stdout.write(JSON.stringify([values, ledgerValues]));',
+    ])
+    rows = frame.drop(columns='id').astype(object).where(frame.notna(), None).to_dict('records')
+    done = subprocess.run(['node', '-e', script], input=json.dumps(rows), capture_output=True, text=True, check=True)
+    values, ledger_values = json.loads(done.stdout)
+    # JSON has no NaN
+    return [np.nan if value is None else value for value in values], ledger_values
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+def test_values_match_the_node_server(database):
+    mint(database, '0,0', '0.25', block_type=3)
+    mint(database, '0,1', ' 0x10 ', block_type=3)
+    mint(database, '1,0', 'junk', block_type=3)
+    mint(database, '1,1', 'nothing', block_type=0)
+    conn = connect_readonly(database)
+    try:
+        frame = read_ledgers(conn)
+    finally:
+        conn.close()
+
+    valuation = valuate(frame, NOW)
+    values, ledger_values = node_values(valuation.blocks[frame.columns], NOW)
+
+    # bit for bit
+    np.testing.assert_array_equal(valuation.blocks['value'].to_numpy(), values)
+    np.testing.assert_array_equal(valuation.ledgers['value'].to_numpy(),
+        [np.nan if ledger_values[position] is None else ledger_values[position] for position in valuation.ledgers['position']])
+    assert np.isnan(valuation.ledgers.set_index('position').loc['1,0', 'value'])
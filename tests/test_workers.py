@@ -0,0 +1,19 @@
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from hybridledger.workers import start_pool
+
+
+def test_pools_started_from_threads_restore_main():
+    main = sys.modules['__main__']
+
+    def run(processes:int) -> list[float]:
+        with start_pool(processes) as pool:
+            return pool.map(math.sqrt, range(processes * 4))
+
+    with ThreadPoolExecutor(3) as threads:
+        results = list(threads.map(run, (1, 2, 3)))
+
+    assert results == [list(map(math.sqrt, range(processes * 4))) for processes in (1, 2, 3)]
+    assert sys.modules['__main__'] is main